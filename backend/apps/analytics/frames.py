@@ -0,0 +1,78 @@
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+INTEGER_TYPES = {'int2', 'int4', 'int8', 'oid'}
+FLOAT_TYPES = {'float4', 'float8', 'numeric'}
+TEXT_TYPES = {'text', 'varchar', 'bpchar'}
+# Serialized as ISO 8601 strings by apps.database.serialization
+DATETIME_TYPES = {'date', 'timestamp'}
+DATETIME_TZ_TYPES = {'timestamptz'}
+
+# Text columns with at most this share of distinct values become categoricals
+CATEGORICAL_MAX_UNIQUE_RATIO = 0.5
+CATEGORICAL_SAMPLE_SIZE = 1000
+
+
+def _integer_column(values: Sequence) -> np.ndarray:
+    # int64 can't hold NULLs; float64 is what pd.to_numeric gave them
+    if None in values:
+        return np.array(values, dtype=np.float64)
+    return np.array(values, dtype=np.int64)
+
+
+def _bool_column(values: Sequence) -> Any:
+    if None in values:
+        return pd.array(values, dtype='boolean')
+    return np.array(values, dtype=bool)
+
+
+def _text_column(values: Sequence) -> Any:
+    # A sample rules out mostly-distinct text (names, descriptions) before factorizing it all
+    sample = values[:CATEGORICAL_SAMPLE_SIZE]
+    if len(set(sample)) > len(sample) * CATEGORICAL_MAX_UNIQUE_RATIO:
+        return np.asarray(values, dtype=object)
+    codes, categories = pd.factorize(np.asarray(values, dtype=object))
+    if len(categories) <= len(values) * CATEGORICAL_MAX_UNIQUE_RATIO:
+        return pd.Categorical.from_codes(codes, categories)
+    return np.asarray(values, dtype=object)
+
+
+def typed_column(values: Sequence, type_name: Optional[str]) -> Any:
+    """
+    One result column as an array of the dtype its Postgres type maps to:
+    int64 (float64 with NULLs), float64, bool, datetime64, categorical for
+    repetitive text; other text and unmapped types are left to pandas as
+    Python objects
+    """
+    if type_name in INTEGER_TYPES:
+        return _integer_column(values)
+    if type_name in FLOAT_TYPES:
+        return np.array(values, dtype=np.float64)
+    if type_name == 'bool':
+        return _bool_column(values)
+    if type_name in DATETIME_TYPES:
+        # numpy parses naive ISO 8601 (and None as NaT) natively
+        return np.array(values, dtype='datetime64[us]')
+    if type_name in DATETIME_TZ_TYPES:
+        return pd.to_datetime(pd.Series(values, dtype=object), format='ISO8601', utc=True).array
+    if type_name in TEXT_TYPES:
+        return _text_column(values)
+    return np.asarray(values, dtype=object)
+
+
+def typed_dataframe(columns: List[str], data: Sequence, column_types: List[str], columnar: bool = False) -> pd.DataFrame:
+    """
+    DataFrame for a query result, each column converted once from the type
+    ``cursor.description`` reported for it. ``data`` is rows, or one list
+    per column when ``columnar``.
+    """
+    column_values = data if columnar else list(zip(*data))
+    df = pd.DataFrame({
+        position: typed_column(values, type_name)
+        for position, (values, type_name) in enumerate(zip(column_values, column_types))
+    })
+    # Positions as keys, so duplicate column names survive
+    df.columns = columns
+    return df
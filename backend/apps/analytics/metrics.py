@@ -0,0 +1,150 @@
+import contextvars
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, NamedTuple, Optional
+
+from django.conf import settings
+
+from utils.tracing import span, annotate
+from .rollups import rollups_ready
+
+logger = logging.getLogger(__name__)
+
+METRICS_MODE_FUSED = 'fused'
+METRICS_MODE_PARALLEL = 'parallel'
+
+
+class MetricQuery(NamedTuple):
+    """A single-row aggregate over one table; its column names must be unique across a batch"""
+    name: str
+    sql: str
+
+
+BUSINESS_METRIC_QUERIES = [
+    MetricQuery('customer_stats', """
+        SELECT
+            COUNT(*) as total_customers,
+            COUNT(CASE WHEN customer_segment = 'premium' THEN 1 END) as premium_customers,
+            AVG(credit_score) as avg_credit_score,
+            AVG(annual_income) as avg_income
+        FROM customers
+    """),
+    MetricQuery('account_stats', """
+        SELECT
+            COUNT(*) as total_accounts,
+            SUM(balance) as total_balance,
+            AVG(balance) as avg_balance,
+            COUNT(CASE WHEN balance < 0 THEN 1 END) as negative_balance_accounts
+        FROM accounts
+        WHERE account_status = 'active'
+    """),
+    MetricQuery('loan_stats', """
+        SELECT
+            COUNT(*) as total_loans,
+            SUM(loan_amount) as total_loan_amount,
+            SUM(outstanding_balance) as total_outstanding,
+            COUNT(CASE WHEN loan_status = 'default' THEN 1 END) as defaulted_loans,
+            AVG(interest_rate) as avg_interest_rate
+        FROM loans
+    """),
+    MetricQuery('transaction_stats', """
+        SELECT
+            COUNT(*) as transaction_count,
+            SUM(amount) as transaction_volume,
+            AVG(amount) as avg_transaction_amount
+        FROM transactions
+        WHERE transaction_date >= CURRENT_DATE - INTERVAL '30 days'
+        AND status = 'completed'
+    """),
+]
+
+# The same figures from the daily rollup, a few thousand rows whatever the size of transactions
+ROLLUP_TRANSACTION_STATS = MetricQuery('transaction_stats', """
+        SELECT
+            COALESCE(SUM(completed_count), 0) as transaction_count,
+            SUM(completed_amount) as transaction_volume,
+            SUM(completed_amount) / NULLIF(SUM(completed_count), 0) as avg_transaction_amount
+        FROM analytics_dailycategoryrollup
+        WHERE day >= CURRENT_DATE - INTERVAL '30 days'
+    """)
+
+
+def business_metric_queries() -> List[MetricQuery]:
+    """The business metric batch, reading transaction rollups once they're built"""
+    if not rollups_ready():
+        return BUSINESS_METRIC_QUERIES
+    return [ROLLUP_TRANSACTION_STATS if query.name == 'transaction_stats' else query
+            for query in BUSINESS_METRIC_QUERIES]
+
+
+def fuse_queries(queries: List[MetricQuery]) -> str:
+    """
+    One statement computing every query as a CTE, cross-joined into a single
+    row: one parse, one plan and one round trip for the whole batch
+    """
+    ctes = ",\n".join(f"{query.name} AS ({query.sql.strip()})" for query in queries)
+    return f"WITH {ctes}\nSELECT * FROM {', '.join(query.name for query in queries)}"
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """
+    Return the shared executor for metric queries, sized to the read pool
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.SQL_POOL_MAX_SIZE, thread_name_prefix='metrics')
+    return _executor
+
+
+class MetricsEngine:
+    """
+    Runs batches of trusted aggregate queries, skipping the parsing,
+    validation and cost checks user SQL goes through.
+
+    In ``fused`` mode the batch is a single multi-CTE statement; if that
+    fails (say one table is missing) each query is retried on its own so
+    the others still report. In ``parallel`` mode the queries run
+    concurrently on pooled connections.
+    """
+
+    def __init__(self, db_service, mode: Optional[str] = None):
+        self.db_service = db_service
+        self.mode = settings.ANALYTICS_METRICS_MODE if mode is None else mode
+
+    def run(self, queries: List[MetricQuery]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Each query's row as a dict of column to value (in fused mode, the
+        combined row), or None where it failed
+        """
+        with span('analytics.metrics', mode=self.mode, queries=len(queries)):
+            if self.mode == METRICS_MODE_FUSED:
+                result = self.db_service.execute_trusted_query(fuse_queries(queries))
+                if result['success'] and result['data']:
+                    row = dict(zip(result['columns'], result['data'][0]))
+                    return {query.name: row for query in queries}
+                logger.warning(f"Fused metrics query failed, running queries separately: {result.get('error')}")
+                annotate(fallback=True)
+
+            return self._run_parallel(queries)
+
+    def _run_parallel(self, queries: List[MetricQuery]) -> Dict[str, Optional[Dict[str, Any]]]:
+        futures = [
+            _get_executor().submit(contextvars.copy_context().run, self.db_service.execute_trusted_query, query.sql)
+            for query in queries
+        ]
+        rows = {}
+        for query, future in zip(queries, futures):
+            result = future.result()
+            if result['success'] and result['data']:
+                rows[query.name] = dict(zip(result['columns'], result['data'][0]))
+            else:
+                logger.error(f"Metric query {query.name} failed: {result.get('error')}")
+                rows[query.name] = None
+        return rows
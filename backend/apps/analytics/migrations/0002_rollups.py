@@ -0,0 +1,70 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_transaction_id', models.BigIntegerField(default=0)),
+                ('last_transaction_date', models.DateTimeField(blank=True, null=True)),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MonthlyCohortActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('activity_month', models.DateField()),
+                ('customer_id', models.IntegerField()),
+                ('cohort_month', models.DateField(null=True)),
+                ('customer_created_at', models.DateTimeField(null=True)),
+                ('transaction_count', models.IntegerField(default=0)),
+                ('transaction_value', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['customer_created_at'], name='analytics_m_custome_fe1891_idx')],
+                'unique_together': {('activity_month', 'customer_id')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyCategoryRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('merchant_category', models.CharField(max_length=50)),
+                ('transaction_count', models.IntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('completed_count', models.IntegerField(default=0)),
+                ('completed_amount', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+            ],
+            options={
+                'unique_together': {('day', 'merchant_category')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyAccountRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('account_id', models.IntegerField()),
+                ('transaction_count', models.IntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('completed_count', models.IntegerField(default=0)),
+                ('completed_amount', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['account_id', 'day'], name='analytics_d_account_d0e694_idx')],
+                'unique_together': {('day', 'account_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:33
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_rollups'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='businessmetric',
+            name='calculated_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from apps.chat.models import ChatSession
 
 
@@ -72,8 +73,57 @@ class BusinessMetric(models.Model):
     benchmark_value = models.FloatField(null=True, blank=True)
     target_value = models.FloatField(null=True, blank=True)
     is_kpi = models.BooleanField(default=False)
-    calculated_at = models.DateTimeField(auto_now_add=True)
+    # Set explicitly so every metric in a snapshot shares one timestamp
+    calculated_at = models.DateTimeField(default=timezone.now, db_index=True)
 
     class Meta:
         ordering = ['-calculated_at']
-        unique_together = ['name', 'calculated_at']
\ No newline at end of file
+        unique_together = ['name', 'calculated_at']
+
+class DailyAccountRollup(models.Model):
+    """Per-account transaction totals for one day, maintained by the rollup job"""
+    day = models.DateField()
+    account_id = models.IntegerField()
+    transaction_count = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    completed_count = models.IntegerField(default=0)
+    completed_amount = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ['day', 'account_id']
+        indexes = [models.Index(fields=['account_id', 'day'])]
+
+
+class DailyCategoryRollup(models.Model):
+    """Per-merchant-category transaction totals for one day, maintained by the rollup job"""
+    day = models.DateField()
+    merchant_category = models.CharField(max_length=50)
+    transaction_count = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    completed_count = models.IntegerField(default=0)
+    completed_amount = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ['day', 'merchant_category']
+
+
+class MonthlyCohortActivity(models.Model):
+    """One customer's transactions in one month, keyed by the month they joined"""
+    activity_month = models.DateField()
+    customer_id = models.IntegerField()
+    cohort_month = models.DateField(null=True)
+    customer_created_at = models.DateTimeField(null=True)
+    transaction_count = models.IntegerField(default=0)
+    transaction_value = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ['activity_month', 'customer_id']
+        indexes = [models.Index(fields=['customer_created_at'])]
+
+
+class RollupWatermark(models.Model):
+    """How far into transactions the rollups have been brought up to date"""
+    name = models.CharField(max_length=50, unique=True)
+    last_transaction_id = models.BigIntegerField(default=0)
+    last_transaction_date = models.DateTimeField(null=True, blank=True)
+    refreshed_at = models.DateTimeField(auto_now=True)
@@ -0,0 +1,146 @@
+import time
+from functools import cached_property
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from utils.tracing import span
+
+SECTIONS = ('descriptive', 'statistical', 'insights', 'visualizations', 'recommendations')
+
+# The sections each analysis type reports. Only the types that read the
+# statistical section pay for its scipy tests (Shapiro-Wilk, t intervals).
+ANALYSIS_SECTIONS: Dict[str, Tuple[str, ...]] = {
+    'descriptive': ('descriptive', 'insights', 'visualizations', 'recommendations'),
+    'diagnostic': SECTIONS,
+    'predictive': SECTIONS,
+    'prescriptive': ('descriptive', 'insights', 'recommendations'),
+    'cohort': ('descriptive', 'insights', 'visualizations', 'recommendations'),
+    'trend': ('descriptive', 'insights', 'visualizations', 'recommendations'),
+    'correlation': ('descriptive', 'insights', 'visualizations', 'recommendations'),
+    'outlier': ('descriptive', 'statistical', 'insights', 'recommendations'),
+}
+
+
+class AnalysisFrame:
+    """
+    A result's DataFrame with the intermediates the analysis sections share
+    (column selections, the correlation matrix, NULL-free series), each
+    computed on first use and then reused by every section
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._series: Dict[str, pd.Series] = {}
+        self._trends: Dict[str, Dict[str, np.ndarray]] = {}
+
+    @cached_property
+    def numeric_cols(self) -> pd.Index:
+        return self.df.select_dtypes(include=[np.number]).columns
+
+    @cached_property
+    def categorical_cols(self) -> pd.Index:
+        return self.df.select_dtypes(include=['object', 'category']).columns
+
+    @cached_property
+    def datetime_cols(self) -> pd.Index:
+        return self.df.select_dtypes(include=['datetime64', 'datetimetz']).columns
+
+    @cached_property
+    def missing(self) -> pd.Series:
+        """NULL count per column"""
+        return self.df.isnull().sum()
+
+    @cached_property
+    def unique_counts(self) -> pd.Series:
+        """Distinct values per categorical column"""
+        return self.df[self.categorical_cols].nunique()
+
+    @cached_property
+    def correlations(self) -> pd.DataFrame:
+        """Pearson correlation matrix of the numeric columns"""
+        return self.df[self.numeric_cols].corr()
+
+    @cached_property
+    def numeric_values(self) -> np.ndarray:
+        """The numeric columns as one float64 matrix, NULLs as NaN"""
+        return self.df[self.numeric_cols].to_numpy(dtype=np.float64, na_value=np.nan)
+
+    def trends(self, date_col: str) -> Dict[str, np.ndarray]:
+        """
+        Every numeric column's linear trend over ``date_col``: the rows are
+        sorted by it once and all columns fitted together (see ``linear_trends``)
+        """
+        if date_col not in self._trends:
+            dates = self.df[date_col]
+            positions = np.flatnonzero(dates.notna().to_numpy())
+            positions = positions[dates.iloc[positions].argsort(kind='stable').to_numpy()]
+            self._trends[date_col] = linear_trends(self.numeric_values[positions])
+        return self._trends[date_col]
+
+    def series(self, col: str) -> pd.Series:
+        """One column without its NULLs"""
+        if col not in self._series:
+            self._series[col] = self.df[col].dropna()
+        return self._series[col]
+
+
+def linear_trends(values: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Least-squares fit of each column of ``values`` against its row order,
+    NaNs skipped per column: for every column at once, what
+    ``stats.linregress(np.arange(len(y)), y)`` gives for that column's
+    non-NaN values ``y``. Returns arrays of ``slope``, ``r_value``,
+    ``p_value`` and ``n`` (values fitted), one entry per column.
+    """
+    mask = ~np.isnan(values)
+    n = mask.sum(axis=0)
+    # Each value's position among its own column's non-NaN values, centred on their mean
+    x = np.where(mask, np.cumsum(mask, axis=0) - 1 - (n - 1) / 2, 0.0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        y = np.where(mask, values - np.nansum(values, axis=0) / n, 0.0)
+        ssxm = np.einsum('ij,ij->j', x, x)
+        ssym = np.einsum('ij,ij->j', y, y)
+        ssxym = np.einsum('ij,ij->j', x, y)
+
+        slope = ssxym / ssxm
+        # linregress reports no correlation for a constant column
+        r_value = np.where((ssxm > 0) & (ssym > 0), ssxym / np.sqrt(ssxm * ssym), 0.0)
+        r_value = np.clip(r_value, -1.0, 1.0)
+        dof = n - 2
+        t_stat = r_value * np.sqrt(dof / ((1.0 - r_value) * (1.0 + r_value)))
+        p_value = 2 * stats.t.sf(np.abs(t_stat), dof)
+
+    return {'slope': slope, 'r_value': r_value, 'p_value': p_value, 'n': n}
+
+
+def analysis_frame(df: Any) -> AnalysisFrame:
+    """``df`` as an AnalysisFrame, wrapping a bare DataFrame"""
+    return df if isinstance(df, AnalysisFrame) else AnalysisFrame(df)
+
+
+class AnalysisPlan:
+    """The sections one analysis type needs, computed in order and nothing else"""
+
+    def __init__(self, analysis_type: str):
+        self.analysis_type = analysis_type
+        # Types without a plan of their own get every section, as before plans
+        self.sections = ANALYSIS_SECTIONS.get(analysis_type, SECTIONS)
+
+    def run(self, frame: AnalysisFrame, builders: Dict[str, Callable[[AnalysisFrame], Any]],
+            deadline: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Every section's result, or None when ``deadline`` (a ``time.monotonic()``
+        value) passes first: no section starts after it, so abandoned work
+        gives its thread back within one section
+        """
+        results = {}
+        for section in self.sections:
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            with span(f'analytics.{section}'):
+                results[section] = builders[section](frame)
+        return results
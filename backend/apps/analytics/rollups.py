@@ -0,0 +1,175 @@
+import logging
+from datetime import timedelta
+from typing import Dict, Any, Optional
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from utils.tracing import span, annotate
+from .models import RollupWatermark
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_WATERMARK = 'transactions'
+# Advisory lock key, so overlapping runs of the scheduled job don't both rebuild
+ROLLUP_LOCK_KEY = 45045
+
+ROLLUP_TABLES = ['analytics_dailyaccountrollup', 'analytics_dailycategoryrollup', 'analytics_monthlycohortactivity']
+
+# Days holding transactions added since the watermark, plus the trailing window
+# rebuilt every run (for status changes and rows that committed out of id order)
+AFFECTED_DAYS_SQL = """
+    SELECT DISTINCT transaction_date::date FROM transactions
+    WHERE transaction_id > %s AND transaction_id <= %s AND transaction_date IS NOT NULL
+    UNION
+    SELECT generate_series(CURRENT_DATE - %s, CURRENT_DATE, INTERVAL '1 day')::date
+"""
+
+ALL_DAYS_SQL = """
+    SELECT DISTINCT transaction_date::date FROM transactions WHERE transaction_date IS NOT NULL
+"""
+
+# Each day is a range scan on idx_transactions_date
+DAILY_ACCOUNT_SQL = """
+    INSERT INTO analytics_dailyaccountrollup
+        (day, account_id, transaction_count, total_amount, completed_count, completed_amount)
+    SELECT d.day, t.account_id, COUNT(*), SUM(t.amount),
+           COUNT(*) FILTER (WHERE t.status = 'completed'),
+           COALESCE(SUM(t.amount) FILTER (WHERE t.status = 'completed'), 0)
+    FROM unnest(%s::date[]) AS d(day)
+    JOIN transactions t ON t.transaction_date >= d.day AND t.transaction_date < d.day + 1
+    WHERE t.transaction_id <= %s AND t.account_id IS NOT NULL
+    GROUP BY d.day, t.account_id
+"""
+
+DAILY_CATEGORY_SQL = """
+    INSERT INTO analytics_dailycategoryrollup
+        (day, merchant_category, transaction_count, total_amount, completed_count, completed_amount)
+    SELECT d.day, COALESCE(t.merchant_category, 'uncategorized'), COUNT(*), SUM(t.amount),
+           COUNT(*) FILTER (WHERE t.status = 'completed'),
+           COALESCE(SUM(t.amount) FILTER (WHERE t.status = 'completed'), 0)
+    FROM unnest(%s::date[]) AS d(day)
+    JOIN transactions t ON t.transaction_date >= d.day AND t.transaction_date < d.day + 1
+    WHERE t.transaction_id <= %s
+    GROUP BY d.day, COALESCE(t.merchant_category, 'uncategorized')
+"""
+
+MONTHLY_COHORT_SQL = """
+    INSERT INTO analytics_monthlycohortactivity
+        (activity_month, customer_id, cohort_month, customer_created_at, transaction_count, transaction_value)
+    SELECT m.month, c.customer_id, DATE_TRUNC('month', c.created_at)::date, c.created_at,
+           COUNT(*), SUM(t.amount)
+    FROM unnest(%s::date[]) AS m(month)
+    JOIN transactions t ON t.transaction_date >= m.month AND t.transaction_date < m.month + INTERVAL '1 month'
+    JOIN accounts a ON a.account_id = t.account_id
+    JOIN customers c ON c.customer_id = a.customer_id
+    WHERE t.transaction_id <= %s
+    GROUP BY m.month, c.customer_id, c.created_at
+"""
+
+# perform_cohort_analysis's acquisition cohorts, read from the monthly rollup
+COHORT_ACTIVITY_QUERY = """
+    SELECT
+        cohort_month,
+        activity_month as transaction_month,
+        COUNT(*) as active_customers,
+        SUM(transaction_count) as total_transactions,
+        SUM(transaction_value) as total_value
+    FROM analytics_monthlycohortactivity
+    WHERE customer_created_at >= CURRENT_DATE - INTERVAL '12 months'
+    GROUP BY cohort_month, activity_month
+    ORDER BY cohort_month, activity_month
+"""
+
+
+def refresh_rollups(full: bool = False, recompute_days: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Bring the transaction rollups up to date from the watermark.
+
+    Every day that gained transactions since the last run, and the last
+    ``recompute_days`` days regardless, is re-aggregated from raw rows, and
+    so is the cohort activity of every month those days fall in. The cost
+    follows how much changed, not how big ``transactions`` is. ``full``
+    (and the first run) rebuilds everything.
+    """
+    recompute_days = settings.ANALYTICS_ROLLUP_RECOMPUTE_DAYS if recompute_days is None else recompute_days
+
+    with span('analytics.rollups', full=full), transaction.atomic():
+        with connections['default'].cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", [ROLLUP_LOCK_KEY])
+            if not cursor.fetchone()[0]:
+                logger.info("Rollup refresh already running, skipping")
+                return {'skipped': True}
+
+            watermark, created = RollupWatermark.objects.get_or_create(name=ROLLUP_WATERMARK)
+            full = full or created
+
+            cursor.execute("SELECT MAX(transaction_id), MAX(transaction_date) FROM transactions")
+            high_id, high_date = cursor.fetchone()
+            high_id = high_id or 0
+
+            if full:
+                for table in ROLLUP_TABLES:
+                    cursor.execute(f"DELETE FROM {table}")
+                cursor.execute(ALL_DAYS_SQL)
+            else:
+                cursor.execute(AFFECTED_DAYS_SQL, [watermark.last_transaction_id, high_id, recompute_days])
+            days = sorted(row[0] for row in cursor.fetchall())
+            months = sorted({day.replace(day=1) for day in days})
+
+            if not full:
+                cursor.execute("DELETE FROM analytics_dailyaccountrollup WHERE day = ANY(%s::date[])", [days])
+                cursor.execute("DELETE FROM analytics_dailycategoryrollup WHERE day = ANY(%s::date[])", [days])
+                cursor.execute(
+                    "DELETE FROM analytics_monthlycohortactivity WHERE activity_month = ANY(%s::date[])", [months]
+                )
+            cursor.execute(DAILY_ACCOUNT_SQL, [days, high_id])
+            cursor.execute(DAILY_CATEGORY_SQL, [days, high_id])
+            cursor.execute(MONTHLY_COHORT_SQL, [months, high_id])
+
+        watermark.last_transaction_id = high_id
+        watermark.last_transaction_date = high_date or watermark.last_transaction_date
+        watermark.save()
+
+        annotate(days=len(days), months=len(months))
+        logger.info(f"Rollups refreshed through transaction {high_id}: {len(days)} days, {len(months)} months")
+        return {
+            'skipped': False,
+            'full': full,
+            'days': len(days),
+            'months': len(months),
+            'last_transaction_id': high_id,
+        }
+
+
+# When the watermark was last seen refreshed; it's re-read only once that is too old
+_refreshed_at = None
+
+
+def _too_old(refreshed_at) -> bool:
+    max_lag = settings.ANALYTICS_ROLLUP_MAX_LAG
+    return bool(max_lag) and timezone.now() - refreshed_at > timedelta(seconds=max_lag)
+
+
+def rollups_ready() -> bool:
+    """
+    Whether rollups are enabled, built at least once and refreshed within
+    ``ANALYTICS_ROLLUP_MAX_LAG`` seconds; otherwise (before the first
+    refresh, or with the scheduled refresh stopped) readers should
+    aggregate the raw tables
+    """
+    global _refreshed_at
+    if not settings.ANALYTICS_USE_ROLLUPS:
+        return False
+    if _refreshed_at is None or _too_old(_refreshed_at):
+        try:
+            _refreshed_at = RollupWatermark.objects.filter(name=ROLLUP_WATERMARK).values_list(
+                'refreshed_at', flat=True).first()
+        except Exception as e:
+            logger.warning(f"Could not check rollup watermark: {str(e)}")
+        if _refreshed_at is not None and _too_old(_refreshed_at):
+            logger.warning(f"Rollups last refreshed at {_refreshed_at.isoformat()}, over "
+                           f"{settings.ANALYTICS_ROLLUP_MAX_LAG:.0f}s ago; reading the raw tables")
+            return False
+    return _refreshed_at is not None
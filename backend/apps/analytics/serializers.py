@@ -39,6 +39,12 @@ class AnalyticsRequestSerializer(serializers.Serializer):
     )
     session_id = serializers.CharField(max_length=100, required=False)
 
+    def get_fields(self):
+        # 'async' is a reserved word, so it can't be declared as a class attribute
+        fields = super().get_fields()
+        fields['async'] = serializers.BooleanField(required=False, default=False)
+        return fields
+
 
 class CohortAnalysisRequestSerializer(serializers.Serializer):
     cohort_type = serializers.ChoiceField(
@@ -80,4 +86,24 @@ class BusinessMetricsRequestSerializer(serializers.Serializer):
             ('1y', 'Last Year'),
         ],
         default='30d'
-    )
\ No newline at end of file
+    )
+
+class MetricSeriesRequestSerializer(serializers.Serializer):
+    names = serializers.CharField(required=False, allow_blank=True, help_text='Comma-separated metric names; all when omitted')
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+    time_range = serializers.ChoiceField(
+        choices=[
+            ('1d', 'Last 24 Hours'),
+            ('7d', 'Last 7 Days'),
+            ('30d', 'Last 30 Days'),
+            ('90d', 'Last 90 Days'),
+            ('1y', 'Last Year'),
+        ],
+        default='30d'
+    )
+
+    def validate(self, data):
+        if data.get('start') and data.get('end') and data['start'] > data['end']:
+            raise serializers.ValidationError('start must not be after end')
+        return data
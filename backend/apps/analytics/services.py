@@ -2,10 +2,14 @@ import logging
 from typing import Dict, List, Any, Tuple, Optional, TYPE_CHECKING
 from datetime import datetime, timedelta
 from decimal import Decimal
+from itertools import combinations, islice, product
 import statistics
 from django.conf import settings
 from apps.database.services import DatabaseService
 from .models import AnalysisReport, DataInsight, BusinessMetric
+from .metrics import MetricsEngine, business_metric_queries
+from .rollups import rollups_ready, COHORT_ACTIVITY_QUERY
+from utils.tracing import span
 
 # Analytics packages - will be imported when available
 try:
@@ -15,6 +19,8 @@ try:
     from sklearn.preprocessing import StandardScaler
     from sklearn.cluster import KMeans
     from sklearn.ensemble import IsolationForest
+    from .frames import typed_dataframe
+    from .plan import AnalysisPlan, AnalysisFrame, analysis_frame
     ANALYTICS_AVAILABLE = True
 except ImportError:
     ANALYTICS_AVAILABLE = False
@@ -32,10 +38,17 @@ class AnalyticsService:
     def __init__(self):
         self.db_service = DatabaseService()
 
-    def analyze_query_result(self, query: str, result: Dict[str, Any], analysis_type: str = 'descriptive') -> Dict[str, Any]:
+    def analyze_query_result(self, query: str, result: Dict[str, Any], analysis_type: str = 'descriptive',
+                             deadline: Optional[float] = None) -> Dict[str, Any]:
         """
-        Perform comprehensive analysis on query results
+        Perform comprehensive analysis on query results, stopping between
+        sections once ``deadline`` (a ``time.monotonic()`` value) has passed
         """
+        with span('analytics.analyze', analysis_type=analysis_type, rows=result.get('row_count', len(result.get('data') or []))):
+            return self._analyze_query_result(query, result, analysis_type, deadline)
+
+    def _analyze_query_result(self, query: str, result: Dict[str, Any], analysis_type: str,
+                              deadline: Optional[float] = None) -> Dict[str, Any]:
         try:
             if not result.get('success') or not result.get('data'):
                 return {'error': 'No data to analyze'}
@@ -44,7 +57,7 @@ class AnalyticsService:
                 return {
                     'error': 'Analytics packages not available',
                     'basic_info': {
-                        'row_count': len(result.get('data', [])),
+                        'row_count': result.get('row_count', len(result.get('data', []))),
                         'column_count': len(result.get('columns', [])),
                         'columns': result.get('columns', [])
                     }
@@ -52,21 +65,26 @@ class AnalyticsService:
 
             # Convert to DataFrame for analysis
             df = self._result_to_dataframe(result)
-
-            # Perform different types of analysis
-            analysis = {
-                'descriptive': self._descriptive_analysis(df),
-                'statistical': self._statistical_analysis(df),
-                'insights': self._generate_insights(df, query),
-                'visualizations': self._generate_visualization_config(df),
-                'recommendations': self._generate_recommendations(df, query),
-                'metadata': {
-                    'analysis_type': analysis_type,
-                    'row_count': len(df),
-                    'column_count': len(df.columns),
-                    'memory_usage': df.memory_usage(deep=True).sum(),
-                    'data_types': df.dtypes.to_dict()
-                }
+            frame = AnalysisFrame(df)
+
+            # Only the sections this type of analysis reports, sharing intermediates
+            plan = AnalysisPlan(analysis_type)
+            analysis = plan.run(frame, {
+                'descriptive': self._descriptive_analysis,
+                'statistical': self._statistical_analysis,
+                'insights': lambda frame: self._generate_insights(frame, query),
+                'visualizations': self._generate_visualization_config,
+                'recommendations': lambda frame: self._generate_recommendations(frame, query),
+            }, deadline=deadline)
+            if analysis is None:
+                return {'error': 'Analysis stopped at its deadline'}
+            analysis['metadata'] = {
+                'analysis_type': analysis_type,
+                'sections': list(plan.sections),
+                'row_count': len(df),
+                'column_count': len(df.columns),
+                'memory_usage': df.memory_usage(deep=True).sum(),
+                'data_types': df.dtypes.to_dict()
             }
 
             return analysis
@@ -76,24 +94,40 @@ class AnalyticsService:
             return {'error': f'Analysis failed: {str(e)}'}
 
     def _result_to_dataframe(self, result: Dict[str, Any]) -> Any:
-        """Convert query result to pandas DataFrame"""
+        """
+        Convert query result to pandas DataFrame, with dtypes from the
+        result's ``column_types``; results without them (cached before
+        types were recorded) fall back to converting by trial
+        """
         data = result['data']
         columns = result['columns']
 
         if not data or not columns:
             return pd.DataFrame()
 
-        df = pd.DataFrame(data, columns=columns)
+        column_types = result.get('column_types')
+        if column_types and len(column_types) == len(columns):
+            return typed_dataframe(columns, data, column_types, columnar=result.get('format') == 'columnar')
+
+        if result.get('format') == 'columnar':
+            # One array per column: no per-row work to build the frame
+            df = pd.DataFrame(dict(enumerate(data)))
+            df.columns = columns
+        else:
+            df = pd.DataFrame(data, columns=columns)
 
         # Attempt to convert data types
         for col in df.columns:
-            # Try to convert to numeric
-            df[col] = pd.to_numeric(df[col], errors='ignore')
-
-            # Try to convert to datetime
-            if df[col].dtype == 'object':
+            # Try to convert to numeric (errors='ignore' is gone in pandas 3)
+            try:
+                df[col] = pd.to_numeric(df[col])
+            except (ValueError, TypeError):
+                pass
+
+            # Try to convert to datetime (pandas 3 gives text the str dtype, not object)
+            if pd.api.types.is_string_dtype(df[col].dtype):
                 try:
-                    df[col] = pd.to_datetime(df[col], errors='ignore')
+                    df[col] = pd.to_datetime(df[col])
                 except:
                     pass
 
@@ -101,15 +135,17 @@ class AnalyticsService:
 
     def _descriptive_analysis(self, df: Any) -> Dict[str, Any]:
         """Generate descriptive statistics"""
-        numeric_cols = df.select_dtypes(include=[np.number]).columns
-        categorical_cols = df.select_dtypes(include=['object']).columns
-        datetime_cols = df.select_dtypes(include=['datetime64']).columns
+        frame = analysis_frame(df)
+        df = frame.df
+        numeric_cols = frame.numeric_cols
+        categorical_cols = frame.categorical_cols
+        datetime_cols = frame.datetime_cols
 
         analysis = {
             'numeric_summary': {},
             'categorical_summary': {},
             'datetime_summary': {},
-            'missing_values': df.isnull().sum().to_dict(),
+            'missing_values': frame.missing.to_dict(),
             'duplicate_rows': df.duplicated().sum()
         }
 
@@ -118,7 +154,7 @@ class AnalyticsService:
             numeric_df = df[numeric_cols]
             analysis['numeric_summary'] = {
                 'describe': numeric_df.describe().to_dict(),
-                'correlations': numeric_df.corr().to_dict() if len(numeric_cols) > 1 else {},
+                'correlations': frame.correlations.to_dict() if len(numeric_cols) > 1 else {},
                 'skewness': numeric_df.skew().to_dict(),
                 'kurtosis': numeric_df.kurtosis().to_dict()
             }
@@ -126,26 +162,29 @@ class AnalyticsService:
         # Categorical analysis
         if len(categorical_cols) > 0:
             for col in categorical_cols:
+                mode = df[col].mode()
                 analysis['categorical_summary'][col] = {
-                    'unique_count': df[col].nunique(),
+                    'unique_count': frame.unique_counts[col],
                     'value_counts': df[col].value_counts().head(10).to_dict(),
-                    'mode': df[col].mode().iloc[0] if len(df[col].mode()) > 0 else None
+                    'mode': mode.iloc[0] if len(mode) > 0 else None
                 }
 
         # Datetime analysis
         if len(datetime_cols) > 0:
             for col in datetime_cols:
+                min_date, max_date = df[col].min(), df[col].max()
                 analysis['datetime_summary'][col] = {
-                    'min_date': df[col].min().isoformat() if pd.notna(df[col].min()) else None,
-                    'max_date': df[col].max().isoformat() if pd.notna(df[col].max()) else None,
-                    'date_range_days': (df[col].max() - df[col].min()).days if pd.notna(df[col].min()) and pd.notna(df[col].max()) else None
+                    'min_date': min_date.isoformat() if pd.notna(min_date) else None,
+                    'max_date': max_date.isoformat() if pd.notna(max_date) else None,
+                    'date_range_days': (max_date - min_date).days if pd.notna(min_date) and pd.notna(max_date) else None
                 }
 
         return analysis
 
     def _statistical_analysis(self, df: Any) -> Dict[str, Any]:
         """Perform advanced statistical analysis"""
-        numeric_cols = df.select_dtypes(include=[np.number]).columns
+        frame = analysis_frame(df)
+        numeric_cols = frame.numeric_cols
 
         if len(numeric_cols) == 0:
             return {'message': 'No numeric columns for statistical analysis'}
@@ -158,7 +197,7 @@ class AnalyticsService:
         }
 
         for col in numeric_cols:
-            data = df[col].dropna()
+            data = frame.series(col)
 
             if len(data) < 3:
                 continue
@@ -206,38 +245,33 @@ class AnalyticsService:
     def _generate_insights(self, df: Any, query: str) -> List[Dict[str, Any]]:
         """Generate actionable insights from data"""
         insights = []
-        numeric_cols = df.select_dtypes(include=[np.number]).columns
+        frame = analysis_frame(df)
+        df = frame.df
+        numeric_cols = frame.numeric_cols
 
         # Trend analysis for time series data
-        datetime_cols = df.select_dtypes(include=['datetime64']).columns
+        datetime_cols = frame.datetime_cols
         if len(datetime_cols) > 0 and len(numeric_cols) > 0:
             for date_col in datetime_cols:
-                for num_col in numeric_cols:
-                    try:
-                        # Sort by date and check for trends
-                        temp_df = df[[date_col, num_col]].dropna().sort_values(date_col)
-                        if len(temp_df) > 3:
-                            # Simple trend analysis using linear regression
-                            x = np.arange(len(temp_df))
-                            y = temp_df[num_col].values
-                            slope, _, r_value, p_value, _ = stats.linregress(x, y)
-
-                            if abs(r_value) > 0.3 and p_value < 0.05:
-                                trend_direction = "increasing" if slope > 0 else "decreasing"
-                                insights.append({
-                                    'type': 'trend',
-                                    'title': f"{num_col} shows {trend_direction} trend over time",
-                                    'description': f"Linear correlation: {r_value:.3f}, p-value: {p_value:.3f}",
-                                    'significance': abs(r_value),
-                                    'metric': num_col,
-                                    'value': slope
-                                })
-                    except:
-                        continue
+                # Sorted by date once, then a linear regression of every numeric column together
+                trends = frame.trends(date_col)
+                significant = (trends['n'] > 3) & (np.abs(trends['r_value']) > 0.3) & (trends['p_value'] < 0.05)
+                for index in np.flatnonzero(significant):
+                    num_col = numeric_cols[index]
+                    slope, r_value, p_value = (float(trends[key][index]) for key in ('slope', 'r_value', 'p_value'))
+                    trend_direction = "increasing" if slope > 0 else "decreasing"
+                    insights.append({
+                        'type': 'trend',
+                        'title': f"{num_col} shows {trend_direction} trend over time",
+                        'description': f"Linear correlation: {r_value:.3f}, p-value: {p_value:.3f}",
+                        'significance': abs(r_value),
+                        'metric': num_col,
+                        'value': slope
+                    })
 
         # Statistical outliers
         for col in numeric_cols:
-            data = df[col].dropna()
+            data = frame.series(col)
             if len(data) > 10:
                 z_scores = np.abs(stats.zscore(data))
                 outliers = np.sum(z_scores > 3)
@@ -253,20 +287,21 @@ class AnalyticsService:
 
         # High correlation insights
         if len(numeric_cols) > 1:
-            corr_matrix = df[numeric_cols].corr()
-            for i, col1 in enumerate(numeric_cols):
-                for j, col2 in enumerate(numeric_cols[i+1:], i+1):
-                    corr_value = corr_matrix.loc[col1, col2]
-                    if abs(corr_value) > 0.7:
-                        relationship = "strong positive" if corr_value > 0 else "strong negative"
-                        insights.append({
-                            'type': 'correlation',
-                            'title': f"{relationship} correlation between {col1} and {col2}",
-                            'description': f"Correlation coefficient: {corr_value:.3f}",
-                            'significance': abs(corr_value),
-                            'metric': f"{col1}_vs_{col2}",
-                            'value': corr_value
-                        })
+            # Each pair once: the strong correlations above the diagonal
+            corr_matrix = frame.correlations.to_numpy()
+            strong = np.triu(np.abs(corr_matrix) > 0.7, k=1)
+            for i, j in zip(*np.nonzero(strong)):
+                col1, col2 = numeric_cols[i], numeric_cols[j]
+                corr_value = float(corr_matrix[i, j])
+                relationship = "strong positive" if corr_value > 0 else "strong negative"
+                insights.append({
+                    'type': 'correlation',
+                    'title': f"{relationship} correlation between {col1} and {col2}",
+                    'description': f"Correlation coefficient: {corr_value:.3f}",
+                    'significance': abs(corr_value),
+                    'metric': f"{col1}_vs_{col2}",
+                    'value': corr_value
+                })
 
         # Sort insights by significance
         insights.sort(key=lambda x: x['significance'], reverse=True)
@@ -275,63 +310,63 @@ class AnalyticsService:
 
     def _generate_visualization_config(self, df: Any) -> List[Dict[str, Any]]:
         """Generate visualization configurations based on data types"""
-        viz_configs = []
-        numeric_cols = df.select_dtypes(include=[np.number]).columns
-        categorical_cols = df.select_dtypes(include=['object']).columns
-        datetime_cols = df.select_dtypes(include=['datetime64']).columns
-
-        # Histogram for numeric columns
-        for col in numeric_cols:
-            viz_configs.append({
-                'type': 'histogram',
-                'title': f'Distribution of {col}',
-                'x_column': col,
-                'description': f'Shows the frequency distribution of {col} values'
-            })
-
-        # Bar chart for categorical columns
-        for col in categorical_cols:
-            if df[col].nunique() <= 20:  # Only for reasonable number of categories
-                viz_configs.append({
-                    'type': 'bar',
-                    'title': f'Count by {col}',
+        frame = analysis_frame(df)
+        numeric_cols = frame.numeric_cols
+        categorical_cols = frame.categorical_cols
+        datetime_cols = frame.datetime_cols
+
+        def candidates():
+            # Histogram for numeric columns
+            for col in numeric_cols:
+                yield {
+                    'type': 'histogram',
+                    'title': f'Distribution of {col}',
                     'x_column': col,
-                    'description': f'Shows count of records for each {col} category'
-                })
+                    'description': f'Shows the frequency distribution of {col} values'
+                }
 
-        # Time series plots
-        if len(datetime_cols) > 0 and len(numeric_cols) > 0:
-            for date_col in datetime_cols:
-                for num_col in numeric_cols:
-                    viz_configs.append({
-                        'type': 'line',
-                        'title': f'{num_col} over time',
-                        'x_column': date_col,
-                        'y_column': num_col,
-                        'description': f'Shows how {num_col} changes over {date_col}'
-                    })
+            # Bar chart for categorical columns
+            for col in categorical_cols:
+                if frame.unique_counts[col] <= 20:  # Only for reasonable number of categories
+                    yield {
+                        'type': 'bar',
+                        'title': f'Count by {col}',
+                        'x_column': col,
+                        'description': f'Shows count of records for each {col} category'
+                    }
 
-        # Scatter plots for numeric correlations
-        if len(numeric_cols) >= 2:
-            for i, col1 in enumerate(numeric_cols):
-                for col2 in numeric_cols[i+1:]:
-                    viz_configs.append({
-                        'type': 'scatter',
-                        'title': f'{col1} vs {col2}',
-                        'x_column': col1,
-                        'y_column': col2,
-                        'description': f'Shows relationship between {col1} and {col2}'
-                    })
+            # Time series plots
+            for date_col, num_col in product(datetime_cols, numeric_cols):
+                yield {
+                    'type': 'line',
+                    'title': f'{num_col} over time',
+                    'x_column': date_col,
+                    'y_column': num_col,
+                    'description': f'Shows how {num_col} changes over {date_col}'
+                }
+
+            # Scatter plots for numeric correlations
+            for col1, col2 in combinations(numeric_cols, 2):
+                yield {
+                    'type': 'scatter',
+                    'title': f'{col1} vs {col2}',
+                    'x_column': col1,
+                    'y_column': col2,
+                    'description': f'Shows relationship between {col1} and {col2}'
+                }
 
-        return viz_configs[:8]  # Limit to 8 visualizations
+        # Limit to 8 visualizations, without building the pairs past them
+        return list(islice(candidates(), 8))
 
     def _generate_recommendations(self, df: Any, query: str) -> List[str]:
         """Generate actionable business recommendations"""
         recommendations = []
-        numeric_cols = df.select_dtypes(include=[np.number]).columns
+        frame = analysis_frame(df)
+        df = frame.df
+        numeric_cols = frame.numeric_cols
 
         # Data quality recommendations
-        missing_percentage = (df.isnull().sum() / len(df)) * 100
+        missing_percentage = (frame.missing / len(df)) * 100
         high_missing = missing_percentage[missing_percentage > 10]
 
         if len(high_missing) > 0:
@@ -349,7 +384,7 @@ class AnalyticsService:
 
         # Statistical recommendations
         for col in numeric_cols:
-            data = df[col].dropna()
+            data = frame.series(col)
             if len(data) > 0:
                 cv = stats.variation(data) if data.mean() != 0 else 0
                 if cv > 1:
@@ -379,107 +414,56 @@ class AnalyticsService:
         return recommendations[:5]  # Limit to 5 recommendations
 
     def calculate_business_metrics(self) -> Dict[str, Any]:
-        """Calculate key business metrics for the banking domain"""
+        """
+        Calculate key business metrics for the banking domain, in one round
+        trip (or concurrently, with ``ANALYTICS_METRICS_MODE=parallel``)
+        """
         metrics = {}
 
         try:
-            # Customer metrics
-            customer_stats = self.db_service.execute_safe_query("""
-                SELECT
-                    COUNT(*) as total_customers,
-                    COUNT(CASE WHEN customer_segment = 'premium' THEN 1 END) as premium_customers,
-                    AVG(credit_score) as avg_credit_score,
-                    AVG(annual_income) as avg_income
-                FROM customers
-            """)
-
-            if customer_stats['success'] and customer_stats['data']:
-                data = customer_stats['data'][0]  # [total_customers, premium_customers, avg_credit_score, avg_income]
-                total_customers = data[0] if len(data) > 0 else 0
-                premium_customers = data[1] if len(data) > 1 else 0
-                avg_credit_score = data[2] if len(data) > 2 else 0
-                avg_income = data[3] if len(data) > 3 else 0
+            rows = MetricsEngine(self.db_service).run(business_metric_queries())
 
+            # Customer metrics
+            customer_stats = rows['customer_stats']
+            if customer_stats:
+                total_customers = customer_stats['total_customers'] or 0
                 metrics['customer_metrics'] = {
                     'total_customers': total_customers,
-                    'premium_customer_rate': (premium_customers / max(total_customers, 1)) * 100,
-                    'avg_credit_score': avg_credit_score,
-                    'avg_annual_income': avg_income
+                    'premium_customer_rate': ((customer_stats['premium_customers'] or 0) / max(total_customers, 1)) * 100,
+                    'avg_credit_score': customer_stats['avg_credit_score'],
+                    'avg_annual_income': customer_stats['avg_income']
                 }
 
             # Account metrics
-            account_stats = self.db_service.execute_safe_query("""
-                SELECT
-                    COUNT(*) as total_accounts,
-                    SUM(balance) as total_balance,
-                    AVG(balance) as avg_balance,
-                    COUNT(CASE WHEN balance < 0 THEN 1 END) as negative_balance_accounts
-                FROM accounts
-                WHERE account_status = 'active'
-            """)
-
-            if account_stats['success'] and account_stats['data']:
-                data = account_stats['data'][0]  # [total_accounts, total_balance, avg_balance, negative_balance_accounts]
-                total_accounts = data[0] if len(data) > 0 else 0
-                total_balance = data[1] if len(data) > 1 else 0
-                avg_balance = data[2] if len(data) > 2 else 0
-                negative_balance_accounts = data[3] if len(data) > 3 else 0
-
+            account_stats = rows['account_stats']
+            if account_stats:
+                total_accounts = account_stats['total_accounts'] or 0
                 metrics['account_metrics'] = {
                     'total_accounts': total_accounts,
-                    'total_balance': total_balance,
-                    'avg_account_balance': avg_balance,
-                    'negative_balance_rate': (negative_balance_accounts / max(total_accounts, 1)) * 100
+                    'total_balance': account_stats['total_balance'],
+                    'avg_account_balance': account_stats['avg_balance'],
+                    'negative_balance_rate': ((account_stats['negative_balance_accounts'] or 0) / max(total_accounts, 1)) * 100
                 }
 
             # Loan metrics
-            loan_stats = self.db_service.execute_safe_query("""
-                SELECT
-                    COUNT(*) as total_loans,
-                    SUM(loan_amount) as total_loan_amount,
-                    SUM(outstanding_balance) as total_outstanding,
-                    COUNT(CASE WHEN loan_status = 'default' THEN 1 END) as defaulted_loans,
-                    AVG(interest_rate) as avg_interest_rate
-                FROM loans
-            """)
-
-            if loan_stats['success'] and loan_stats['data']:
-                data = loan_stats['data'][0]  # [total_loans, total_loan_amount, total_outstanding, defaulted_loans, avg_interest_rate]
-                total_loans = data[0] if len(data) > 0 else 0
-                total_loan_amount = data[1] if len(data) > 1 else 0
-                total_outstanding = data[2] if len(data) > 2 else 0
-                defaulted_loans = data[3] if len(data) > 3 else 0
-                avg_interest_rate = data[4] if len(data) > 4 else 0
-
+            loan_stats = rows['loan_stats']
+            if loan_stats:
+                total_loans = loan_stats['total_loans'] or 0
                 metrics['loan_metrics'] = {
                     'total_loans': total_loans,
-                    'total_loan_portfolio': total_loan_amount,
-                    'total_outstanding': total_outstanding,
-                    'default_rate': (defaulted_loans / max(total_loans, 1)) * 100,
-                    'avg_interest_rate': avg_interest_rate
+                    'total_loan_portfolio': loan_stats['total_loan_amount'],
+                    'total_outstanding': loan_stats['total_outstanding'],
+                    'default_rate': ((loan_stats['defaulted_loans'] or 0) / max(total_loans, 1)) * 100,
+                    'avg_interest_rate': loan_stats['avg_interest_rate']
                 }
 
             # Transaction volume (last 30 days)
-            transaction_stats = self.db_service.execute_safe_query("""
-                SELECT
-                    COUNT(*) as transaction_count,
-                    SUM(amount) as transaction_volume,
-                    AVG(amount) as avg_transaction_amount
-                FROM transactions
-                WHERE transaction_date >= CURRENT_DATE - INTERVAL '30 days'
-                AND status = 'completed'
-            """)
-
-            if transaction_stats['success'] and transaction_stats['data']:
-                data = transaction_stats['data'][0]  # [transaction_count, transaction_volume, avg_transaction_amount]
-                transaction_count = data[0] if len(data) > 0 else 0
-                transaction_volume = data[1] if len(data) > 1 else 0
-                avg_transaction_amount = data[2] if len(data) > 2 else 0
-
+            transaction_stats = rows['transaction_stats']
+            if transaction_stats:
                 metrics['transaction_metrics'] = {
-                    'monthly_transaction_count': transaction_count,
-                    'monthly_transaction_volume': transaction_volume,
-                    'avg_transaction_amount': avg_transaction_amount
+                    'monthly_transaction_count': transaction_stats['transaction_count'],
+                    'monthly_transaction_volume': transaction_stats['transaction_volume'],
+                    'avg_transaction_amount': transaction_stats['avg_transaction_amount']
                 }
 
             return {
@@ -499,33 +483,36 @@ class AnalyticsService:
         """Perform cohort analysis on customer data"""
         try:
             if cohort_type == 'customer_acquisition':
-                query = """
-                    WITH customer_cohorts AS (
+                if rollups_ready():
+                    result = self.db_service.execute_trusted_query(COHORT_ACTIVITY_QUERY)
+                else:
+                    query = """
+                        WITH customer_cohorts AS (
+                            SELECT
+                                c.customer_id,
+                                DATE_TRUNC('month', c.created_at) as cohort_month,
+                                DATE_TRUNC('month', t.transaction_date) as transaction_month,
+                                COUNT(t.transaction_id) as transaction_count,
+                                SUM(t.amount) as transaction_value
+                            FROM customers c
+                            LEFT JOIN accounts a ON c.customer_id = a.customer_id
+                            LEFT JOIN transactions t ON a.account_id = t.account_id
+                            WHERE c.created_at >= CURRENT_DATE - INTERVAL '12 months'
+                            GROUP BY c.customer_id, cohort_month, transaction_month
+                        )
                         SELECT
-                            c.customer_id,
-                            DATE_TRUNC('month', c.created_at) as cohort_month,
-                            DATE_TRUNC('month', t.transaction_date) as transaction_month,
-                            COUNT(t.transaction_id) as transaction_count,
-                            SUM(t.amount) as transaction_value
-                        FROM customers c
-                        LEFT JOIN accounts a ON c.customer_id = a.customer_id
-                        LEFT JOIN transactions t ON a.account_id = t.account_id
-                        WHERE c.created_at >= CURRENT_DATE - INTERVAL '12 months'
-                        GROUP BY c.customer_id, cohort_month, transaction_month
-                    )
-                    SELECT
-                        cohort_month,
-                        transaction_month,
-                        COUNT(DISTINCT customer_id) as active_customers,
-                        SUM(transaction_count) as total_transactions,
-                        SUM(transaction_value) as total_value
-                    FROM customer_cohorts
-                    WHERE transaction_month IS NOT NULL
-                    GROUP BY cohort_month, transaction_month
-                    ORDER BY cohort_month, transaction_month
-                """
-
-                result = self.db_service.execute_safe_query(query)
+                            cohort_month,
+                            transaction_month,
+                            COUNT(DISTINCT customer_id) as active_customers,
+                            SUM(transaction_count) as total_transactions,
+                            SUM(transaction_value) as total_value
+                        FROM customer_cohorts
+                        WHERE transaction_month IS NOT NULL
+                        GROUP BY cohort_month, transaction_month
+                        ORDER BY cohort_month, transaction_month
+                    """
+
+                    result = self.db_service.execute_safe_query(query)
 
                 if result['success']:
                     df = self._result_to_dataframe(result)
@@ -0,0 +1,202 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, NamedTuple, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from utils.caching import StaleWhileRevalidateCache
+from .metrics import business_metric_queries
+from .models import BusinessMetric
+
+logger = logging.getLogger(__name__)
+
+REFRESH_LOCK_KEY = 'business_metrics_refresh'
+
+
+class MetricSnapshotException(Exception):
+    """Exception raised when there is no snapshot and one can't be taken"""
+    pass
+
+
+class MetricDefinition(NamedTuple):
+    """How one value in ``calculate_business_metrics`` output is stored as a BusinessMetric"""
+    section: str
+    name: str
+    category: str
+    unit: str
+    is_kpi: bool
+    calculation_method: str
+
+
+METRIC_DEFINITIONS = [
+    MetricDefinition('customer_metrics', 'total_customers', 'customer', 'count', True, 'COUNT of customers'),
+    MetricDefinition('customer_metrics', 'premium_customer_rate', 'customer', 'percent', False,
+                     'Premium customers / all customers * 100'),
+    MetricDefinition('customer_metrics', 'avg_credit_score', 'customer', 'score', False, 'AVG credit_score'),
+    MetricDefinition('customer_metrics', 'avg_annual_income', 'customer', 'currency', False, 'AVG annual_income'),
+    MetricDefinition('account_metrics', 'total_accounts', 'financial', 'count', False, 'COUNT of active accounts'),
+    MetricDefinition('account_metrics', 'total_balance', 'financial', 'currency', True,
+                     'SUM balance of active accounts'),
+    MetricDefinition('account_metrics', 'avg_account_balance', 'financial', 'currency', False,
+                     'AVG balance of active accounts'),
+    MetricDefinition('account_metrics', 'negative_balance_rate', 'risk', 'percent', False,
+                     'Active accounts below zero / active accounts * 100'),
+    MetricDefinition('loan_metrics', 'total_loans', 'financial', 'count', False, 'COUNT of loans'),
+    MetricDefinition('loan_metrics', 'total_loan_portfolio', 'financial', 'currency', True, 'SUM loan_amount'),
+    MetricDefinition('loan_metrics', 'total_outstanding', 'financial', 'currency', False, 'SUM outstanding_balance'),
+    MetricDefinition('loan_metrics', 'default_rate', 'risk', 'percent', True, 'Defaulted loans / loans * 100'),
+    MetricDefinition('loan_metrics', 'avg_interest_rate', 'financial', 'percent', False, 'AVG interest_rate'),
+    MetricDefinition('transaction_metrics', 'monthly_transaction_count', 'operational', 'count', True,
+                     'COUNT of completed transactions, last 30 days'),
+    MetricDefinition('transaction_metrics', 'monthly_transaction_volume', 'operational', 'currency', False,
+                     'SUM amount of completed transactions, last 30 days'),
+    MetricDefinition('transaction_metrics', 'avg_transaction_amount', 'operational', 'currency', False,
+                     'AVG amount of completed transactions, last 30 days'),
+]
+
+# Which metric query each section is computed from
+SECTION_QUERIES = {
+    'customer_metrics': 'customer_stats',
+    'account_metrics': 'account_stats',
+    'loan_metrics': 'loan_stats',
+    'transaction_metrics': 'transaction_stats',
+}
+
+METRIC_SECTIONS = {definition.name: definition.section for definition in METRIC_DEFINITIONS}
+
+# The latest snapshot, so dashboard loads don't each query BusinessMetric
+snapshot_cache = StaleWhileRevalidateCache(
+    'business_metrics', settings.ANALYTICS_METRICS_CACHE_TTL, settings.ANALYTICS_METRICS_CACHE_MAX_AGE,
+)
+
+
+def _nest(snapshots: List[BusinessMetric]) -> Dict[str, Dict[str, float]]:
+    """Snapshot rows back in the sectioned shape the dashboard reads"""
+    metrics: Dict[str, Dict[str, float]] = {}
+    for snapshot in snapshots:
+        section = METRIC_SECTIONS.get(snapshot.name)
+        if section is not None:
+            metrics.setdefault(section, {})[snapshot.name] = snapshot.value
+    return metrics
+
+
+def take_metric_snapshot(service=None) -> Dict[str, Any]:
+    """
+    Calculate the business metrics and store them as one snapshot of
+    BusinessMetric rows sharing a ``calculated_at``
+    """
+    if service is None:
+        from .services import AnalyticsService
+        service = AnalyticsService()
+
+    result = service.calculate_business_metrics()
+    if not result.get('success'):
+        return result
+
+    calculated_at = timezone.now()
+    queries = {query.name: query.sql.strip() for query in business_metric_queries()}
+    snapshots = []
+    for definition in METRIC_DEFINITIONS:
+        value = result['metrics'].get(definition.section, {}).get(definition.name)
+        if value is None:
+            continue
+        snapshots.append(BusinessMetric(
+            name=definition.name,
+            category=definition.category,
+            value=float(value),
+            unit=definition.unit,
+            calculation_method=definition.calculation_method,
+            sql_query=queries.get(SECTION_QUERIES[definition.section], ''),
+            is_kpi=definition.is_kpi,
+            calculated_at=calculated_at,
+        ))
+    BusinessMetric.objects.bulk_create(snapshots)
+
+    metrics = _nest(snapshots)
+    snapshot_cache.set('latest', {'metrics': metrics, 'calculated_at': calculated_at})
+    logger.info(f"Stored business metric snapshot: {len(snapshots)} metrics")
+    return {
+        'success': True,
+        'metrics': metrics,
+        'calculated_at': calculated_at,
+        'count': len(snapshots),
+    }
+
+
+def latest_metric_snapshot() -> Optional[Dict[str, Any]]:
+    """The most recent snapshot's metrics and time, or None if none has been taken"""
+    latest = BusinessMetric.objects.order_by('-calculated_at').values_list('calculated_at', flat=True).first()
+    if latest is None:
+        return None
+    return {
+        'metrics': _nest(list(BusinessMetric.objects.filter(calculated_at=latest))),
+        'calculated_at': latest,
+    }
+
+
+def _latest_or_first_snapshot() -> Dict[str, Any]:
+    snapshot = latest_metric_snapshot()
+    if snapshot is not None:
+        return snapshot
+
+    result = take_metric_snapshot()
+    if not result.get('success'):
+        raise MetricSnapshotException(result.get('error', 'Failed to calculate metrics'))
+    return {'metrics': result['metrics'], 'calculated_at': result['calculated_at']}
+
+
+def current_metric_snapshot() -> Dict[str, Any]:
+    """
+    The latest snapshot, through the cache. Before the first scheduled
+    snapshot one is taken here, by one request while the others wait for it.
+    """
+    return snapshot_cache.get('latest', _latest_or_first_snapshot)
+
+
+def metric_series(start: datetime, end: datetime, names: Optional[List[str]] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """Each metric's snapshot values between ``start`` and ``end``, oldest first"""
+    queryset = BusinessMetric.objects.filter(calculated_at__gte=start, calculated_at__lte=end)
+    if names:
+        queryset = queryset.filter(name__in=names)
+
+    series: Dict[str, List[Dict[str, Any]]] = {}
+    for name, value, calculated_at in queryset.order_by('name', 'calculated_at').values_list(
+            'name', 'value', 'calculated_at'):
+        series.setdefault(name, []).append({'calculated_at': calculated_at.isoformat(), 'value': value})
+    return series
+
+
+def is_stale(calculated_at: datetime) -> bool:
+    """Whether a snapshot is older than the refresh schedule should allow"""
+    return timezone.now() - calculated_at > timedelta(seconds=settings.ANALYTICS_METRICS_SNAPSHOT_INTERVAL)
+
+
+def request_metric_refresh() -> bool:
+    """
+    Queue a snapshot in the background, at most once per snapshot interval
+    however many requests see the stale one. Returns whether one was queued.
+    """
+    from .tasks import snapshot_metrics_task
+
+    if not cache.add(REFRESH_LOCK_KEY, 1, int(settings.ANALYTICS_METRICS_SNAPSHOT_INTERVAL)):
+        return False
+    try:
+        snapshot_metrics_task.delay()
+        return True
+    except Exception as e:
+        cache.delete(REFRESH_LOCK_KEY)
+        logger.warning(f"Could not queue business metric refresh: {str(e)}")
+        return False
+
+
+def prune_metric_snapshots(retention_days: Optional[int] = None) -> int:
+    """Delete snapshots older than the retention window; returns how many rows went"""
+    retention_days = settings.ANALYTICS_METRICS_RETENTION_DAYS if retention_days is None else retention_days
+    if not retention_days:
+        return 0
+    deleted, _ = BusinessMetric.objects.filter(
+        calculated_at__lt=timezone.now() - timedelta(days=retention_days)
+    ).delete()
+    return deleted
@@ -0,0 +1,40 @@
+import json
+from celery import shared_task
+from rest_framework.renderers import JSONRenderer
+
+
+@shared_task(bind=True)
+def run_analysis_task(self, query: str, analysis_type: str, session_id: str = None) -> dict:
+    """
+    Run query execution and analytics on a worker, publishing progress
+    """
+    from .views import run_analysis
+
+    def on_progress(stage):
+        self.update_state(state='PROGRESS', meta={'stage': stage})
+
+    payload, status_code = run_analysis(query, analysis_type, session_id, on_progress=on_progress)
+
+    # Round-trip through the API renderer so the result backend gets plain JSON
+    return {'status_code': status_code, 'response': json.loads(JSONRenderer().render(payload))}
+
+
+@shared_task
+def refresh_rollups_task(full: bool = False) -> dict:
+    """
+    Bring the transaction rollups up to date; scheduled by celery beat
+    """
+    from .rollups import refresh_rollups
+
+    return refresh_rollups(full=full)
+
+
+@shared_task
+def snapshot_metrics_task() -> dict:
+    """
+    Store a business metric snapshot and drop ones past retention; scheduled by celery beat
+    """
+    from .snapshots import take_metric_snapshot, prune_metric_snapshots
+
+    result = take_metric_snapshot()
+    return {'success': result['success'], 'count': result.get('count', 0), 'pruned': prune_metric_snapshots()}
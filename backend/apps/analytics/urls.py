@@ -3,7 +3,10 @@ from . import views
 
 urlpatterns = [
     path('analyze/', views.analyze_data, name='analyze_data'),
+    path('jobs/<str:job_id>/', views.analysis_job_status, name='analytics_job_status'),
+    path('jobs/<str:job_id>/events/', views.analysis_job_events, name='analytics_job_events'),
     path('metrics/', views.business_metrics, name='business_metrics'),
+    path('metrics/series/', views.business_metric_series, name='business_metric_series'),
     path('cohort/', views.cohort_analysis, name='cohort_analysis'),
     path('reports/', views.analysis_reports, name='analysis_reports'),
     path('reports/<int:report_id>/', views.analysis_report_detail, name='analysis_report_detail'),
@@ -2,17 +2,28 @@ import logging
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from django.core.cache import cache
+from datetime import timedelta
+from django.utils import timezone
+from django.urls import reverse
+from django.views.decorators.http import require_GET
 from .services import AnalyticsService
 from .serializers import (
     AnalyticsRequestSerializer,
     CohortAnalysisRequestSerializer,
     BusinessMetricsRequestSerializer,
+    MetricSeriesRequestSerializer,
     AnalysisReportSerializer
 )
 from .models import AnalysisReport, DataInsight
+from .snapshots import (
+    current_metric_snapshot,
+    metric_series,
+    is_stale,
+    request_metric_refresh,
+)
 from apps.database.services import DatabaseService
 from apps.chat.models import ChatSession
+from utils.jobs import job_accepted, get_job_status, job_events_response
 
 logger = logging.getLogger(__name__)
 
@@ -20,7 +31,10 @@ logger = logging.getLogger(__name__)
 @api_view(['POST'])
 def analyze_data(request):
     """
-    Perform comprehensive data analysis on a SQL query result
+    Perform comprehensive data analysis on a SQL query result.
+
+    With ``async=true`` the analysis is queued on a worker and a job id is
+    returned immediately.
     """
     serializer = AnalyticsRequestSerializer(data=request.data)
     if not serializer.is_valid():
@@ -30,30 +44,63 @@ def analyze_data(request):
     analysis_type = serializer.validated_data['analysis_type']
     session_id = serializer.validated_data.get('session_id')
 
+    if serializer.validated_data['async'] or request.query_params.get('async', '').lower() == 'true':
+        try:
+            from .tasks import run_analysis_task
+            job = run_analysis_task.delay(query, analysis_type, session_id)
+        except Exception as e:
+            logger.error(f"Error queueing analysis job: {str(e)}")
+            return Response({
+                'error': 'Could not queue the analysis',
+                'success': False
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        return Response(job_accepted(
+            job.id,
+            status_url=reverse('analytics_job_status', args=[job.id]),
+            events_url=reverse('analytics_job_events', args=[job.id])
+        ), status=status.HTTP_202_ACCEPTED)
+
+    payload, status_code = run_analysis(query, analysis_type, session_id)
+    return Response(payload, status=status_code)
+
+
+def run_analysis(query: str, analysis_type: str, session_id: str = None, on_progress=None) -> tuple:
+    """
+    Execute a query, analyze the result and optionally save a report.
+    Returns the response body and HTTP status code.
+    """
+    def progress(stage):
+        if on_progress:
+            on_progress(stage)
+
     try:
         # Execute the query first
+        progress('execution')
         db_service = DatabaseService()
         query_result = db_service.execute_safe_query(query)
 
         if not query_result.get('success'):
-            return Response({
+            return {
                 'error': 'Query execution failed',
                 'query_error': query_result.get('error'),
                 'success': False
-            }, status=status.HTTP_400_BAD_REQUEST)
+            }, status.HTTP_400_BAD_REQUEST
 
         # Perform analytics
+        progress('analytics')
         analytics_service = AnalyticsService()
         analysis = analytics_service.analyze_query_result(query, query_result, analysis_type)
 
         if 'error' in analysis:
-            return Response({
+            return {
                 'error': analysis['error'],
                 'success': False
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            }, status.HTTP_500_INTERNAL_SERVER_ERROR
 
         # Save analysis report if session_id provided
         if session_id:
+            progress('report')
             try:
                 session, _ = ChatSession.objects.get_or_create(session_id=session_id)
 
@@ -86,57 +133,63 @@ def analyze_data(request):
             except Exception as e:
                 logger.warning(f"Could not save analysis report: {str(e)}")
 
-        return Response({
+        return {
             'success': True,
             'query_result': query_result,
             'analysis': analysis,
             'analysis_type': analysis_type
-        })
+        }, status.HTTP_200_OK
 
     except Exception as e:
         logger.error(f"Error in data analysis: {str(e)}")
-        return Response({
+        return {
             'error': f'Analysis failed: {str(e)}',
             'success': False
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        }, status.HTTP_500_INTERNAL_SERVER_ERROR
 
 
 @api_view(['GET'])
-def business_metrics(request):
+def analysis_job_status(request, job_id):
     """
-    Calculate and return key business metrics
+    Poll the status and result of a queued analysis
     """
     try:
-        # Check cache first
-        cache_key = 'business_metrics_dashboard'
-        cached_metrics = cache.get(cache_key)
+        return Response(get_job_status(job_id))
+    except Exception as e:
+        logger.error(f"Error reading analysis job {job_id}: {str(e)}")
+        return Response({
+            'error': 'Could not read job status',
+            'success': False
+        }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
-        if cached_metrics:
-            return Response({
-                'success': True,
-                'metrics': cached_metrics,
-                'cached': True
-            })
 
-        # Calculate metrics
-        analytics_service = AnalyticsService()
-        metrics_result = analytics_service.calculate_business_metrics()
+@require_GET
+def analysis_job_events(request, job_id):
+    """
+    Stream progress of a queued analysis as Server-Sent Events
+    """
+    return job_events_response(job_id)
 
-        if metrics_result.get('success'):
-            # Cache for 15 minutes
-            cache.set(cache_key, metrics_result['metrics'], 900)
 
-            return Response({
-                'success': True,
-                'metrics': metrics_result['metrics'],
-                'calculated_at': metrics_result['calculated_at'],
-                'cached': False
-            })
-        else:
-            return Response({
-                'error': metrics_result.get('error', 'Failed to calculate metrics'),
-                'success': False
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+@api_view(['GET'])
+def business_metrics(request):
+    """
+    Return the latest business metrics snapshot. A stale snapshot is still
+    served while a fresh one is taken in the background; metrics are only
+    computed inline when no snapshot exists yet.
+    """
+    try:
+        snapshot = current_metric_snapshot()
+        stale = is_stale(snapshot['calculated_at'])
+        if stale:
+            request_metric_refresh()
+
+        return Response({
+            'success': True,
+            'metrics': snapshot['metrics'],
+            'calculated_at': snapshot['calculated_at'].isoformat(),
+            'stale': stale
+        })
 
     except Exception as e:
         logger.error(f"Error calculating business metrics: {str(e)}")
@@ -146,6 +199,44 @@ def business_metrics(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+TIME_RANGES = {
+    '1d': timedelta(days=1),
+    '7d': timedelta(days=7),
+    '30d': timedelta(days=30),
+    '90d': timedelta(days=90),
+    '1y': timedelta(days=365),
+}
+
+
+@api_view(['GET'])
+def business_metric_series(request):
+    """
+    Return stored metric snapshots over a time range, one series per metric
+    """
+    serializer = MetricSeriesRequestSerializer(data=request.GET)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    end = serializer.validated_data.get('end') or timezone.now()
+    start = serializer.validated_data.get('start') or end - TIME_RANGES[serializer.validated_data['time_range']]
+    names = [name.strip() for name in serializer.validated_data.get('names', '').split(',') if name.strip()]
+
+    try:
+        return Response({
+            'success': True,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'series': metric_series(start, end, names)
+        })
+
+    except Exception as e:
+        logger.error(f"Error fetching metric series: {str(e)}")
+        return Response({
+            'error': f'Failed to fetch metric series: {str(e)}',
+            'success': False
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 @api_view(['POST'])
 def cohort_analysis(request):
     """
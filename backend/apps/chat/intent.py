@@ -0,0 +1,263 @@
+import logging
+import threading
+import time
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+INTENT_DATABASE = 'database'
+INTENT_ANALYTICS = 'analytics'
+INTENT_FOLLOW_UP = 'follow_up'
+INTENT_GENERAL = 'general'
+
+# Intents that go down the RAG + SQL path
+DATA_INTENTS = (INTENT_DATABASE, INTENT_ANALYTICS, INTENT_FOLLOW_UP)
+
+# Seed utterances used to build one centroid per intent
+INTENT_EXAMPLES = {
+    INTENT_DATABASE: [
+        "How many customers do we have?",
+        "Show me all accounts",
+        "List transactions from yesterday",
+        "What is the total balance across all accounts?",
+        "Find customers from New York",
+        "Show me the top 10 customers by account balance",
+        "Which loans are in default?",
+        "How big is my portfolio?",
+        "What's the average loan amount?",
+        "Give me the credit card limits for premium customers",
+        "Which branch has the most accounts?",
+        "Show recent loan payments",
+        "How much money was deposited last week?",
+        "List all business accounts",
+        "Who are our newest customers?",
+        "What is the outstanding balance on mortgages?",
+    ],
+    INTENT_ANALYTICS: [
+        "What is the trend of transaction volume over time?",
+        "Are there any outliers in account balances?",
+        "Is there a correlation between credit score and income?",
+        "Analyze customer retention by cohort",
+        "Forecast next month's loan payments",
+        "Show monthly growth in deposits",
+        "Detect unusual spending patterns in credit card transactions",
+        "Break down default rates by customer segment",
+        "Compare average balances across branches over the last year",
+        "What is the distribution of interest rates?",
+        "Give me a statistical summary of transaction amounts",
+        "How has the premium customer rate changed year over year?",
+    ],
+    INTENT_FOLLOW_UP: [
+        "What about last month?",
+        "And for savings accounts?",
+        "Can you break that down by branch?",
+        "Show me more",
+        "Only the top 5",
+        "Sort them by balance instead",
+        "What about the same for loans?",
+        "Now filter that to active ones",
+        "Why is that number so high?",
+        "Can you explain those results?",
+        "Same question but for 2023",
+        "Exclude the closed accounts from that",
+    ],
+    INTENT_GENERAL: [
+        "Tell me a joke",
+        "Get me a joke",
+        "What's the weather like?",
+        "Hello there",
+        "Hi, how are you?",
+        "Who won the football game yesterday?",
+        "Write me a poem about the ocean",
+        "What can you do?",
+        "Thank you!",
+        "Translate hello into French",
+        "What is the capital of France?",
+        "Recommend a good movie",
+        "Good morning",
+        "Who are you?",
+    ],
+}
+
+# Held-out labelled utterances for measuring accuracy and latency
+INTENT_EVALUATION_SET = [
+    ("How many active loans do we have?", INTENT_DATABASE),
+    ("Show me customers with delinquent loans", INTENT_DATABASE),
+    ("List mortgage loans over $300,000", INTENT_DATABASE),
+    ("What are the largest transactions this month?", INTENT_DATABASE),
+    ("Find all ATM transactions", INTENT_DATABASE),
+    ("What's my total exposure in personal loans?", INTENT_DATABASE),
+    ("Which customers have more than three credit cards?", INTENT_DATABASE),
+    ("How much do we hold in checking accounts?", INTENT_DATABASE),
+    ("Show the phone number of the downtown branch", INTENT_DATABASE),
+    ("Give me every payment made on loan 42", INTENT_DATABASE),
+    ("Is spending trending up for premium customers?", INTENT_ANALYTICS),
+    ("Find anomalies in credit card transactions", INTENT_ANALYTICS),
+    ("How does income relate to credit limit?", INTENT_ANALYTICS),
+    ("Predict which loans will default", INTENT_ANALYTICS),
+    ("Show retention of customers acquired in January", INTENT_ANALYTICS),
+    ("Plot weekly transaction volume for the past year", INTENT_ANALYTICS),
+    ("What is the variance of account balances by branch?", INTENT_ANALYTICS),
+    ("And what about checking accounts?", INTENT_FOLLOW_UP),
+    ("Break that down by month", INTENT_FOLLOW_UP),
+    ("Just show me the first three", INTENT_FOLLOW_UP),
+    ("Same thing for last quarter", INTENT_FOLLOW_UP),
+    ("Can you sort those by date?", INTENT_FOLLOW_UP),
+    ("Why did that drop?", INTENT_FOLLOW_UP),
+    ("Tell me something funny", INTENT_GENERAL),
+    ("What's the time in Tokyo?", INTENT_GENERAL),
+    ("Hey!", INTENT_GENERAL),
+    ("Can you write a haiku?", INTENT_GENERAL),
+    ("Who is the president of the United States?", INTENT_GENERAL),
+    ("Thanks, that's all", INTENT_GENERAL),
+    ("What's your name?", INTENT_GENERAL),
+]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class IntentClassifier:
+    """
+    Nearest-centroid intent classifier over sentence embeddings.
+
+    Centroids are computed once from ``INTENT_EXAMPLES``; classifying an
+    already-encoded message is a single (n_intents x dim) dot product.
+    """
+
+    def __init__(self, model=None, threshold: Optional[float] = None,
+                 examples: Optional[Dict[str, List[str]]] = None):
+        if model is None:
+            from apps.embeddings.services import get_embedding_model
+            model = get_embedding_model()
+        self.model = model
+        self.threshold = settings.INTENT_CONFIDENCE_THRESHOLD if threshold is None else threshold
+        self.intents, self.centroids = self._build_centroids(examples or INTENT_EXAMPLES)
+
+    def _build_centroids(self, examples: Dict[str, List[str]]) -> Tuple[List[str], np.ndarray]:
+        intents = list(examples.keys())
+        centroids = []
+        for intent in intents:
+            vectors = _normalize(np.asarray(self.model.encode(examples[intent]), dtype=np.float32))
+            centroids.append(vectors.mean(axis=0))
+        return intents, _normalize(np.vstack(centroids))
+
+    def encode(self, message: str) -> np.ndarray:
+        """Encode a message with the shared embedding model"""
+        return np.asarray(self.model.encode(message), dtype=np.float32)
+
+    def classify_embedding(self, embedding: Sequence[float]) -> Dict[str, Any]:
+        """
+        Classify a pre-computed message embedding
+        """
+        vector = _normalize(np.asarray(embedding, dtype=np.float32))
+        scores = self.centroids @ vector
+        best = int(np.argmax(scores))
+        confidence = float(scores[best])
+
+        return {
+            'intent': self.intents[best],
+            'confidence': confidence,
+            'confident': confidence >= self.threshold,
+            'scores': {intent: float(score) for intent, score in zip(self.intents, scores)},
+        }
+
+    def classify(self, message: str) -> Dict[str, Any]:
+        """
+        Encode and classify a message. The embedding is returned so callers
+        can reuse it for schema retrieval.
+        """
+        embedding = self.encode(message)
+        prediction = self.classify_embedding(embedding)
+        prediction['embedding'] = embedding
+        return prediction
+
+    def evaluate(self, samples: Sequence[Tuple[str, str]] = INTENT_EVALUATION_SET) -> Dict[str, Any]:
+        """
+        Report accuracy and latency on a labelled evaluation set.
+
+        Encoding and centroid scoring are timed separately, since the encoded
+        message is shared with schema retrieval.
+        """
+        encode_ms = []
+        classify_ms = []
+        correct = 0
+        confident = 0
+        per_intent = {intent: {'total': 0, 'correct': 0} for intent in self.intents}
+        errors = []
+
+        for text, expected in samples:
+            start = time.perf_counter()
+            embedding = self.encode(text)
+            encoded_at = time.perf_counter()
+            prediction = self.classify_embedding(embedding)
+            done = time.perf_counter()
+
+            encode_ms.append((encoded_at - start) * 1000)
+            classify_ms.append((done - encoded_at) * 1000)
+
+            stats = per_intent.setdefault(expected, {'total': 0, 'correct': 0})
+            stats['total'] += 1
+            if prediction['confident']:
+                confident += 1
+            if prediction['intent'] == expected:
+                correct += 1
+                stats['correct'] += 1
+            else:
+                errors.append({
+                    'text': text,
+                    'expected': expected,
+                    'predicted': prediction['intent'],
+                    'confidence': prediction['confidence'],
+                })
+
+        total = len(samples)
+        return {
+            'samples': total,
+            'accuracy': correct / total if total else 0.0,
+            'confident_rate': confident / total if total else 0.0,
+            'threshold': self.threshold,
+            'per_intent': {
+                intent: {**stats, 'accuracy': stats['correct'] / stats['total'] if stats['total'] else 0.0}
+                for intent, stats in per_intent.items()
+            },
+            'latency_ms': {
+                'encode': _latency_summary(encode_ms),
+                'classify': _latency_summary(classify_ms),
+            },
+            'errors': errors,
+        }
+
+
+def _latency_summary(samples_ms: List[float]) -> Dict[str, float]:
+    if not samples_ms:
+        return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0}
+    values = np.asarray(samples_ms)
+    return {
+        'p50': float(np.percentile(values, 50)),
+        'p95': float(np.percentile(values, 95)),
+        'p99': float(np.percentile(values, 99)),
+        'max': float(values.max()),
+    }
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+
+def get_intent_classifier() -> IntentClassifier:
+    """
+    Return the process-wide classifier, building centroids on first use
+    """
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                _classifier = IntentClassifier()
+    return _classifier
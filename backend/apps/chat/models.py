@@ -27,6 +27,7 @@ class ChatMessage(models.Model):
     content = models.TextField()
     sql_query = models.TextField(blank=True, null=True)
     sql_result = models.JSONField(blank=True, null=True)
+    trace = models.JSONField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -0,0 +1,140 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, List, Optional
+
+from django.conf import settings
+
+from utils.tracing import span
+
+logger = logging.getLogger(__name__)
+
+STAGE_INTENT = 'intent'
+STAGE_RETRIEVAL = 'retrieval'
+STAGE_SQL_GENERATION = 'sql_generation'
+STAGE_EXECUTION = 'execution'
+STAGE_ANALYTICS = 'analytics'
+STAGE_INSIGHTS = 'insights'
+STAGE_NARRATIVE = 'narrative'
+
+# Largest share of the request deadline each stage may use. Analytics runs
+# alongside the narrative, so the shares intentionally sum to more than 1.
+STAGE_BUDGET_SHARES = {
+    STAGE_INTENT: 0.05,
+    STAGE_RETRIEVAL: 0.10,
+    STAGE_SQL_GENERATION: 0.40,
+    STAGE_EXECUTION: 0.30,
+    STAGE_ANALYTICS: 0.20,
+    STAGE_INSIGHTS: 0.05,
+    STAGE_NARRATIVE: 0.40,
+}
+
+# Optional stages are skipped when less than this many seconds are left for them
+OPTIONAL_STAGE_MINIMUMS = {
+    STAGE_ANALYTICS: 0.5,
+    STAGE_INSIGHTS: 0.0,
+    STAGE_NARRATIVE: 2.0,
+}
+
+
+class DeadlineExceeded(Exception):
+    """Exception raised when a required stage has no time budget left"""
+    pass
+
+
+class RequestPipeline:
+    """
+    Per-request deadline split into stage budgets.
+
+    Required stages raise ``DeadlineExceeded`` once the deadline has passed;
+    optional stages (analytics, insights, narrative) are skipped or
+    downgraded instead, and recorded in ``degraded``.
+    """
+
+    def __init__(self, deadline: Optional[float] = None, on_stage: Optional[Callable[[str, Dict[str, Any]], None]] = None):
+        self.deadline = settings.CHAT_REQUEST_DEADLINE if deadline is None else deadline
+        self.on_stage = on_stage
+        self.started_at = time.monotonic()
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.degraded: List[str] = []
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - self.elapsed())
+
+    def budget_for(self, stage: str) -> float:
+        """Seconds the stage may use: its share of the deadline, capped by what is left"""
+        return min(STAGE_BUDGET_SHARES.get(stage, 1.0) * self.deadline, self.remaining())
+
+    def can_run(self, stage: str) -> bool:
+        """Whether an optional stage still fits in the remaining budget"""
+        budget = self.budget_for(stage)
+        return budget > 0 and budget >= OPTIONAL_STAGE_MINIMUMS.get(stage, 0.0)
+
+    @contextmanager
+    def stage(self, name: str, required: bool = True):
+        """
+        Time a stage against its budget. Yields the budget in seconds.
+        """
+        budget = self.budget_for(name)
+        if required and budget <= 0:
+            self._record(name, 'deadline_exceeded', 0.0, budget)
+            raise DeadlineExceeded(f"No time left for {name} after {self.elapsed():.1f}s")
+
+        self._notify(name, {'status': 'running', 'budget_ms': round(budget * 1000, 1)})
+        start = time.monotonic()
+        status = 'ok'
+        try:
+            with span(f'chat.{name}'):
+                yield budget
+        except Exception:
+            status = 'error'
+            raise
+        finally:
+            stage_elapsed = time.monotonic() - start
+            if status == 'ok' and stage_elapsed > budget:
+                status = 'over_budget'
+                if not required and name not in self.degraded:
+                    # An optional stage that ran out of time fell back to a cheaper result
+                    self.degraded.append(name)
+            self._record(name, status, stage_elapsed, budget)
+
+    def record(self, name: str, elapsed: float, budget: float):
+        """Record a stage that ran outside a ``stage()`` block, e.g. on a worker thread"""
+        self._record(name, 'ok' if elapsed <= budget else 'over_budget', elapsed, budget)
+
+    def degrade(self, name: str, reason: str, status: str = 'skipped', elapsed: float = 0.0):
+        """Record that an optional stage was skipped or downgraded"""
+        logger.info(f"Chat stage {name} {status}: {reason}")
+        self._record(name, status, elapsed, self.budget_for(name), reason=reason)
+        if name not in self.degraded:
+            self.degraded.append(name)
+
+    def _record(self, name: str, status: str, elapsed: float, budget: float, reason: Optional[str] = None):
+        entry = {
+            'status': status,
+            'elapsed_ms': round(elapsed * 1000, 1),
+            'budget_ms': round(budget * 1000, 1),
+        }
+        if reason:
+            entry['reason'] = reason
+        self.stages[name] = entry
+        self._notify(name, entry)
+
+    def _notify(self, name: str, entry: Dict[str, Any]):
+        if self.on_stage is None:
+            return
+        try:
+            self.on_stage(name, entry)
+        except Exception as e:
+            logger.warning(f"Stage listener failed for {name}: {str(e)}")
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            'deadline_ms': round(self.deadline * 1000, 1),
+            'elapsed_ms': round(self.elapsed() * 1000, 1),
+            'stages': self.stages,
+            'degraded': self.degraded,
+        }
@@ -5,7 +5,7 @@ from .models import ChatSession, ChatMessage
 class ChatMessageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ChatMessage
-        fields = ['id', 'message_type', 'content', 'sql_query', 'sql_result', 'created_at']
+        fields = ['id', 'message_type', 'content', 'sql_query', 'sql_result', 'trace', 'created_at']
 
 
 class ChatSessionSerializer(serializers.ModelSerializer):
@@ -18,4 +18,10 @@ class ChatSessionSerializer(serializers.ModelSerializer):
 
 class ChatRequestSerializer(serializers.Serializer):
     message = serializers.CharField(max_length=5000)
-    session_id = serializers.CharField(max_length=255, required=False)
\ No newline at end of file
+    session_id = serializers.CharField(max_length=255, required=False)
+
+    def get_fields(self):
+        # 'async' is a reserved word, so it can't be declared as a class attribute
+        fields = super().get_fields()
+        fields['async'] = serializers.BooleanField(required=False, default=False)
+        return fields
\ No newline at end of file
@@ -0,0 +1,25 @@
+import json
+from celery import shared_task
+from django.conf import settings
+from rest_framework.renderers import JSONRenderer
+
+
+@shared_task(bind=True)
+def process_chat_message_task(self, message: str, session_id: str) -> dict:
+    """
+    Run the chat pipeline on a worker, publishing stage progress
+    """
+    from .views import process_chat_message
+
+    stages = {}
+
+    def on_stage(stage, entry):
+        stages[stage] = entry
+        self.update_state(state='PROGRESS', meta={'stage': stage, 'stages': stages})
+
+    payload, status_code = process_chat_message(
+        message, session_id, deadline=settings.CHAT_JOB_DEADLINE, on_stage=on_stage
+    )
+
+    # Round-trip through the API renderer so the result backend gets plain JSON
+    return {'status_code': status_code, 'response': json.loads(JSONRenderer().render(payload))}
@@ -5,4 +5,7 @@ urlpatterns = [
     path('', views.chat, name='chat'),
     path('sessions/', views.list_sessions, name='list_sessions'),
     path('sessions/<str:session_id>/', views.get_session, name='get_session'),
+    path('traces/stats/', views.trace_stats, name='trace_stats'),
+    path('jobs/<str:job_id>/', views.chat_job_status, name='chat_job_status'),
+    path('jobs/<str:job_id>/events/', views.chat_job_events, name='chat_job_events'),
 ]
\ No newline at end of file
@@ -1,23 +1,45 @@
 import uuid
 import logging
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import timedelta
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
+from django.conf import settings
 from django.core.cache import cache
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.http import require_GET
 
 from .models import ChatSession, ChatMessage
 from .serializers import ChatRequestSerializer, ChatSessionSerializer, ChatMessageSerializer
+from .intent import get_intent_classifier, DATA_INTENTS, INTENT_DATABASE, INTENT_GENERAL, INTENT_FOLLOW_UP
+from .pipeline import (
+    RequestPipeline, DeadlineExceeded, STAGE_INTENT, STAGE_RETRIEVAL, STAGE_SQL_GENERATION,
+    STAGE_EXECUTION, STAGE_ANALYTICS, STAGE_INSIGHTS, STAGE_NARRATIVE
+)
 from apps.embeddings.services import EmbeddingService
 from apps.database.services import DatabaseService
 from utils.llm_client import LLMClient
+from utils.jobs import job_accepted, get_job_status, job_events_response
+from utils.tracing import start_trace, aggregate_spans
 
 logger = logging.getLogger(__name__)
 
+_pipeline_executor = None
+_pipeline_executor_lock = threading.Lock()
+
 
 @api_view(['POST'])
 def chat(request):
     """
-    Handle chat messages and generate SQL queries using RAG
+    Handle chat messages and generate SQL queries using RAG.
+
+    With ``async=true`` the message is queued on a worker and a job id is
+    returned immediately.
     """
     serializer = ChatRequestSerializer(data=request.data)
     if not serializer.is_valid():
@@ -26,6 +48,40 @@ def chat(request):
     message = serializer.validated_data['message']
     session_id = serializer.validated_data.get('session_id', str(uuid.uuid4()))
 
+    if serializer.validated_data['async'] or request.query_params.get('async', '').lower() == 'true':
+        try:
+            from .tasks import process_chat_message_task
+            job = process_chat_message_task.delay(message, session_id)
+        except Exception as e:
+            logger.error(f"Error queueing chat job: {str(e)}")
+            return Response({
+                'error': 'Could not queue the request',
+                'success': False
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        return Response(job_accepted(
+            job.id,
+            status_url=reverse('chat_job_status', args=[job.id]),
+            events_url=reverse('chat_job_events', args=[job.id]),
+            session_id=session_id
+        ), status=status.HTTP_202_ACCEPTED)
+
+    payload, status_code = process_chat_message(message, session_id)
+    return Response(payload, status=status_code)
+
+
+def process_chat_message(message: str, session_id: str, deadline: float = None, on_stage=None) -> tuple:
+    """
+    Run the chat pipeline for one message and persist both sides of the
+    exchange. Returns the response body and HTTP status code.
+    """
+    pipeline = RequestPipeline(deadline=deadline, on_stage=on_stage)
+
+    with start_trace() as trace:
+        return _process_chat_message(message, session_id, pipeline, trace)
+
+
+def _process_chat_message(message: str, session_id: str, pipeline: RequestPipeline, trace) -> tuple:
     try:
         # Get or create chat session
         session, created = ChatSession.objects.get_or_create(session_id=session_id)
@@ -37,11 +93,21 @@ def chat(request):
             content=message
         )
 
-        # Check if this is a database-related query
-        if _is_database_query(message):
-            response_content, sql_query, sql_result = _handle_database_query(message)
+        # Route on the classified intent
+        with pipeline.stage(STAGE_INTENT):
+            intent = _classify_intent(message)
+        if intent['intent'] in DATA_INTENTS:
+            question = message
+            query_embedding = intent.get('embedding')
+            if intent['intent'] == INTENT_FOLLOW_UP:
+                question = _resolve_follow_up(session, message, exclude_id=user_message.id)
+                if question != message:
+                    query_embedding = None
+            response_content, sql_query, sql_result = _handle_database_query(
+                question, query_embedding=query_embedding, pipeline=pipeline
+            )
         else:
-            response_content = _handle_general_query(message)
+            response_content = _handle_general_query(message, pipeline=pipeline)
             sql_query = None
             sql_result = None
 
@@ -51,21 +117,77 @@ def chat(request):
             message_type='assistant',
             content=response_content,
             sql_query=sql_query,
-            sql_result=sql_result
+            sql_result=sql_result,
+            trace=trace.to_dict()
         )
 
-        return Response({
+        return {
             'session_id': session_id,
             'message': ChatMessageSerializer(assistant_message).data,
+            'intent': {
+                'intent': intent['intent'],
+                'confidence': intent['confidence'],
+                'source': intent['source']
+            },
+            'pipeline': pipeline.report(),
             'success': True
-        })
+        }, status.HTTP_200_OK
 
     except Exception as e:
         logger.error(f"Error in chat endpoint: {str(e)}")
-        return Response({
+        return {
             'error': 'An error occurred processing your request',
             'success': False
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        }, status.HTTP_500_INTERNAL_SERVER_ERROR
+
+
+@api_view(['GET'])
+def chat_job_status(request, job_id):
+    """
+    Poll the status and result of a queued chat message
+    """
+    try:
+        return Response(get_job_status(job_id))
+    except Exception as e:
+        logger.error(f"Error reading chat job {job_id}: {str(e)}")
+        return Response({
+            'error': 'Could not read job status',
+            'success': False
+        }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+@require_GET
+def chat_job_events(request, job_id):
+    """
+    Stream progress of a queued chat message as Server-Sent Events
+    """
+    return job_events_response(job_id)
+
+
+@api_view(['GET'])
+def trace_stats(request):
+    """
+    Aggregate p50/p95/p99 latency per pipeline stage over a time window
+    """
+    try:
+        window = int(request.GET.get('window', 3600))  # seconds
+    except ValueError:
+        return Response({'error': 'window must be an integer number of seconds'}, status=status.HTTP_400_BAD_REQUEST)
+
+    since = timezone.now() - timedelta(seconds=window)
+    traces = ChatMessage.objects.filter(
+        message_type='assistant',
+        created_at__gte=since,
+        trace__isnull=False
+    ).order_by('-created_at').values_list('trace', flat=True)[:settings.TRACE_STATS_MAX_MESSAGES]
+    traces = list(traces)
+
+    return Response({
+        'success': True,
+        'window_seconds': window,
+        'message_count': len(traces),
+        'stages': aggregate_spans(traces)
+    })
 
 
 @api_view(['GET'])
@@ -91,9 +213,42 @@ def list_sessions(request):
     return Response(serializer.data)
 
 
+def _classify_intent(message: str) -> dict:
+    """
+    Classify the message intent with the embedding classifier, falling back
+    to keyword routing when the classifier is unavailable or not confident
+    """
+    prediction = None
+    try:
+        prediction = get_intent_classifier().classify(message)
+    except Exception as e:
+        logger.warning(f"Intent classifier unavailable, using keyword routing: {str(e)}")
+
+    if prediction and prediction['confident']:
+        prediction['source'] = 'classifier'
+        return prediction
+
+    return {
+        'intent': INTENT_DATABASE if _is_database_query(message) else INTENT_GENERAL,
+        'confidence': prediction['confidence'] if prediction else 0.0,
+        'embedding': prediction['embedding'] if prediction else None,
+        'source': 'keywords'
+    }
+
+
+def _resolve_follow_up(session, message: str, exclude_id=None) -> str:
+    """
+    Prefix a follow-up message with the previous user question in the session
+    """
+    previous = session.messages.filter(message_type='user').exclude(id=exclude_id).order_by('-created_at').first()
+    if not previous:
+        return message
+    return f"{previous.content}\nFollow-up: {message}"
+
+
 def _is_database_query(message: str) -> bool:
     """
-    Determine if the message is asking for database information
+    Keyword fallback for determining if the message is asking for database information
     """
     database_keywords = [
         'show', 'select', 'query', 'database', 'table', 'customer', 'account',
@@ -104,57 +259,168 @@ def _is_database_query(message: str) -> bool:
     return any(keyword in message_lower for keyword in database_keywords)
 
 
-def _handle_database_query(message: str) -> tuple:
+def _handle_database_query(message: str, query_embedding=None, pipeline: RequestPipeline = None) -> tuple:
     """
-    Handle database-related queries using RAG and analytics
+    Handle database-related queries using RAG and analytics, within the
+    stage budgets of the request pipeline
     """
+    if pipeline is None:
+        pipeline = RequestPipeline()
+
     try:
-        # Get relevant schema using embeddings
+        # Get relevant schema using embeddings, reusing the intent embedding when available
         embedding_service = EmbeddingService()
-        relevant_schemas = embedding_service.search_similar_schemas(message)
+        if query_embedding is not None:
+            query_embedding = list(map(float, query_embedding))
+        with pipeline.stage(STAGE_RETRIEVAL):
+            relevant_schemas = embedding_service.search_similar_schemas(message, query_embedding=query_embedding)
 
-        # Generate SQL query using LLM
+        # Generate SQL query using LLM, repairing references the schema doesn't have
         llm_client = LLMClient()
-        sql_query = llm_client.generate_sql(message, relevant_schemas)
+        db_service = DatabaseService()
+        with pipeline.stage(STAGE_SQL_GENERATION) as budget:
+            sql_query = _generate_valid_sql(llm_client, db_service, message, relevant_schemas, budget)
 
         # Execute SQL query
-        db_service = DatabaseService()
-        result = db_service.execute_safe_query(sql_query)
+        with pipeline.stage(STAGE_EXECUTION) as budget:
+            result = db_service.execute_safe_query(sql_query, timeout=budget)
 
-        # Perform analytics if query was successful and returned data
-        analysis_result = None
+        # Run CPU-bound analytics alongside the network-bound narrative call
+        analytics_future = None
         if result.get('success') and result.get('data'):
-            try:
-                from apps.analytics.services import AnalyticsService
-                analytics_service = AnalyticsService()
+            if pipeline.can_run(STAGE_ANALYTICS):
+                analytics_budget = pipeline.budget_for(STAGE_ANALYTICS)
+                analytics_started = time.monotonic()
+                analytics_future = _get_pipeline_executor().submit(
+                    contextvars.copy_context().run, _run_analytics, message, sql_query, result,
+                    analytics_started + analytics_budget
+                )
+            else:
+                pipeline.degrade(STAGE_ANALYTICS, 'insufficient time budget')
+
+        # Generate the natural language response once
+        response = _generate_narrative(llm_client, message, sql_query, result, pipeline)
 
-                # Determine analysis type based on query content
-                analysis_type = _determine_analysis_type(message)
-                analysis_result = analytics_service.analyze_query_result(sql_query, result, analysis_type)
-
-                # Enhance response with insights
-                if analysis_result and not analysis_result.get('error'):
-                    enhanced_response = _generate_enhanced_response(message, sql_query, result, analysis_result, llm_client)
-                    return enhanced_response, sql_query, {**result, 'analysis': analysis_result}
-
-            except Exception as analytics_error:
-                logger.warning(f"Analytics failed, using basic response: {str(analytics_error)}")
-
-        # Generate standard natural language response
-        response = llm_client.generate_response(message, sql_query, result)
+        analysis_result = None
+        if analytics_future:
+            wait = min(analytics_budget - (time.monotonic() - analytics_started), pipeline.remaining())
+            try:
+                analysis_result = analytics_future.result(timeout=max(0.0, wait))
+                pipeline.record(STAGE_ANALYTICS, time.monotonic() - analytics_started, analytics_budget)
+            except FutureTimeoutError:
+                # Drops it if still queued; once running it stops itself at its deadline
+                analytics_future.cancel()
+                pipeline.degrade(STAGE_ANALYTICS, 'timed out', status='timeout',
+                                 elapsed=time.monotonic() - analytics_started)
 
-        # Add analysis result if available
-        final_result = result
         if analysis_result and not analysis_result.get('error'):
-            final_result = {**result, 'analysis': analysis_result}
+            if pipeline.can_run(STAGE_INSIGHTS):
+                with pipeline.stage(STAGE_INSIGHTS, required=False):
+                    response = _merge_insights(response, analysis_result)
+            else:
+                pipeline.degrade(STAGE_INSIGHTS, 'insufficient time budget')
+            return response, sql_query, {**result, 'analysis': analysis_result}
 
-        return response, sql_query, final_result
+        if STAGE_ANALYTICS in pipeline.degraded:
+            pipeline.degrade(STAGE_INSIGHTS, 'analytics unavailable')
 
+        return response, sql_query, result
+
+    except DeadlineExceeded as e:
+        logger.warning(f"Chat request exceeded its deadline: {str(e)}")
+        return "Sorry, answering this question took too long. Please try a more specific question.", None, None
     except Exception as e:
         logger.error(f"Error handling database query: {str(e)}")
         return f"Sorry, I encountered an error while processing your query: {str(e)}", None, None
 
 
+def _generate_valid_sql(llm_client, db_service, message: str, relevant_schemas, budget: float) -> str:
+    """
+    Generate SQL and check it against the schema catalog, feeding any
+    unknown tables or columns back to the LLM up to ``SQL_REPAIR_MAX_ATTEMPTS``
+    times while the stage budget lasts. The last attempt is returned even if
+    still invalid; execution then reports its errors without running it.
+    """
+    started = time.monotonic()
+    sql_query = llm_client.generate_sql(message, relevant_schemas, timeout=budget)
+
+    for attempt in range(settings.SQL_REPAIR_MAX_ATTEMPTS):
+        errors = db_service.validate_query(sql_query)
+        if not errors:
+            break
+        remaining = budget - (time.monotonic() - started)
+        if remaining <= 0:
+            break
+        logger.info(f"Repairing generated SQL (attempt {attempt + 1}): {'; '.join(errors)}")
+        sql_query = llm_client.generate_sql(message, relevant_schemas, timeout=remaining,
+                                            previous_sql=sql_query, errors=errors)
+
+    return sql_query
+
+
+def _generate_narrative(llm_client, message: str, sql_query: str, result: dict, pipeline: RequestPipeline) -> str:
+    """
+    Generate the LLM narrative, or a templated summary when the budget is short
+    """
+    if not pipeline.can_run(STAGE_NARRATIVE):
+        pipeline.degrade(STAGE_NARRATIVE, 'insufficient time budget', status='degraded')
+        return _summarize_result(result)
+
+    with pipeline.stage(STAGE_NARRATIVE, required=False) as budget:
+        return llm_client.generate_response(message, sql_query, result, timeout=budget)
+
+
+def _summarize_result(result: dict) -> str:
+    """Describe query results without an LLM call"""
+    if not result.get('success'):
+        return f"The query failed: {result.get('error', 'Unknown error')}"
+
+    row_count = result.get('row_count', 0)
+    if row_count == 0:
+        return "The query returned no results."
+
+    columns = result.get('columns', [])
+    summary = f"The query returned {row_count} row(s)"
+    if columns:
+        summary += f" with columns: {', '.join(columns)}"
+    return summary + "."
+
+
+def _get_pipeline_executor() -> ThreadPoolExecutor:
+    """
+    Return the shared, bounded executor for chat pipeline side work. A
+    thread can't be interrupted, so work the request stops waiting for must
+    stop itself at its deadline to give its worker back (see ``_run_analytics``)
+    """
+    global _pipeline_executor
+    if _pipeline_executor is None:
+        with _pipeline_executor_lock:
+            if _pipeline_executor is None:
+                _pipeline_executor = ThreadPoolExecutor(
+                    max_workers=settings.CHAT_PIPELINE_WORKERS,
+                    thread_name_prefix='chat-pipeline'
+                )
+    return _pipeline_executor
+
+
+def _run_analytics(message: str, sql_query: str, result: dict, deadline: float = None):
+    """
+    Analyze query results, returning None if analytics fails. Past
+    ``deadline`` (a ``time.monotonic()`` value) no further section starts.
+    """
+    try:
+        from apps.analytics.services import AnalyticsService
+        analytics_service = AnalyticsService()
+
+        # Determine analysis type based on query content
+        analysis_type = _determine_analysis_type(message)
+        return analytics_service.analyze_query_result(sql_query, result, analysis_type, deadline=deadline)
+
+    except Exception as analytics_error:
+        logger.warning(f"Analytics failed, using basic response: {str(analytics_error)}")
+        return None
+
+
 def _determine_analysis_type(message: str) -> str:
     """Determine the appropriate analysis type based on the user's message"""
     message_lower = message.lower()
@@ -173,11 +439,10 @@ def _determine_analysis_type(message: str) -> str:
         return 'descriptive'
 
 
-def _generate_enhanced_response(message: str, sql_query: str, result: dict, analysis: dict, llm_client) -> str:
-    """Generate enhanced response with analytics insights"""
+def _merge_insights(base_response: str, analysis: dict) -> str:
+    """Append analytics insights to an already generated response"""
     try:
-        # Start with basic response
-        base_response = llm_client.generate_response(message, sql_query, result)
+        response = base_response
 
         # Add key insights
         insights = analysis.get('insights', [])
@@ -185,7 +450,7 @@ def _generate_enhanced_response(message: str, sql_query: str, result: dict, anal
             insight_text = "\n\n📊 **Key Insights:**\n"
             for i, insight in enumerate(insights[:3]):  # Top 3 insights
                 insight_text += f"{i+1}. {insight.get('title', '')}\n"
-            base_response += insight_text
+            response += insight_text
 
         # Add recommendations
         recommendations = analysis.get('recommendations', [])
@@ -193,7 +458,7 @@ def _generate_enhanced_response(message: str, sql_query: str, result: dict, anal
             rec_text = "\n\n💡 **Recommendations:**\n"
             for i, rec in enumerate(recommendations[:2]):  # Top 2 recommendations
                 rec_text += f"• {rec}\n"
-            base_response += rec_text
+            response += rec_text
 
         # Add statistical summary for numeric data
         descriptive = analysis.get('descriptive', {})
@@ -204,23 +469,32 @@ def _generate_enhanced_response(message: str, sql_query: str, result: dict, anal
             for col, stats in list(describe_data.items())[:2]:  # Limit to 2 columns
                 if isinstance(stats, dict) and 'mean' in stats:
                     stats_text += f"• {col}: Mean {stats['mean']:.2f}, Std {stats.get('std', 0):.2f}\n"
-            base_response += stats_text
+            response += stats_text
 
-        return base_response
+        return response
 
     except Exception as e:
         logger.warning(f"Could not enhance response: {str(e)}")
-        return llm_client.generate_response(message, sql_query, result)
+        return base_response
 
 
-def _handle_general_query(message: str) -> str:
+def _handle_general_query(message: str, pipeline: RequestPipeline = None) -> str:
     """
     Handle non-database queries with brief responses
     """
+    fallback = "I'm designed to help with database queries. Please ask about customers, accounts, transactions, loans, or other banking data."
+    if pipeline is None:
+        pipeline = RequestPipeline()
+
+    if not pipeline.can_run(STAGE_NARRATIVE):
+        pipeline.degrade(STAGE_NARRATIVE, 'insufficient time budget', status='degraded')
+        return fallback
+
     try:
         llm_client = LLMClient()
-        response = llm_client.generate_brief_response(message)
+        with pipeline.stage(STAGE_NARRATIVE, required=False) as budget:
+            response = llm_client.generate_brief_response(message, timeout=budget)
         return response
     except Exception as e:
         logger.error(f"Error handling general query: {str(e)}")
-        return "I'm designed to help with database queries. Please ask about customers, accounts, transactions, loans, or other banking data."
\ No newline at end of file
+        return fallback
\ No newline at end of file
@@ -0,0 +1,484 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import FrozenSet, Iterable, List, Optional, Set, Tuple, Union
+
+from sqlparse import filters, formatter, lexer, tokens
+from sqlparse.engine import FilterStack, grouping
+from sqlparse.engine.statement_splitter import StatementSplitter
+from sqlparse.sql import Function, Identifier, IdentifierList, Parenthesis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Same output as sqlparse.format(sql, reindent=True, keyword_case='upper')
+FORMAT_OPTIONS = formatter.validate_options({'reindent': True, 'keyword_case': 'upper'})
+
+DANGEROUS_KEYWORDS = [
+    'INSERT', 'UPDATE', 'DELETE', 'DROP', 'ALTER',
+    'TRUNCATE', 'EXEC', 'EXECUTE', 'CALL', 'MERGE', 'UPSERT'
+]
+
+# Top-level keywords that already bound the number of rows returned
+ROW_LIMIT_KEYWORDS = {'LIMIT', 'FETCH'}
+
+# Keywords that can come between FROM/JOIN and the relation itself
+RELATION_PREFIX_KEYWORDS = {'LATERAL', 'ONLY'}
+# Constants and niladic functions, written without parentheses, that read no column
+LITERAL_KEYWORDS = {
+    'TRUE', 'FALSE', 'NULL',
+    'CURRENT_DATE', 'CURRENT_TIME', 'CURRENT_TIMESTAMP', 'LOCALTIME', 'LOCALTIMESTAMP',
+    'CURRENT_USER', 'SESSION_USER', 'CURRENT_SCHEMA', 'USER',
+}
+
+
+class QueryAnalysis:
+    """
+    Everything the service needs to know about one SQL text, from one parse:
+    the safety verdict, the relations it reads, whether it has a LIMIT, and
+    its formatted and normalized text. ``order_key`` is the single ORDER BY
+    column, if the query sorts by one; ``scopes`` hold every table and column
+    reference, for checking against the schema catalog. Instances are
+    shared between threads through the analysis cache and never modified.
+    """
+
+    def __init__(self, sql_query: str):
+        stack = formatter.build_filter_stack(FilterStack(), dict(FORMAT_OPTIONS))
+        stream = lexer.tokenize(sql_query)
+        for token_filter in stack.preprocess:
+            stream = token_filter.process(stream)
+        statements = [grouping.group(statement) for statement in StatementSplitter().process(stream)]
+
+        self.is_safe = _is_safe(sql_query, statements)
+
+        scopes: List[Scope] = []
+        ctes: Set[str] = set()
+        for statement in statements:
+            _collect_scopes(statement, scopes, ctes)
+        self.scopes: Tuple[Scope, ...] = tuple(scopes)
+        self.ctes: FrozenSet[str] = frozenset(ctes)
+        self.tables: FrozenSet[str] = frozenset(
+            relation for scope in scopes for _, _, relation in scope.sources if relation
+        )
+
+        # Only the first statement is ever run
+        first = statements[0] if statements else None
+        self.has_limit = first is not None and any(
+            token.ttype in tokens.Keyword and token.normalized in ROW_LIMIT_KEYWORDS for token in first.tokens
+        )
+        self.normalized = _normalize(first) if first is not None else ''
+        self.order_key = _order_key(first) if first is not None and len(statements) == 1 else None
+
+        try:
+            # Formatting rewrites the token tree, so it runs after everything above
+            for statement_filter in stack.stmtprocess:
+                statement_filter.process(first)
+            self.formatted = filters.SerializerUnicode().process(first)
+            self.limitable = True
+        except Exception as e:
+            logger.warning(f"Could not parse query, using original: {str(e)}")
+            self.formatted = sql_query
+            self.limitable = False
+
+    def formatted_query(self, max_rows: Optional[int] = None) -> str:
+        """Formatted text, with ``LIMIT max_rows`` appended when it has no limit of its own"""
+        if max_rows is None or self.has_limit or not self.limitable:
+            return self.formatted
+        return f"{self.formatted.rstrip(';')} LIMIT {max_rows};"
+
+    def normalized_query(self, max_rows: Optional[int] = None) -> str:
+        """Normalized text of ``formatted_query(max_rows)``"""
+        if max_rows is None or self.has_limit or not self.limitable:
+            return self.normalized
+        return f"{self.normalized} LIMIT {max_rows}"
+
+
+def _is_safe(sql_query: str, statements) -> bool:
+    """Only SELECT and WITH statements, and no write keyword anywhere in the text"""
+    if not statements:
+        return False
+
+    query_upper = sql_query.upper()
+    for statement in statements:
+        # Get the first token that's not a comment or whitespace
+        first_token = None
+        for token in statement.flatten():
+            if token.ttype not in (tokens.Comment.Single, tokens.Comment.Multiline,
+                                   tokens.Whitespace, tokens.Newline):
+                first_token = token
+                break
+
+        if not first_token:
+            continue
+
+        # Only allow SELECT statements and WITH (CTE) statements
+        if first_token.ttype is tokens.Keyword.DML:
+            if first_token.value.upper() != 'SELECT':
+                return False
+        elif first_token.ttype is tokens.Keyword:
+            if first_token.value.upper() not in ['SELECT', 'WITH', 'CREATE']:
+                return False
+        elif first_token.ttype is tokens.Keyword.CTE:
+            if first_token.value.upper() != 'WITH':
+                return False
+        else:
+            # If first meaningful token isn't a keyword, it's likely not a valid query
+            return False
+
+        if any(keyword in query_upper for keyword in DANGEROUS_KEYWORDS):
+            return False
+
+    return True
+
+
+def _normalize(statement) -> str:
+    """
+    No comments, upper-case keywords, single spaces, no trailing semicolon.
+    Only the whitespace between tokens is collapsed: string literals and
+    quoted names keep theirs, so queries differing there stay distinct.
+    """
+    parts: List[str] = []
+    for token in statement.flatten():
+        if token.is_whitespace or token.ttype in tokens.Comment:
+            if parts and parts[-1] != ' ':
+                parts.append(' ')
+        elif token.ttype in tokens.Keyword:
+            # Multi-word keywords (ORDER BY, LEFT JOIN) are one token
+            parts.append(' '.join(token.value.split()))
+        else:
+            parts.append(token.value)
+    return ''.join(parts).strip().rstrip(';').strip()
+
+
+def _order_key(statement) -> Optional[Tuple[Union[str, int], bool, bool]]:
+    """
+    ``(column, descending, nulls_first)`` when the statement ends in an ORDER
+    BY on one plain column or output position, else None. Unquoted names are
+    lower-cased, the way they come back as result column names.
+    """
+    significant = [token for token in statement.tokens
+                   if not token.is_whitespace and token.ttype not in tokens.Comment and token.ttype is not tokens.Punctuation]
+    positions = [index for index, token in enumerate(significant)
+                 if token.ttype in tokens.Keyword and token.normalized == 'ORDER BY']
+    if len(positions) != 1:
+        return None
+
+    clause = significant[positions[0] + 1:]
+    if not clause or len(clause) > 2:
+        return None
+
+    key, ordering = clause[0], None
+    if isinstance(key, Identifier) and key.get_ordering():
+        ordering = key.get_ordering()
+        key = key.token_first(skip_ws=True, skip_cm=True)
+
+    column = _column_name(key)
+    if column is None:
+        return None
+
+    descending = ordering == 'DESC'
+    nulls_first = descending
+    if len(clause) == 2:
+        nulls = clause[1]
+        if nulls.ttype not in tokens.Keyword or nulls.normalized not in ('NULLS FIRST', 'NULLS LAST'):
+            return None
+        nulls_first = nulls.normalized == 'NULLS FIRST'
+    return column, descending, nulls_first
+
+
+def _column_name(token) -> Optional[Union[str, int]]:
+    """Result column named by a plain or qualified name, or an output position"""
+    if isinstance(token, Identifier):
+        parts = [child for child in token.tokens if not child.is_whitespace]
+        if any(child.is_group for child in parts):
+            return None
+        # Qualified name (c.created_at): the result column is its last part
+        token = parts[-1]
+
+    if token.ttype in tokens.Number.Integer:
+        return int(token.value)
+    if token.ttype in tokens.Name:
+        return token.value.lower()
+    if token.ttype in tokens.Literal.String.Symbol:
+        return token.value[1:-1].replace('""', '"')
+    return None
+
+
+class Scope:
+    """
+    One SELECT (the statement, a subquery or a CTE body): the relations its
+    FROM and JOIN clauses bind, the column references made in it, and the
+    output aliases it defines. ``sources`` are ``(alias, schema, relation)``
+    with relation None for subqueries, CTE bodies and functions; ``opaque``
+    is set when a source's columns or name can't be known.
+    """
+
+    __slots__ = ('parent', 'sources', 'columns', 'aliases', 'opaque')
+
+    def __init__(self, parent: Optional[int]):
+        self.parent = parent
+        self.sources: List[Tuple[Optional[str], Optional[str], Optional[str]]] = []
+        self.columns: List[Tuple[Optional[str], str]] = []
+        self.aliases: Set[str] = set()
+        self.opaque = False
+
+
+def _collect_scopes(statement, scopes: List[Scope], ctes: Set[str]):
+    _scan_block(statement, None, scopes, ctes)
+
+
+def _is_query(token_list) -> bool:
+    return any(token.ttype is tokens.DML and token.normalized == 'SELECT' for token in token_list.tokens)
+
+
+def _scan_block(token_list, parent: Optional[int], scopes: List[Scope], ctes: Set[str]):
+    scopes.append(Scope(parent))
+    _scan(token_list, len(scopes) - 1, scopes, ctes, block=True)
+
+
+def _scan(token_list, index: int, scopes: List[Scope], ctes: Set[str], block: bool = False):
+    scope = scopes[index]
+    expect_relation = False
+    expect_cte = False
+    previous = before = None
+    previous_mark = len(scope.columns)
+
+    for token in token_list.tokens:
+        if token.is_whitespace or token.ttype in tokens.Comment:
+            continue
+        mark = len(scope.columns)
+
+        if expect_cte:
+            for identifier in _identifiers(token):
+                ctes.add(identifier.get_name().lower())
+                for child in identifier.tokens:
+                    if isinstance(child, Parenthesis) and _is_query(child):
+                        _scan_block(child, index, scopes, ctes)
+            expect_cte = False
+        elif expect_relation:
+            if token.ttype in tokens.Keyword and token.normalized in RELATION_PREFIX_KEYWORDS:
+                continue
+            for item in _relation_items(token):
+                _add_source(item, index, scopes, ctes)
+            expect_relation = False
+        elif token.ttype in tokens.CTE:
+            expect_cte = True
+        elif token.ttype in tokens.Keyword and (token.normalized == 'FROM' or token.normalized.endswith('JOIN')):
+            if previous is not None and previous.ttype in tokens.Keyword and previous.normalized == 'DISTINCT':
+                pass  # IS DISTINCT FROM
+            elif block:
+                expect_relation = True
+            elif previous is not None and previous.ttype not in tokens.Keyword:
+                # EXTRACT(EPOCH FROM ...), SUBSTRING(x FROM 2): what precedes FROM is no column of ours
+                del scope.columns[previous_mark:]
+        elif _is_window_name(previous, token):
+            pass
+        elif _follows_literal(before, previous) and isinstance(token, (Identifier, IdentifierList)):
+            _visit_literal_alias(token, index, scopes, ctes)
+        else:
+            _visit(token, index, scopes, ctes)
+
+        before, previous, previous_mark = previous, token, mark
+
+
+def _is_window_name(previous, token) -> bool:
+    """``OVER w`` and ``WINDOW w AS (...)`` name a window, not a column"""
+    return (previous is not None and previous.ttype in tokens.Keyword and previous.normalized in ('OVER', 'WINDOW')
+            and isinstance(token, Identifier) and not token.token_first(skip_ws=True, skip_cm=True).is_group)
+
+
+def _is_literal(token) -> bool:
+    if token.ttype in tokens.Literal.String.Symbol:
+        return False  # "quoted" name
+    if token.ttype in tokens.Keyword:
+        return token.normalized in LITERAL_KEYWORDS
+    return token.ttype in tokens.Literal or _is_literal_name(token)
+
+
+def _is_literal_name(token) -> bool:
+    """A name sqlparse doesn't know as a keyword, like CURRENT_SCHEMA"""
+    return token.ttype is tokens.Name and token.value.upper() in LITERAL_KEYWORDS
+
+
+def _ends_with_literal(token) -> bool:
+    if isinstance(token, IdentifierList):
+        children = [child for child in token.tokens if not child.is_whitespace and child.ttype not in tokens.Comment]
+        return bool(children) and _is_literal(children[-1])
+    return _is_literal(token)
+
+
+def _follows_literal(before, previous) -> bool:
+    """
+    Whether the next token names a literal select item. sqlparse leaves the
+    alias of ``true AS flag`` or ``'x' label`` outside the item, where it
+    would read as a column.
+    """
+    if previous is None:
+        return False
+    if previous.ttype in tokens.Keyword and previous.normalized == 'AS':
+        return before is not None and _ends_with_literal(before)
+    return _ends_with_literal(previous)
+
+
+def _visit_literal_alias(token, index: int, scopes: List[Scope], ctes: Set[str]):
+    """A literal's alias, then the rest of the select list grouped with it"""
+    children = [token] if isinstance(token, Identifier) else [
+        child for child in token.tokens if not child.is_whitespace and child.ttype not in tokens.Comment
+    ]
+    alias = children[0]
+    parts = _name_parts(alias) if isinstance(alias, Identifier) else []
+    if len(parts) == 1 and parts[0] != '*' and not alias.token_first(skip_ws=True, skip_cm=True).is_group:
+        scopes[index].aliases.add(parts[0].lower())
+        if alias.get_alias():
+            scopes[index].aliases.add(alias.get_alias().lower())
+        children = children[1:]
+    for child in children:
+        _visit(child, index, scopes, ctes)
+
+
+def _visit(token, index: int, scopes: List[Scope], ctes: Set[str]):
+    scope = scopes[index]
+    if isinstance(token, Parenthesis) and _is_query(token):
+        _scan_block(token, index, scopes, ctes)
+    elif isinstance(token, Function):
+        # Its name isn't a column; its arguments and OVER clause may hold some
+        for child in token.tokens[1:]:
+            _visit(child, index, scopes, ctes)
+    elif isinstance(token, Identifier):
+        alias = token.get_alias()
+        if alias:
+            scope.aliases.add(alias.lower())
+        first = token.token_first(skip_ws=True, skip_cm=True)
+        if first.is_group:
+            _visit(first, index, scopes, ctes)
+            return
+        parts = _name_parts(token)
+        if parts and parts[-1] != '*' and not (len(parts) == 1 and _is_literal_name(first)):
+            scope.columns.append((parts[-2] if len(parts) > 1 else None, parts[-1]))
+    elif token.is_group:
+        _scan(token, index, scopes, ctes)
+    elif (token.ttype is tokens.Name and not _is_literal_name(token)) or token.ttype in tokens.Literal.String.Symbol:
+        scope.columns.append((None, _name_value(token)))
+
+
+def _add_source(item, index: int, scopes: List[Scope], ctes: Set[str]):
+    scope = scopes[index]
+    first = item.token_first(skip_ws=True, skip_cm=True) if isinstance(item, Identifier) else item
+    alias = item.get_alias() if isinstance(item, Identifier) else None
+    alias = alias.lower() if alias else None
+
+    if isinstance(first, Parenthesis):
+        # Aliased subquery
+        if _is_query(first):
+            _scan_block(first, index, scopes, ctes)
+        scope.sources.append((alias, None, None))
+        scope.opaque = scope.opaque or alias is None
+    elif isinstance(first, Function):
+        # Set-returning function: its arguments can reference earlier sources
+        _visit(first, index, scopes, ctes)
+        scope.sources.append((alias, None, None))
+        scope.opaque = scope.opaque or alias is None
+    else:
+        parts = _name_parts(item)
+        if not parts:
+            scope.opaque = True
+            return
+        relation = parts[-1]
+        schema = parts[-2] if len(parts) > 1 else None
+        scope.sources.append((alias or relation, schema, relation))
+
+
+def _relation_items(token) -> List:
+    """Relations named by the token after FROM or JOIN"""
+    if isinstance(token, IdentifierList):
+        return [child for child in token.tokens if isinstance(child, (Identifier, Function, Parenthesis))]
+    if isinstance(token, (Identifier, Function, Parenthesis)):
+        return [token]
+    return []
+
+
+def _name_value(token) -> str:
+    """Unquoted names are folded to lower case, quoted ones kept as written"""
+    if token.ttype in tokens.Literal.String.Symbol:
+        return token.value[1:-1].replace('""', '"')
+    return token.value.lower()
+
+
+def _name_parts(identifier) -> List[str]:
+    """The dotted name an identifier starts with: ['c', 'first_name'], ['public', 'customers']"""
+    parts = []
+    for token in identifier.tokens:
+        if token.ttype is tokens.Name or token.ttype in tokens.Literal.String.Symbol:
+            parts.append(_name_value(token))
+        elif token.ttype is tokens.Wildcard:
+            parts.append('*')
+        elif not (token.ttype is tokens.Punctuation and token.value == '.'):
+            break
+    return parts
+
+
+def _identifiers(token) -> Iterable[Identifier]:
+    if isinstance(token, IdentifierList):
+        return [child for child in token.get_identifiers() if isinstance(child, Identifier)]
+    if isinstance(token, Identifier):
+        return [token]
+    return []
+
+
+class AnalysisCache:
+    """
+    LRU of query analyses keyed by a hash of the SQL text, so repeated
+    queries (dashboards, retried generations) skip sqlparse entirely
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def analyze(self, sql_query: str) -> QueryAnalysis:
+        key = hashlib.sha256(sql_query.encode()).digest()
+        with self._lock:
+            analysis = self._entries.get(key)
+            if analysis is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return analysis
+            self.misses += 1
+
+        # Parse outside the lock; two threads may both parse a new query, which is harmless
+        analysis = QueryAnalysis(sql_query)
+        if self.max_entries > 0:
+            with self._lock:
+                self._entries[key] = analysis
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return analysis
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_analysis_cache = None
+_analysis_cache_lock = threading.Lock()
+
+
+def get_analysis_cache() -> AnalysisCache:
+    """
+    Return the process-wide analysis cache
+    """
+    global _analysis_cache
+    if _analysis_cache is None:
+        with _analysis_cache_lock:
+            if _analysis_cache is None:
+                _analysis_cache = AnalysisCache(settings.SQL_ANALYSIS_CACHE_SIZE)
+    return _analysis_cache
+
+
+def analyze_query(sql_query: str) -> QueryAnalysis:
+    """Memoized ``QueryAnalysis`` of a SQL text"""
+    return get_analysis_cache().analyze(sql_query)
@@ -0,0 +1,101 @@
+import io
+import json
+from typing import Callable, Iterable, Iterator, Sequence, Tuple
+
+from .serialization import (
+    column_type_code, serialize_value,
+    PG_BOOL, PG_INT8, PG_INT2, PG_INT4, PG_OID, PG_TEXT, PG_BPCHAR, PG_VARCHAR,
+    PG_FLOAT4, PG_FLOAT8, PG_NUMERIC, PG_DATE, PG_TIME, PG_TIMESTAMP, PG_TIMESTAMPTZ,
+)
+
+# Arrow is optional - only needed for format=arrow responses
+try:
+    import pyarrow as pa
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+
+ARROW_STREAM_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+
+
+def _arrow_type(type_code):
+    """Arrow type for a Postgres OID; unmapped types are sent as strings"""
+    return {
+        PG_BOOL: pa.bool_(),
+        PG_INT2: pa.int16(),
+        PG_INT4: pa.int32(),
+        PG_INT8: pa.int64(),
+        PG_OID: pa.int64(),
+        PG_TEXT: pa.string(),
+        PG_BPCHAR: pa.string(),
+        PG_VARCHAR: pa.string(),
+        PG_FLOAT4: pa.float32(),
+        PG_FLOAT8: pa.float64(),
+        # Same precision the JSON formats use for numeric
+        PG_NUMERIC: pa.float64(),
+        PG_DATE: pa.date32(),
+        PG_TIME: pa.time64('us'),
+        PG_TIMESTAMP: pa.timestamp('us'),
+        PG_TIMESTAMPTZ: pa.timestamp('us', tz='UTC'),
+    }.get(type_code)
+
+
+def _as_text(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    return str(serialize_value(value))
+
+
+def compile_batch_builder(description: Sequence) -> Tuple['pa.Schema', Callable[[Sequence[Sequence]], 'pa.RecordBatch']]:
+    """
+    Build the Arrow schema for a result set and a function turning a chunk
+    of rows into a ``RecordBatch`` of that schema.
+    """
+    fields = []
+    converters = []
+    for column in description or []:
+        type_code = column_type_code(column)
+        arrow_type = _arrow_type(type_code)
+        converter = None
+        if type_code == PG_NUMERIC:
+            converter = float
+        elif arrow_type is None:
+            arrow_type = pa.string()
+            converter = _as_text
+        fields.append(pa.field(column[0], arrow_type))
+        converters.append(converter)
+
+    schema = pa.schema(fields)
+
+    def build_batch(rows):
+        columns = list(zip(*rows)) if rows else [() for _ in fields]
+        arrays = []
+        for values, field, converter in zip(columns, fields, converters):
+            if converter is not None:
+                values = [None if value is None else converter(value) for value in values]
+            arrays.append(pa.array(values, type=field.type))
+        return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    return schema, build_batch
+
+
+def ipc_stream(schema: 'pa.Schema', batches: Iterable['pa.RecordBatch']) -> Iterator[bytes]:
+    """
+    Encode record batches as an Arrow IPC stream, yielding bytes per batch
+    """
+    sink = io.BytesIO()
+
+    def drain():
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    with pa.ipc.new_stream(sink, schema) as writer:
+        yield drain()
+        for batch in batches:
+            writer.write_batch(batch)
+            yield drain()
+
+    # Closing the writer adds the end-of-stream marker
+    yield drain()
@@ -0,0 +1,315 @@
+import logging
+import re
+import select
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+import psycopg2
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_CHANGE_CHANNEL = 'schema_changed'
+
+# Changes whenever a column, type, nullability or constraint in the public schema does
+CATALOG_FINGERPRINT_SQL = """
+    SELECT md5(
+        COALESCE((
+            SELECT string_agg(format('%s.%s:%s:%s', c.relname, a.attname, format_type(a.atttypid, a.atttypmod),
+                                     a.attnotnull), ',' ORDER BY c.relname, a.attnum)
+            FROM pg_attribute a
+            JOIN pg_class c ON c.oid = a.attrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p', 'v') AND a.attnum > 0 AND NOT a.attisdropped
+        ), '') || '|' || COALESCE((
+            SELECT string_agg(format('%s:%s', con.conname, pg_get_constraintdef(con.oid)), ',' ORDER BY con.conname)
+            FROM pg_constraint con
+            JOIN pg_namespace n ON n.oid = con.connamespace
+            WHERE n.nspname = 'public'
+        ), '')
+    )
+"""
+
+CATALOG_COLUMNS_SQL = """
+    SELECT c.table_name, t.table_type, c.column_name, c.data_type, c.is_nullable, c.column_default,
+           c.character_maximum_length, c.numeric_precision, c.numeric_scale
+    FROM information_schema.columns c
+    JOIN information_schema.tables t ON t.table_schema = c.table_schema AND t.table_name = c.table_name
+    WHERE c.table_schema = 'public'
+    ORDER BY c.table_name, c.ordinal_position
+"""
+
+CATALOG_CONSTRAINTS_SQL = """
+    SELECT rel.relname, con.contype,
+           ARRAY(SELECT a.attname::text
+                 FROM unnest(con.conkey) WITH ORDINALITY AS k(attnum, ord)
+                 JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+                 ORDER BY k.ord),
+           ref.relname,
+           ARRAY(SELECT a.attname::text
+                 FROM unnest(con.confkey) WITH ORDINALITY AS k(attnum, ord)
+                 JOIN pg_attribute a ON a.attrelid = con.confrelid AND a.attnum = k.attnum
+                 ORDER BY k.ord),
+           pg_get_constraintdef(con.oid)
+    FROM pg_constraint con
+    JOIN pg_class rel ON rel.oid = con.conrelid
+    JOIN pg_namespace n ON n.oid = rel.relnamespace
+    LEFT JOIN pg_class ref ON ref.oid = con.confrelid
+    WHERE n.nspname = 'public' AND con.contype IN ('p', 'f', 'c')
+    ORDER BY rel.relname, con.conname
+"""
+
+# CHECK (col IN ('a', 'b')) as Postgres prints it back: col = ANY (ARRAY['a'::text, ...])
+ENUM_CHECK = re.compile(
+    r"^CHECK \(+\"?(\w+)\"?\)?(?:::[\w ]+)? = ANY \(+ARRAY\[(.*)\]\)?(?:::[\w ]+\[\])?\)*$",
+    re.DOTALL
+)
+ENUM_VALUE = re.compile(r"'((?:[^']|'')*)'")
+
+DDL_TYPES = {
+    'integer': 'INTEGER',
+    'bigint': 'BIGINT',
+    'timestamp without time zone': 'TIMESTAMP',
+    'date': 'DATE',
+    'boolean': 'BOOLEAN',
+    'text': 'TEXT',
+}
+
+
+def parse_enum_check(definition: str) -> Optional[tuple]:
+    """``(column, values)`` for a CHECK that limits one column to a list of literals"""
+    match = ENUM_CHECK.match(definition.strip())
+    if match is None:
+        return None
+    values = [value.replace("''", "'") for value in ENUM_VALUE.findall(match.group(2))]
+    return (match.group(1), values) if values else None
+
+
+def _ddl_type(column: Dict[str, Any]) -> str:
+    """Column type spelled the way the schema_definitions view writes it"""
+    data_type = column['type']
+    if data_type == 'character varying' and column['max_length']:
+        return f"VARCHAR({column['max_length']})"
+    if data_type == 'numeric' and column['precision'] is not None:
+        return f"DECIMAL({column['precision']},{column['scale'] or 0})"
+    return DDL_TYPES.get(data_type, data_type.upper())
+
+
+def render_ddl(table: Dict[str, Any]) -> str:
+    """
+    CREATE statement for a catalog table, with its key, foreign keys and
+    allowed values, so prompts see the constraints the stored DDL leaves out
+    """
+    parts = []
+    for column in table['columns']:
+        part = f"{column['name']} {_ddl_type(column)}"
+        if not column['nullable']:
+            part += ' NOT NULL'
+        values = table['enums'].get(column['name'])
+        if values:
+            part += " CHECK ({} IN ({}))".format(
+                column['name'], ', '.join("'" + value.replace("'", "''") + "'" for value in values)
+            )
+        parts.append(part)
+
+    if table['primary_key']:
+        parts.append(f"PRIMARY KEY ({', '.join(table['primary_key'])})")
+    for foreign_key in table['foreign_keys']:
+        parts.append(
+            f"FOREIGN KEY ({', '.join(foreign_key['columns'])}) "
+            f"REFERENCES {foreign_key['references']}({', '.join(foreign_key['referenced_columns'])})"
+        )
+    keyword = 'VIEW' if table['kind'] == 'view' else 'TABLE'
+    return f"CREATE {keyword} {table['name']} ({', '.join(parts)});"
+
+
+class SchemaCatalog:
+    """
+    In-memory copy of the public schema: tables and views, their columns and
+    types, primary and foreign keys, and the values CHECK constraints allow.
+
+    Loaded once and served from memory. A cheap fingerprint of
+    ``pg_attribute`` and ``pg_constraint`` is compared at most every
+    ``check_interval`` seconds, or straight away after ``invalidate()``
+    (called when a ``schema_changed`` notification arrives), and the catalog
+    is reloaded only when it differs.
+    """
+
+    def __init__(self, check_interval: Optional[float] = None):
+        self.check_interval = settings.SQL_SCHEMA_CATALOG_CHECK_INTERVAL if check_interval is None else check_interval
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._generation = 0
+        self._checked_generation = -1
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def invalidate(self):
+        """Re-check the fingerprint on the next lookup"""
+        self._generation += 1
+
+    def _is_fresh(self) -> bool:
+        return (self._snapshot is not None and self._checked_generation == self._generation
+                and time.monotonic() - self._checked_at < self.check_interval)
+
+    def _current(self) -> Dict[str, Any]:
+        if self._is_fresh():
+            return self._snapshot
+
+        with self._lock:
+            if self._is_fresh():
+                return self._snapshot
+
+            generation = self._generation
+            try:
+                with connections['default'].cursor() as cursor:
+                    cursor.execute(CATALOG_FINGERPRINT_SQL)
+                    fingerprint = cursor.fetchone()[0]
+                    if self._snapshot is None or fingerprint != self._snapshot['fingerprint']:
+                        self._snapshot = self._load(cursor, fingerprint)
+                        self.loads += 1
+                        logger.info(f"Schema catalog loaded: {len(self._snapshot['tables'])} tables")
+            except Exception as e:
+                if self._snapshot is None:
+                    raise
+                # Keep serving the last catalog; try again after the interval
+                logger.warning(f"Schema catalog check failed, serving cached catalog: {str(e)}")
+
+            self._checked_generation = generation
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    def _load(self, cursor, fingerprint: str) -> Dict[str, Any]:
+        tables: Dict[str, Dict[str, Any]] = {}
+
+        cursor.execute(CATALOG_COLUMNS_SQL)
+        for (table_name, table_type, name, data_type, is_nullable, default,
+             max_length, precision, scale) in cursor.fetchall():
+            table = tables.setdefault(table_name, {
+                'name': table_name,
+                'kind': 'view' if table_type == 'VIEW' else 'table',
+                'columns': [],
+                'primary_key': [],
+                'foreign_keys': [],
+                'enums': {},
+            })
+            table['columns'].append({
+                'name': name,
+                'type': data_type,
+                'nullable': is_nullable == 'YES',
+                'default': default,
+                'max_length': max_length,
+                'precision': precision,
+                'scale': scale,
+            })
+
+        cursor.execute(CATALOG_CONSTRAINTS_SQL)
+        for table_name, kind, columns, referenced_table, referenced_columns, definition in cursor.fetchall():
+            table = tables.get(table_name)
+            if table is None:
+                continue
+            if kind == 'p':
+                table['primary_key'] = list(columns)
+            elif kind == 'f':
+                table['foreign_keys'].append({
+                    'columns': list(columns),
+                    'references': referenced_table,
+                    'referenced_columns': list(referenced_columns),
+                })
+            elif len(columns) == 1:
+                enum = parse_enum_check(definition)
+                if enum is not None and enum[0] == columns[0]:
+                    table['enums'][enum[0]] = enum[1]
+
+        for table in tables.values():
+            # Folded like unquoted identifiers, for matching names parsed out of SQL
+            table['column_names'] = frozenset(column['name'].lower() for column in table['columns'])
+            table['ddl'] = render_ddl(table)
+
+        folded = {name.lower(): table for name, table in tables.items()}
+        return {'fingerprint': fingerprint, 'tables': tables, 'folded': folded, 'loaded_at': time.time()}
+
+    def tables(self) -> List[str]:
+        """Names of all tables and views, sorted"""
+        return sorted(self._current()['tables'])
+
+    def table(self, table_name: str) -> Optional[Dict[str, Any]]:
+        """A table's catalog entry, or None if there is no such table"""
+        snapshot = self._current()
+        table = snapshot['tables'].get(table_name)
+        return table if table is not None else snapshot['folded'].get(table_name.lower())
+
+    def ddl(self, table_name: str) -> Optional[str]:
+        table = self.table(table_name)
+        return table['ddl'] if table is not None else None
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            'loaded': snapshot is not None,
+            'tables': len(snapshot['tables']) if snapshot else 0,
+            'fingerprint': snapshot['fingerprint'] if snapshot else None,
+            'loaded_at': snapshot['loaded_at'] if snapshot else None,
+            'loads': self.loads,
+        }
+
+
+class SchemaChangeListener(threading.Thread):
+    """
+    Daemon thread that LISTENs on ``schema_changed`` (sent by the DDL event
+    trigger in data/schemas) and invalidates the catalog on each
+    notification, reconnecting with backoff if the connection drops
+    """
+
+    def __init__(self, catalog: SchemaCatalog, conninfo: Dict[str, Any], channel: str = SCHEMA_CHANGE_CHANNEL):
+        super().__init__(name='schema-change-listener', daemon=True)
+        self.catalog = catalog
+        self.conninfo = conninfo
+        self.channel = channel
+
+    def run(self):
+        backoff = 1.0
+        while True:
+            try:
+                connection = psycopg2.connect(application_name='rag-sql-schema-listener', **self.conninfo)
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {self.channel}")
+                # Anything may have changed while we weren't listening
+                self.catalog.invalidate()
+                backoff = 1.0
+                self._listen(connection)
+            except Exception as e:
+                logger.warning(f"Schema change listener disconnected, retrying in {backoff:.0f}s: {str(e)}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+
+    def _listen(self, connection):
+        while True:
+            if select.select([connection], [], [], 60.0) == ([], [], []):
+                continue
+            connection.poll()
+            if connection.notifies:
+                connection.notifies.clear()
+                self.catalog.invalidate()
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_schema_catalog() -> SchemaCatalog:
+    """
+    Return the process-wide schema catalog, starting its change listener
+    """
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                catalog = SchemaCatalog()
+                if settings.SQL_SCHEMA_CHANGE_LISTEN:
+                    SchemaChangeListener(catalog, settings.SQL_READONLY_DATABASE).start()
+                _catalog = catalog
+    return _catalog
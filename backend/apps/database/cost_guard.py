@@ -0,0 +1,98 @@
+import json
+import logging
+from typing import Dict, Any, List, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+COST_GUARD_REJECT = 'reject'
+COST_GUARD_WARN = 'warn'
+COST_GUARD_OFF = 'off'
+
+
+class QueryCostException(Exception):
+    """Exception raised when a query's plan is estimated to be too expensive to run"""
+
+    def __init__(self, message: str, estimate: Dict[str, Any]):
+        super().__init__(message)
+        self.estimate = estimate
+
+
+def explain_query(cursor, sql_query: str) -> Dict[str, Any]:
+    """
+    Planner estimate for a query from ``EXPLAIN (FORMAT JSON)``, without running it
+    """
+    cursor.execute(f"EXPLAIN (FORMAT JSON) {sql_query.strip().rstrip(';')}")
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    top = plan[0]['Plan']
+    return {
+        'total_cost': top['Total Cost'],
+        'startup_cost': top['Startup Cost'],
+        'rows': top['Plan Rows'],
+        'node': top['Node Type'],
+    }
+
+
+def limit_query(sql_query: str, limit: int) -> str:
+    """Wrap a query in an outer LIMIT, so the planner can stop early"""
+    # The newline keeps a trailing -- comment from swallowing the parenthesis
+    return f"SELECT * FROM (\n{sql_query.strip().rstrip(';')}\n) AS cost_limited LIMIT {limit};"
+
+
+class CostGuard:
+    """
+    Thresholds on the planner's estimated total cost and result rows.
+
+    In ``reject`` mode plans over either threshold are refused before they
+    start; in ``warn`` mode they run with the reasons attached to the
+    estimate. With ``rewrite_limit`` set, an over-budget query is first
+    retried under that LIMIT and runs in that form if its plan then fits.
+    """
+
+    def __init__(self, mode: Optional[str] = None, max_cost: Optional[float] = None,
+                 max_rows: Optional[int] = None, rewrite_limit: Optional[int] = None):
+        self.mode = settings.SQL_COST_GUARD if mode is None else mode
+        self.max_cost = settings.SQL_MAX_PLAN_COST if max_cost is None else max_cost
+        self.max_rows = settings.SQL_MAX_PLAN_ROWS if max_rows is None else max_rows
+        self.rewrite_limit = settings.SQL_COST_GUARD_REWRITE_LIMIT if rewrite_limit is None else rewrite_limit
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != COST_GUARD_OFF
+
+    def violations(self, estimate: Dict[str, Any]) -> List[str]:
+        """Reasons the estimate is over budget; empty when it fits"""
+        reasons = []
+        if self.max_cost and estimate['total_cost'] > self.max_cost:
+            reasons.append(f"estimated cost {estimate['total_cost']:.0f} exceeds {self.max_cost:.0f}")
+        if self.max_rows and estimate['rows'] > self.max_rows:
+            reasons.append(f"estimated {estimate['rows']} rows exceeds {self.max_rows}")
+        return reasons
+
+    def check(self, cursor, sql_query: str, rewrite: bool = True):
+        """
+        EXPLAIN a query and apply the thresholds. Returns the SQL to run (the
+        original, or its LIMIT rewrite) and the estimate for it.
+        """
+        estimate = explain_query(cursor, sql_query)
+        reasons = self.violations(estimate)
+        if not reasons:
+            return sql_query, estimate
+
+        if rewrite and self.rewrite_limit:
+            limited_query = limit_query(sql_query, self.rewrite_limit)
+            limited_estimate = explain_query(cursor, limited_query)
+            if not self.violations(limited_estimate):
+                logger.warning(f"Query rewritten to LIMIT {self.rewrite_limit}: {'; '.join(reasons)}")
+                limited_estimate['rewritten_from'] = estimate
+                return limited_query, limited_estimate
+
+        estimate['exceeds'] = reasons
+        if self.mode == COST_GUARD_REJECT:
+            raise QueryCostException(f"Query rejected before execution: {'; '.join(reasons)}", estimate)
+
+        logger.warning(f"Running expensive query: {'; '.join(reasons)}")
+        return sql_query, estimate
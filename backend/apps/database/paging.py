@@ -0,0 +1,124 @@
+import base64
+import binascii
+import logging
+import uuid
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+PAGE_KEY_PREFIX = 'sql_page'
+
+PAGE_MODE_KEYSET = 'keyset'
+PAGE_MODE_SNAPSHOT = 'snapshot'
+
+
+class PageTokenException(Exception):
+    """Exception raised when a continuation token is malformed or its result has expired"""
+    pass
+
+
+def encode_token(cursor_id: str, page: int) -> str:
+    return base64.urlsafe_b64encode(f"{cursor_id}:{page}".encode()).decode().rstrip('=')
+
+
+def decode_token(token: str) -> Tuple[str, int]:
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        cursor_id, page = base64.urlsafe_b64decode(padded.encode()).decode().split(':')
+        return cursor_id, int(page)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise PageTokenException("Invalid continuation token")
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def resolve_order_column(order_key, columns: List[str]) -> Optional[int]:
+    """Index of the ORDER BY column in the result, if it names exactly one column"""
+    column = order_key[0]
+    if isinstance(column, int):
+        return column - 1 if 0 < column <= len(columns) and columns.count(columns[column - 1]) == 1 else None
+    return columns.index(column) if columns.count(column) == 1 else None
+
+
+def is_sorted_on(rows: Sequence[Sequence], index: int, descending: bool, nulls_first: bool) -> bool:
+    """Whether rows really are in the order the ORDER BY key claims"""
+    previous = None
+    for position, row in enumerate(rows):
+        value = row[index]
+        if position:
+            if previous is None or value is None:
+                if (previous is None) != (value is None) and (value is None) == nulls_first:
+                    return False
+            elif not isinstance(value, str):
+                # Text is left out: Postgres sorts it by collation, which Python can't reproduce
+                try:
+                    if (value > previous) if descending else (value < previous):
+                        return False
+                except TypeError:
+                    return False
+        previous = value
+    return True
+
+
+def keyset_query(sql_query: str, column: str, descending: bool, nulls_first: bool, after) -> Tuple[str, List]:
+    """
+    The query's rows that sort after ``after`` on its ORDER BY column, with
+    the original query (LIMIT and OFFSET included) as a subquery
+    """
+    quoted = quote_identifier(column)
+    if after is None:
+        # Past the NULLs at the front; the rest are all non-null
+        condition, params = f"{quoted} IS NOT NULL", []
+    else:
+        condition = f"{quoted} {'<' if descending else '>'} %s"
+        if not nulls_first:
+            condition = f"({condition} OR {quoted} IS NULL)"
+        params = [after]
+
+    body = sql_query.strip().rstrip(';').replace('%', '%%')
+    order = f"{quoted} {'DESC' if descending else 'ASC'} NULLS {'FIRST' if nulls_first else 'LAST'}"
+    return f"SELECT * FROM (\n{body}\n) AS paged WHERE {condition} ORDER BY {order}", params
+
+
+class PageStore:
+    """
+    Server-held state of paginated results in the Django cache.
+
+    Each result gets a cursor entry (the query, its ORDER BY key and
+    columns) and one entry per page saying how to produce that page: either
+    the key value to continue after, or the page's rows spilled from the
+    first read.
+    """
+
+    def __init__(self, ttl: Optional[float] = None):
+        self.ttl = settings.SQL_PAGE_CURSOR_TTL if ttl is None else ttl
+
+    def _key(self, cursor_id: str, page: Optional[int] = None) -> str:
+        if page is None:
+            return f"{PAGE_KEY_PREFIX}:{cursor_id}"
+        return f"{PAGE_KEY_PREFIX}:{cursor_id}:{page}"
+
+    def create(self, cursor: Dict[str, Any]) -> str:
+        cursor_id = uuid.uuid4().hex
+        cache.set(self._key(cursor_id), cursor, int(self.ttl))
+        return cursor_id
+
+    def cursor(self, cursor_id: str) -> Dict[str, Any]:
+        cursor = cache.get(self._key(cursor_id))
+        if cursor is None:
+            raise PageTokenException("Continuation token has expired; run the query again")
+        return cursor
+
+    def set_pages(self, cursor_id: str, pages: Dict[int, Dict[str, Any]]):
+        cache.set_many({self._key(cursor_id, page): entry for page, entry in pages.items()}, int(self.ttl))
+
+    def page(self, cursor_id: str, page: int) -> Dict[str, Any]:
+        entry = cache.get(self._key(cursor_id, page))
+        if entry is None:
+            raise PageTokenException("Continuation token has expired; run the query again")
+        return entry
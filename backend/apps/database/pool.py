@@ -0,0 +1,399 @@
+import itertools
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+
+import psycopg2
+from psycopg2 import extensions
+from django.conf import settings
+
+from utils.tracing import annotate
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """Exception raised when no pooled connection frees up in time"""
+    pass
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections for user and LLM SQL.
+
+    Connections are opened read-only (``default_transaction_read_only``),
+    kept between requests, and pinged before reuse once they have been idle
+    for ``health_check_interval`` seconds. Every checkout runs in its own
+    transaction, rolled back on release.
+    """
+
+    def __init__(self, name: str, conninfo: Dict[str, Any], min_size: int = 1, max_size: int = 10,
+                 timeout: float = 5.0, health_check_interval: float = 30.0):
+        self.name = name
+        self.conninfo = conninfo
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        self._condition = threading.Condition()
+        self._idle = deque()  # (connection, last_used)
+        self._size = 0
+        self._filled = False
+        self._filling = False
+        self._metrics = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_ms_total': 0.0,
+            'wait_ms_max': 0.0,
+            'timeouts': 0,
+            'connections_opened': 0,
+            'health_check_failures': 0,
+        }
+
+    def _connect(self):
+        connection = psycopg2.connect(
+            application_name=f'rag-sql-{self.name}',
+            options='-c default_transaction_read_only=on',
+            **self.conninfo
+        )
+        with self._condition:
+            self._metrics['connections_opened'] += 1
+        return connection
+
+    def _fill(self):
+        """
+        Open ``min_size`` connections up front so first requests skip the
+        handshake. One thread connects, outside the lock, while checkouts go
+        on; until a fill succeeds the next checkout tries again.
+        """
+        with self._condition:
+            if self._filled or self._filling:
+                return
+            missing = max(0, self.min_size - self._size)
+            # Reserved, so concurrent checkouts still respect max_size
+            self._size += missing
+            self._filling = True
+
+        opened = []
+        try:
+            for _ in range(missing):
+                opened.append(self._connect())
+        except Exception as e:
+            logger.error(f"Could not open pooled connection for {self.name}: {str(e)}")
+
+        with self._condition:
+            self._filling = False
+            self._size -= missing - len(opened)
+            now = time.monotonic()
+            self._idle.extend((connection, now) for connection in opened)
+            self._filled = len(opened) == missing
+            self._condition.notify_all()
+
+    @contextmanager
+    def connection(self):
+        """
+        Check out a connection for one transaction
+        """
+        connection = self._acquire()
+        try:
+            yield connection
+        finally:
+            self._release(connection)
+
+    def _acquire(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+
+        while True:
+            if not self._filled:
+                self._fill()
+
+            with self._condition:
+                connection = None
+                create = False
+                while connection is None and not create:
+                    if self._idle:
+                        # Most recently used first: it's the one least likely to have gone stale
+                        connection, last_used = self._idle.pop()
+                    elif self._size < self.max_size:
+                        self._size += 1
+                        create = True
+                    else:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._metrics['timeouts'] += 1
+                            raise PoolTimeout(f"No connection free in pool {self.name} after {self.timeout}s")
+                        waited = True
+                        self._condition.wait(remaining)
+
+            if create:
+                try:
+                    connection = self._connect()
+                except Exception:
+                    self._discard(None)
+                    raise
+            elif not self._is_usable(connection, last_used):
+                self._discard(connection)
+                continue
+
+            wait_ms = (time.monotonic() - started) * 1000
+            with self._condition:
+                self._metrics['checkouts'] += 1
+                if waited:
+                    self._metrics['waits'] += 1
+                    self._metrics['wait_ms_total'] += wait_ms
+                    self._metrics['wait_ms_max'] = max(self._metrics['wait_ms_max'], wait_ms)
+            annotate(pool_wait_ms=round(wait_ms, 2))
+            return connection
+
+    def _is_usable(self, connection, last_used: float) -> bool:
+        if connection.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            connection.rollback()
+            return True
+        except Exception as e:
+            with self._condition:
+                self._metrics['health_check_failures'] += 1
+            logger.warning(f"Dropping unhealthy connection from pool {self.name}: {str(e)}")
+            return False
+
+    def _release(self, connection):
+        try:
+            if not connection.closed:
+                # Ends the transaction, and with it any SET LOCAL
+                connection.rollback()
+        except Exception as e:
+            logger.warning(f"Could not reset pooled connection: {str(e)}")
+
+        if connection.closed or connection.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            self._discard(connection)
+            return
+
+        with self._condition:
+            self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def _discard(self, connection):
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                pass
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    def close(self):
+        """Close idle connections; checked-out ones are closed when released"""
+        with self._condition:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._filled = False
+        for connection, _ in idle:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool size and saturation counters"""
+        with self._condition:
+            idle = len(self._idle)
+            in_use = self._size - idle
+            return {
+                'name': self.name,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': idle,
+                'in_use': in_use,
+                'saturation': round(in_use / self.max_size, 3) if self.max_size else 0.0,
+                **self._metrics,
+                'wait_ms_total': round(self._metrics['wait_ms_total'], 2),
+                'wait_ms_max': round(self._metrics['wait_ms_max'], 2),
+            }
+
+
+_read_pool = None
+_read_pool_lock = threading.Lock()
+
+
+def get_read_pool() -> ConnectionPool:
+    """
+    Return the process-wide read-only pool for user SQL
+    """
+    global _read_pool
+    if _read_pool is None:
+        with _read_pool_lock:
+            if _read_pool is None:
+                _read_pool = ConnectionPool(
+                    'readonly',
+                    settings.SQL_READONLY_DATABASE,
+                    min_size=settings.SQL_POOL_MIN_SIZE,
+                    max_size=settings.SQL_POOL_MAX_SIZE,
+                    timeout=settings.SQL_POOL_TIMEOUT,
+                    health_check_interval=settings.SQL_POOL_HEALTH_CHECK_INTERVAL,
+                )
+    return _read_pool
+
+
+ROUTING_ROUND_ROBIN = 'round_robin'
+ROUTING_LEAST_LOADED = 'least_loaded'
+
+# Seconds a replica is behind: zero when it has replayed everything it received
+REPLICA_LAG_SQL = """
+    SELECT pg_is_in_recovery(),
+           pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn(),
+           EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+"""
+
+
+class Replica:
+    """A replica pool and its last measured replication lag"""
+
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+        self.lag = math.inf
+        self.checked_at = None
+        self.error = None
+        self._refresh_lock = threading.Lock()
+
+    def refresh_lag(self, interval: float, executor: Executor):
+        """
+        Queue a lag check on ``executor`` when the last one is older than
+        ``interval``. Routing keeps reading the last measured lag meanwhile,
+        so a slow or unreachable replica never holds up a request.
+        """
+        if self.checked_at is not None and time.monotonic() - self.checked_at < interval:
+            return
+        if not self._refresh_lock.acquire(blocking=False):
+            return  # a check is already queued or running
+        try:
+            executor.submit(self._refresh)
+        except Exception as e:
+            self._refresh_lock.release()
+            logger.warning(f"Could not schedule lag check for replica {self.pool.name}: {str(e)}")
+
+    def _refresh(self):
+        try:
+            self.lag = self._measure_lag()
+            self.error = None
+        except Exception as e:
+            self.lag = math.inf
+            self.error = str(e)
+            logger.warning(f"Replica {self.pool.name} excluded, lag check failed: {str(e)}")
+        finally:
+            self.checked_at = time.monotonic()
+            self._refresh_lock.release()
+
+    def _measure_lag(self) -> float:
+        with self.pool.connection() as connection, connection.cursor() as cursor:
+            cursor.execute(REPLICA_LAG_SQL)
+            in_recovery, caught_up, replay_age = cursor.fetchone()
+
+        if not in_recovery or caught_up:
+            return 0.0
+        # Nothing replayed yet: can't tell how far behind it is
+        return float(replay_age) if replay_age is not None else math.inf
+
+
+class ReplicaRouter:
+    """
+    Routes read-only SQL across replicas, skipping any whose replication lag
+    (``pg_last_xact_replay_timestamp``) is above ``max_lag`` seconds, and
+    falling back to the primary pool when none qualify. Lag is measured in
+    the background; a replica not measured yet counts as lagging.
+    """
+
+    def __init__(self, primary: ConnectionPool, replicas: List[ConnectionPool], max_lag: float = 5.0,
+                 check_interval: float = 5.0, strategy: str = ROUTING_ROUND_ROBIN,
+                 executor: Optional[Executor] = None):
+        self.primary = primary
+        self.replicas = [Replica(pool) for pool in replicas]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.strategy = strategy
+        self._turn = itertools.count()
+        # One worker per replica: a hung check holds up no other replica's
+        self._executor = executor or ThreadPoolExecutor(max_workers=max(1, len(self.replicas)),
+                                                        thread_name_prefix='replica-lag')
+
+    def choose(self) -> ConnectionPool:
+        """Pool to run the next read on"""
+        if not self.replicas:
+            return self.primary
+
+        eligible = []
+        for replica in self.replicas:
+            replica.refresh_lag(self.check_interval, self._executor)
+            if replica.lag <= self.max_lag:
+                eligible.append(replica.pool)
+
+        if not eligible:
+            return self.primary
+
+        if self.strategy == ROUTING_LEAST_LOADED:
+            return min(eligible, key=lambda pool: pool.stats()['saturation'])
+        return eligible[next(self._turn) % len(eligible)]
+
+    def is_replica(self, pool: ConnectionPool) -> bool:
+        return pool is not self.primary
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                'lag': None if math.isinf(replica.lag) else round(replica.lag, 3),
+                'eligible': replica.lag <= self.max_lag,
+                'error': replica.error,
+                **replica.pool.stats(),
+            }
+            for replica in self.replicas
+        ]
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ReplicaRouter:
+    """
+    Return the process-wide router over the primary read pool and replicas
+    """
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                replicas = [
+                    ConnectionPool(
+                        f'replica-{index}',
+                        # The DSN carries the replica's own host and credentials
+                        {'dsn': dsn},
+                        min_size=settings.SQL_POOL_MIN_SIZE,
+                        max_size=settings.SQL_POOL_MAX_SIZE,
+                        timeout=settings.SQL_POOL_TIMEOUT,
+                        health_check_interval=settings.SQL_POOL_HEALTH_CHECK_INTERVAL,
+                    )
+                    for index, dsn in enumerate(settings.SQL_REPLICA_URLS)
+                ]
+                _router = ReplicaRouter(
+                    get_read_pool(),
+                    replicas,
+                    max_lag=settings.SQL_REPLICA_MAX_LAG,
+                    check_interval=settings.SQL_REPLICA_LAG_CHECK_INTERVAL,
+                    strategy=settings.SQL_REPLICA_ROUTING,
+                )
+    return _router
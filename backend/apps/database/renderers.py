@@ -0,0 +1,27 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from .arrow import ARROW_STREAM_MEDIA_TYPE
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """JSON with one array per column; selected with ``?format=columnar``"""
+    format = 'columnar'
+
+
+class ArrowStreamRenderer(BaseRenderer):
+    """
+    Arrow IPC stream; selected with ``?format=arrow`` or the Arrow media type.
+
+    The view streams Arrow bytes itself, so this renderer only exists for
+    content negotiation.
+    """
+    media_type = ARROW_STREAM_MEDIA_TYPE
+    format = 'arrow'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, bytes):
+            return data
+        # Anything else is an error body from DRF itself
+        return JSONRenderer().render(data)
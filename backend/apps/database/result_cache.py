@@ -0,0 +1,167 @@
+import hashlib
+import logging
+import pickle
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Set, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .analysis import analyze_query
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_PREFIX = 'sql_result'
+
+# Results of queries calling these change without any table being written
+VOLATILE_SQL = re.compile(
+    r'\b(now|random|clock_timestamp|statement_timestamp|transaction_timestamp|timeofday|'
+    r'current_date|current_time|current_timestamp|localtime|localtimestamp|'
+    r'gen_random_uuid|uuid_generate_v4|nextval|currval|setseed|txid_current)\b',
+    re.IGNORECASE
+)
+
+
+def normalize_sql(sql_query: str) -> str:
+    """Canonical text for a query: no comments, upper-case keywords, single spaces"""
+    return analyze_query(sql_query).normalized
+
+
+def referenced_tables(sql_query: str) -> Tuple[Set[str], Set[str]]:
+    """
+    Names used as relations in FROM/JOIN clauses, and the CTE names the
+    query defines itself. Names are lower-cased like unquoted identifiers.
+    """
+    analysis = analyze_query(sql_query)
+    return set(analysis.tables), set(analysis.ctes)
+
+
+class LocalResultCache:
+    """
+    In-process LRU of query results, bounded by the pickled size of entries
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str, ttl: float) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            entry, size = item
+            if time.time() - entry['cached_at'] > ttl:
+                del self._entries[key]
+                self._size -= size
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: Dict[str, Any], size: int):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous[1]
+            self._entries[key] = (entry, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+class QueryResultCache:
+    """
+    Two-level (in-process LRU, then Redis) cache of SELECT results.
+
+    Keys combine the normalized SQL with the write counters of every table
+    it reads, so any insert, update, delete or truncate on those tables
+    produces a new key and old entries are never served. Postgres flushes
+    those counters when the writing transaction ends (at most about a second
+    later on PG 15+), so that is the window in which a write can go unseen.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, max_entry_bytes: Optional[int] = None,
+                 local_max_bytes: Optional[int] = None):
+        self.ttl = settings.SQL_RESULT_CACHE_TTL if ttl is None else ttl
+        self.max_entry_bytes = settings.SQL_RESULT_CACHE_MAX_BYTES if max_entry_bytes is None else max_entry_bytes
+        self.local = LocalResultCache(settings.SQL_RESULT_CACHE_LOCAL_MAX_BYTES if local_max_bytes is None else local_max_bytes)
+
+    def key_for(self, normalized_sql: str, result_format: str, versions: Dict[str, Tuple]) -> str:
+        """Key for a query's normalized text (see ``normalize_sql``) at the given table versions"""
+        version_text = ';'.join(f"{name}:{','.join(map(str, counters))}" for name, counters in sorted(versions.items()))
+        digest = hashlib.sha256(f"{result_format}|{normalized_sql}|{version_text}".encode()).hexdigest()
+        return f"{CACHE_KEY_PREFIX}:{digest}"
+
+    def cacheable_tables(self, sql_query: str) -> Optional[Set[str]]:
+        """
+        Tables whose versions key the query, or None when it can't be cached
+        """
+        analysis = analyze_query(sql_query)
+        if VOLATILE_SQL.search(analysis.normalized):
+            return None
+        return set(analysis.tables - analysis.ctes) or None
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self.local.get(key, self.ttl)
+        if entry is not None:
+            return entry
+
+        try:
+            payload = cache.get(key)
+        except Exception as e:
+            logger.warning(f"Result cache read failed: {str(e)}")
+            return None
+        if payload is None:
+            return None
+
+        entry = pickle.loads(payload)
+        self.local.set(key, entry, len(payload))
+        return entry
+
+    def cached_response(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """A cache entry as returned to callers, with its age in seconds"""
+        response = {name: value for name, value in entry.items() if name != 'cached_at'}
+        response['cached'] = True
+        response['cache_age'] = round(time.time() - entry['cached_at'], 3)
+        return response
+
+    def set(self, key: str, result: Dict[str, Any]):
+        entry = {**result, 'cached_at': time.time()}
+        payload = pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self.max_entry_bytes:
+            return
+
+        self.local.set(key, entry, len(payload))
+        try:
+            cache.set(key, payload, int(self.ttl))
+        except Exception as e:
+            logger.warning(f"Result cache write failed: {str(e)}")
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> QueryResultCache:
+    """
+    Return the process-wide result cache
+    """
+    global _result_cache
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = QueryResultCache()
+    return _result_cache
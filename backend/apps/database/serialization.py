@@ -0,0 +1,140 @@
+from decimal import Decimal
+from datetime import datetime, date, time
+from typing import Any, Callable, List, Optional, Sequence
+
+# Postgres type OIDs (pg_type.oid) as reported in cursor.description
+PG_BOOL = 16
+PG_INT8 = 20
+PG_INT2 = 21
+PG_INT4 = 23
+PG_TEXT = 25
+PG_OID = 26
+PG_JSON = 114
+PG_FLOAT4 = 700
+PG_FLOAT8 = 701
+PG_BPCHAR = 1042
+PG_VARCHAR = 1043
+PG_DATE = 1082
+PG_TIME = 1083
+PG_TIMESTAMP = 1114
+PG_TIMESTAMPTZ = 1184
+PG_TIMETZ = 1266
+PG_NUMERIC = 1700
+PG_UUID = 2950
+PG_JSONB = 3802
+
+# Types psycopg2 already returns as JSON-serializable values
+IDENTITY_TYPES = {
+    PG_BOOL, PG_INT8, PG_INT2, PG_INT4, PG_TEXT, PG_OID, PG_JSON,
+    PG_FLOAT4, PG_FLOAT8, PG_BPCHAR, PG_VARCHAR, PG_JSONB,
+}
+
+# Unbound isoformat methods avoid a Python-level call per value
+TEMPORAL_CONVERTERS = {
+    PG_DATE: date.isoformat,
+    PG_TIME: time.isoformat,
+    PG_TIMETZ: time.isoformat,
+    PG_TIMESTAMP: datetime.isoformat,
+    PG_TIMESTAMPTZ: datetime.isoformat,
+}
+
+# Type names reported alongside columnar results
+PG_TYPE_NAMES = {
+    PG_BOOL: 'bool', PG_INT8: 'int8', PG_INT2: 'int2', PG_INT4: 'int4', PG_TEXT: 'text',
+    PG_OID: 'oid', PG_JSON: 'json', PG_FLOAT4: 'float4', PG_FLOAT8: 'float8',
+    PG_BPCHAR: 'bpchar', PG_VARCHAR: 'varchar', PG_DATE: 'date', PG_TIME: 'time',
+    PG_TIMESTAMP: 'timestamp', PG_TIMESTAMPTZ: 'timestamptz', PG_TIMETZ: 'timetz',
+    PG_NUMERIC: 'numeric', PG_UUID: 'uuid', PG_JSONB: 'jsonb',
+}
+
+
+def serialize_value(value):
+    """Convert a database value of unknown type to a JSON-serializable type"""
+    if isinstance(value, Decimal):
+        return float(value)
+    elif isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    else:
+        return value
+
+
+def column_type_code(column) -> Optional[int]:
+    """Type OID of a cursor.description entry, if the driver reports one"""
+    type_code = getattr(column, 'type_code', None)
+    if type_code is None and len(column) > 1:
+        type_code = column[1]
+    return type_code
+
+
+def column_type_names(description: Sequence) -> List[str]:
+    """Postgres type name per column, 'unknown' when the OID isn't mapped"""
+    return [PG_TYPE_NAMES.get(column_type_code(column), 'unknown') for column in description or []]
+
+
+def column_converter(type_code: Optional[int]) -> Optional[Callable[[Any], Any]]:
+    """
+    Converter for one column, or None when values can be used as-is
+    """
+    if type_code in IDENTITY_TYPES:
+        return None
+    if type_code == PG_NUMERIC:
+        return float
+    if type_code in TEMPORAL_CONVERTERS:
+        return TEMPORAL_CONVERTERS[type_code]
+    if type_code == PG_UUID:
+        return str
+    # Unknown type (or a driver without OIDs): check each value
+    return serialize_value
+
+
+def compile_row_serializer(description: Sequence) -> Callable[[Sequence[Sequence]], List[List]]:
+    """
+    Build a serializer for rows of one result set.
+
+    Converters are chosen once per column from the type OIDs in
+    ``cursor.description``; columns that need no conversion are never
+    touched, and a result set with none left just copies its rows.
+    """
+    conversions = []
+    for index, column in enumerate(description or []):
+        converter = column_converter(column_type_code(column))
+        if converter is not None:
+            conversions.append((index, converter))
+
+    if not conversions:
+        def serialize_rows(rows):
+            return [list(row) for row in rows]
+        return serialize_rows
+
+    def serialize_rows(rows):
+        data = [list(row) for row in rows]
+        for index, converter in conversions:
+            for row in data:
+                value = row[index]
+                if value is not None:
+                    row[index] = converter(value)
+        return data
+
+    return serialize_rows
+
+
+def compile_column_serializer(description: Sequence) -> Callable[[Sequence[Sequence]], List[List]]:
+    """
+    Build a serializer that returns one list per column instead of per row.
+
+    Each column is converted with a single comprehension, and columns that
+    need no conversion are just the transposed values.
+    """
+    converters = [column_converter(column_type_code(column)) for column in description or []]
+
+    def serialize_columns(rows):
+        if not rows:
+            return [[] for _ in converters]
+
+        columns = [list(values) for values in zip(*rows)]
+        for index, converter in enumerate(converters):
+            if converter is not None:
+                columns[index] = [None if value is None else converter(value) for value in columns[index]]
+        return columns
+
+    return serialize_columns
@@ -2,4 +2,12 @@ from rest_framework import serializers
 
 
 class QueryRequestSerializer(serializers.Serializer):
-    query = serializers.CharField(max_length=5000)
\ No newline at end of file
+    query = serializers.CharField(max_length=5000, required=False)
+    stream = serializers.BooleanField(required=False, default=False)
+    page_size = serializers.IntegerField(required=False, min_value=1)
+    page_token = serializers.CharField(max_length=200, required=False)
+
+    def validate(self, data):
+        if not data.get('query') and not data.get('page_token'):
+            raise serializers.ValidationError({'query': ['This field is required.']})
+        return data
@@ -1,61 +1,280 @@
+import heapq
+import itertools
 import logging
 import signal
 import threading
-from typing import Dict, Any, List, Optional
+import uuid
+import time
+from time import monotonic
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 from contextlib import contextmanager
-from decimal import Decimal
-from datetime import datetime, date, time
 from django.db import connections
 from django.conf import settings
-import sqlparse
+from django.core.cache import cache
+from django.utils import timezone
+import psycopg2
+from psycopg2 import sql
+from psycopg2.extensions import QueryCanceledError
+
+from utils.tracing import span, annotate
+from .serialization import serialize_value, compile_row_serializer, compile_column_serializer, column_type_names
+from .arrow import ARROW_AVAILABLE, compile_batch_builder
+from .analysis import analyze_query
+from .catalog import get_schema_catalog
+from .validation import SchemaValidationException, validate_references
+from .result_cache import get_result_cache
+from .cost_guard import CostGuard, QueryCostException, limit_query
+from .paging import (
+    PageStore, PAGE_MODE_KEYSET, PAGE_MODE_SNAPSHOT,
+    encode_token, decode_token, keyset_query, resolve_order_column, is_sorted_on,
+)
+from .pool import get_read_pool, get_router
 
 logger = logging.getLogger(__name__)
 
+RESULT_FORMAT_ROWS = 'rows'
+RESULT_FORMAT_COLUMNAR = 'columnar'
+RESULT_FORMAT_ARROW = 'arrow'
+
+
+# Tables with their planner row estimate (reltuples is -1 until first analyzed) and size
+TABLE_CATALOG_SQL = """
+    SELECT c.relname,
+           CASE WHEN c.reltuples >= 0 THEN c.reltuples::bigint ELSE COALESCE(s.n_live_tup, 0) END,
+           pg_total_relation_size(c.oid)
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+    WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p')
+    ORDER BY c.relname
+"""
+
+EXACT_COUNTS_CACHE_KEY = 'database_stats:exact_counts'
+EXACT_COUNTS_LOCK_KEY = 'database_stats:exact_counts:refreshing'
+
+TABLE_DESCRIPTIONS = {
+    'branches': 'Bank branch locations and contact information',
+    'customers': 'Customer personal and financial information',
+    'accounts': 'Bank accounts (checking, savings, etc.) with balances',
+    'transactions': 'All account transactions and transfers',
+    'credit_cards': 'Credit card information and limits',
+    'credit_card_transactions': 'Credit card purchases and payments',
+    'loans': 'Loan information (mortgages, personal, auto loans)',
+    'loan_payments': 'Individual loan payment records',
+    'auth_user': 'Django user accounts for system access',
+    'django_migrations': 'Database migration tracking',
+    'embeddings_schemaembedding': 'Schema embeddings for RAG system'
+}
+
+TABLE_RELATIONSHIPS = [
+    {'from': 'customers', 'to': 'accounts', 'type': 'one-to-many'},
+    {'from': 'customers', 'to': 'credit_cards', 'type': 'one-to-many'},
+    {'from': 'customers', 'to': 'loans', 'type': 'one-to-many'},
+    {'from': 'accounts', 'to': 'transactions', 'type': 'one-to-many'},
+    {'from': 'credit_cards', 'to': 'credit_card_transactions', 'type': 'one-to-many'},
+    {'from': 'loans', 'to': 'loan_payments', 'type': 'one-to-many'},
+    {'from': 'branches', 'to': 'customers', 'type': 'one-to-many'},
+    {'from': 'branches', 'to': 'accounts', 'type': 'one-to-many'}
+]
+
 
 class QueryTimeoutException(Exception):
     """Exception raised when query execution times out"""
     pass
 
 
+# SQLSTATE for query_canceled, raised for statement_timeout and pg_cancel_backend alike
+QUERY_CANCELED_SQLSTATE = '57014'
+
+
+def _is_query_canceled(error: Exception) -> bool:
+    """Whether a database error (or the driver error it wraps) was a cancelled statement"""
+    while error is not None:
+        if isinstance(error, QueryCanceledError) or getattr(error, 'pgcode', None) == QUERY_CANCELED_SQLSTATE:
+            return True
+        error = error.__cause__
+    return False
+
+
+class QueryCancelWatchdog:
+    """
+    Backstop for ``statement_timeout``: one shared thread that sends a cancel
+    request for any guarded connection still busy past its deadline.
+
+    ``connection.cancel()`` is the same protocol-level cancel that
+    ``pg_cancel_backend`` sends, so the backend stops working on the query.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._deadlines = []  # heap of (deadline, token)
+        self._connections = {}
+        self._counter = itertools.count()
+        self._thread = None
+
+    @contextmanager
+    def guard(self, raw_connection, timeout: float):
+        token = next(self._counter)
+        with self._condition:
+            self._connections[token] = raw_connection
+            heapq.heappush(self._deadlines, (monotonic() + timeout, token))
+            self._ensure_thread()
+            self._condition.notify()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._connections.pop(token, None)
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='query-cancel-watchdog', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                # Drop entries whose query already finished
+                while self._deadlines and self._deadlines[0][1] not in self._connections:
+                    heapq.heappop(self._deadlines)
+
+                if not self._deadlines:
+                    self._condition.wait()
+                    continue
+
+                deadline, token = self._deadlines[0]
+                wait = deadline - monotonic()
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+
+                heapq.heappop(self._deadlines)
+                raw_connection = self._connections.pop(token)
+
+            try:
+                logger.warning("Cancelling query still running past its statement timeout")
+                raw_connection.cancel()
+            except Exception as e:
+                logger.error(f"Error cancelling query: {str(e)}")
+
+
+_cancel_watchdog = None
+_cancel_watchdog_lock = threading.Lock()
+
+
+def get_cancel_watchdog() -> QueryCancelWatchdog:
+    """
+    Return the process-wide cancel watchdog
+    """
+    global _cancel_watchdog
+    if _cancel_watchdog is None:
+        with _cancel_watchdog_lock:
+            if _cancel_watchdog is None:
+                _cancel_watchdog = QueryCancelWatchdog()
+    return _cancel_watchdog
+
+
 class DatabaseService:
     def __init__(self):
         self.timeout = settings.SQL_QUERY_TIMEOUT
         self.max_rows = settings.MAX_RESULT_ROWS
+        self.cancel_grace_period = settings.SQL_CANCEL_GRACE_PERIOD
+        self.stream_chunk_size = settings.SQL_STREAM_CHUNK_SIZE
+        self.stream_max_rows = settings.SQL_STREAM_MAX_ROWS
+        self.result_cache_enabled = settings.SQL_RESULT_CACHE_ENABLED
+        self.cost_guard = CostGuard()
+        self.schema_validation = settings.SQL_SCHEMA_VALIDATION
+        self.page_snapshot_max_rows = settings.SQL_PAGE_SNAPSHOT_MAX_ROWS
+        self.stats_exact_ttl = settings.SQL_STATS_EXACT_TTL
+        self.stats_count_timeout = settings.SQL_STATS_COUNT_TIMEOUT
 
     def _serialize_value(self, value):
         """Convert database values to JSON-serializable types"""
-        if isinstance(value, Decimal):
-            return float(value)
-        elif isinstance(value, (datetime, date, time)):
-            return value.isoformat()
-        elif value is None:
-            return None
-        else:
-            return value
+        return serialize_value(value)
 
-    def execute_safe_query(self, sql_query: str) -> Dict[str, Any]:
+    def execute_safe_query(self, sql_query: str, timeout: Optional[float] = None,
+                           result_format: str = RESULT_FORMAT_ROWS, use_cache: bool = True) -> Dict[str, Any]:
         """
-        Execute SQL query with safety constraints
+        Execute SQL query with safety constraints.
+
+        ``timeout`` overrides ``SQL_QUERY_TIMEOUT`` when it is shorter, e.g.
+        to fit a request deadline. Postgres type names of the columns are in
+        ``column_types``; with ``result_format='columnar'`` the data is one
+        list per column.
+        Results are served from the result cache while none of the tables
+        they read have been written; those responses have ``cached: true``
+        and ``cache_age`` in seconds.
+
+        Unless ``SQL_COST_GUARD`` is off, the planner's estimate is checked
+        first and returned as ``estimate``; over-budget queries fail with it
+        instead of running. Queries naming tables or columns the schema
+        catalog doesn't have fail with ``validation_errors`` before any
+        connection is used.
         """
         try:
-            # Validate and sanitize query
-            if not self._is_safe_query(sql_query):
-                raise ValueError("Query contains potentially unsafe operations")
-
-            # Parse and format query
-            parsed_query = self._parse_and_format_query(sql_query)
+            with span('db.validate'):
+                # One (memoized) parse gives the verdict, tables and formatted text
+                analysis = analyze_query(sql_query)
+                if not analysis.is_safe:
+                    raise ValueError("Query contains potentially unsafe operations")
+                self._check_schema(sql_query)
+
+                parsed_query = analysis.formatted_query(self.max_rows)
+
+            cache_key = None
+            min_lsn = None
+            if use_cache and self.result_cache_enabled:
+                with span('db.cache'):
+                    cache_key = self._result_cache_key(sql_query, result_format)
+                    cached = get_result_cache().get(cache_key) if cache_key else None
+                    annotate(hit=cached is not None)
+                if cached is not None:
+                    return get_result_cache().cached_response(cached)
+                if cache_key and get_router().replicas:
+                    # A replica result may only be cached once it has replayed
+                    # everything the versions in the key were read at
+                    min_lsn = self._primary_lsn()
 
             # Execute with timeout
-            result = self._execute_with_timeout(parsed_query)
+            with span('db.execute'):
+                result = self._execute_with_timeout(parsed_query, timeout, result_format, min_lsn=min_lsn)
+                annotate(rows=result['row_count'], columns=len(result['columns']))
 
-            return {
+            response = {
                 'success': True,
                 'data': result['data'],
                 'columns': result['columns'],
                 'row_count': result['row_count'],
-                'query': parsed_query
+                'query': result.get('query', parsed_query)
             }
+            if 'estimate' in result:
+                response['estimate'] = result['estimate']
+            if result_format == RESULT_FORMAT_COLUMNAR:
+                response['format'] = RESULT_FORMAT_COLUMNAR
+            if 'column_types' in result:
+                response['column_types'] = result['column_types']
+
+            if cache_key and result.get('fresh', True):
+                get_result_cache().set(cache_key, response)
+
+            return {**response, 'cached': False}
 
+        except SchemaValidationException as e:
+            logger.error(f"Query failed schema validation: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e),
+                'query': sql_query,
+                'validation_errors': e.errors
+            }
+        except QueryCostException as e:
+            logger.error(f"Query rejected by cost guard: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e),
+                'query': sql_query,
+                'estimate': e.estimate
+            }
         except Exception as e:
             logger.error(f"Error executing query: {str(e)}")
             return {
@@ -64,199 +283,533 @@ class DatabaseService:
                 'query': sql_query
             }
 
+    def execute_trusted_query(self, sql_query: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Execute SQL written by the application itself (dashboards, metrics).
+
+        Skips parsing, schema validation, formatting, the cost guard and the
+        result cache, and adds no LIMIT; the statement timeout, cancel
+        watchdog and replica routing still apply.
+        """
+        try:
+            with span('db.execute', trusted=True):
+                result = self._execute_with_timeout(sql_query, timeout, check_cost=False)
+                annotate(rows=result['row_count'])
+            return {
+                'success': True,
+                'data': result['data'],
+                'columns': result['columns'],
+                'column_types': result.get('column_types', []),
+                'row_count': result['row_count']
+            }
+        except Exception as e:
+            logger.error(f"Error executing trusted query: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    def _result_cache_key(self, sql_query: str, result_format: str) -> Optional[str]:
+        """
+        Cache key for a query at the current data version, or None when the
+        query can't be cached (volatile functions, views, no tables...)
+        """
+        try:
+            result_cache = get_result_cache()
+            tables = result_cache.cacheable_tables(sql_query)
+            if not tables:
+                return None
+
+            versions = self._table_versions(tables)
+            if versions is None:
+                return None
+
+            # Keyed on the text that runs, LIMIT included
+            return result_cache.key_for(analyze_query(sql_query).normalized_query(self.max_rows), result_format, versions)
+        except Exception as e:
+            logger.warning(f"Could not build result cache key: {str(e)}")
+            return None
+
+    def _table_versions(self, tables) -> Optional[Dict[str, tuple]]:
+        """
+        Write counters per table from pg_stat_user_tables, or None if any
+        relation isn't a user table (a view's data can change without its name)
+        """
+        with get_read_pool().connection() as connection, connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT relname, n_tup_ins, n_tup_upd, n_tup_del, n_live_tup
+                FROM pg_stat_user_tables
+                WHERE relname = ANY(%s)
+            """, [sorted(tables)])
+            rows = cursor.fetchall()
+
+        versions = {}
+        for relname, *counters in rows:
+            # The same name can exist in several schemas; any of them counts
+            versions[relname] = versions.get(relname, ()) + tuple(counters)
+
+        if set(versions) != set(tables):
+            return None
+        return versions
+
+    def _primary_lsn(self) -> Optional[str]:
+        """Current WAL position of the primary"""
+        try:
+            with get_read_pool().connection() as connection, connection.cursor() as cursor:
+                cursor.execute("SELECT pg_current_wal_lsn()::text")
+                return cursor.fetchone()[0]
+        except Exception as e:
+            logger.warning(f"Could not read primary WAL position: {str(e)}")
+            return None
+
+    def validate_query(self, sql_query: str) -> List[str]:
+        """
+        Tables and columns in a query that the schema catalog doesn't have,
+        as messages fit to show the LLM; empty when they all resolve, or when
+        validation is off or the catalog can't be read
+        """
+        if not self.schema_validation:
+            return []
+        try:
+            with span('db.schema_validation'):
+                errors = validate_references(analyze_query(sql_query), get_schema_catalog())
+                annotate(errors=len(errors))
+                return errors
+        except Exception as e:
+            logger.warning(f"Schema validation skipped: {str(e)}")
+            return []
+
+    def _check_schema(self, sql_query: str):
+        errors = self.validate_query(sql_query)
+        if errors:
+            raise SchemaValidationException(errors)
+
     def _is_safe_query(self, sql_query: str) -> bool:
         """
         Validate that the query is safe (read-only)
         """
-        # Parse the SQL
-        parsed = sqlparse.parse(sql_query)
-
-        if not parsed:
-            return False
-
-        # Check each statement
-        for statement in parsed:
-            # Get the first token that's not a comment or whitespace
-            first_token = None
-            for token in statement.flatten():
-                if token.ttype not in (sqlparse.tokens.Comment.Single,
-                                     sqlparse.tokens.Comment.Multiline,
-                                     sqlparse.tokens.Whitespace,
-                                     sqlparse.tokens.Newline):
-                    first_token = token
-                    break
-
-            if not first_token:
-                continue
-
-            # Only allow SELECT statements and WITH (CTE) statements
-            if first_token.ttype is sqlparse.tokens.Keyword.DML:
-                if first_token.value.upper() != 'SELECT':
-                    return False
-            elif first_token.ttype is sqlparse.tokens.Keyword:
-                if first_token.value.upper() not in ['SELECT', 'WITH', 'CREATE']:
-                    return False
-            elif first_token.ttype is sqlparse.tokens.Keyword.CTE:
-                if first_token.value.upper() != 'WITH':
-                    return False
-            else:
-                # If first meaningful token isn't a keyword, it's likely not a valid query
-                return False
+        return analyze_query(sql_query).is_safe
 
-            # Check for dangerous keywords
-            dangerous_keywords = [
-                'INSERT', 'UPDATE', 'DELETE', 'DROP', 'ALTER',
-                'TRUNCATE', 'EXEC', 'EXECUTE', 'CALL', 'MERGE', 'UPSERT'
-            ]
+    def stream_query(self, sql_query: str, result_format: str = RESULT_FORMAT_ROWS) -> Iterator[Dict[str, Any]]:
+        """
+        Validate a query and return a generator over its results.
+
+        The generator yields ``{'columns': [...], 'column_types': [...]}`` once,
+        then ``{'rows': [...]}`` per chunk, then ``{'row_count': n, 'truncated': bool}``.
+        With ``result_format='arrow'`` the first event also carries the Arrow
+        ``schema`` and chunks are ``{'batch': RecordBatch}``. Unsafe queries
+        and queries that don't match the schema raise ``ValueError`` here,
+        before anything is streamed.
+        """
+        if result_format == RESULT_FORMAT_ARROW and not ARROW_AVAILABLE:
+            raise ValueError("Arrow output requires pyarrow to be installed")
 
-            query_upper = sql_query.upper()
-            for keyword in dangerous_keywords:
-                if keyword in query_upper:
-                    return False
+        analysis = analyze_query(sql_query)
+        if not analysis.is_safe:
+            raise ValueError("Query contains potentially unsafe operations")
+        self._check_schema(sql_query)
 
-        return True
+        # No LIMIT: the stream is capped at SQL_STREAM_MAX_ROWS instead
+        return self._stream_rows(analysis.formatted_query(), result_format)
 
-    def _parse_and_format_query(self, sql_query: str) -> str:
+    def _stream_rows(self, sql_query: str, result_format: str = RESULT_FORMAT_ROWS) -> Iterator[Dict[str, Any]]:
         """
-        Parse and format the SQL query
+        Read rows through a server-side (named) cursor, one chunk at a time,
+        so memory stays flat however many rows the query returns.
         """
+        watchdog = get_cancel_watchdog()
+        row_count = 0
+        truncated = False
+
         try:
-            # Parse the query
-            parsed = sqlparse.parse(sql_query)[0]
+            # The named cursor only lives as long as the checkout's transaction
+            with get_router().choose().connection() as connection:
+                with connection.cursor() as cursor:
+                    # Applies to each FETCH, so a slow chunk is cancelled but a long export isn't
+                    cursor.execute(f"SET LOCAL statement_timeout = {int(self.timeout * 1000)}")
+
+                with connection.cursor(name=f'stream_{uuid.uuid4().hex}') as cursor:
+                    cursor.execute(sql_query)
+                    encode_chunk = None
+
+                    while True:
+                        with watchdog.guard(connection, self.timeout + self.cancel_grace_period):
+                            rows = cursor.fetchmany(min(self.stream_chunk_size, self.stream_max_rows - row_count))
 
-            # Format for better readability
-            formatted = sqlparse.format(
-                str(parsed),
-                reindent=True,
-                keyword_case='upper'
-            )
+                        # A named cursor only has a description after the first fetch
+                        if encode_chunk is None:
+                            header, encode_chunk = self._compile_chunk_encoder(cursor.description, result_format)
+                            yield header
 
-            # Add LIMIT if not present
-            if 'LIMIT' not in formatted.upper():
-                formatted = f"{formatted.rstrip(';')} LIMIT {self.max_rows};"
+                        if not rows:
+                            break
 
-            return formatted
+                        row_count += len(rows)
+                        yield encode_chunk(rows)
+
+                        if row_count >= self.stream_max_rows:
+                            with watchdog.guard(connection, self.timeout + self.cancel_grace_period):
+                                truncated = cursor.fetchone() is not None
+                            if truncated:
+                                logger.warning(f"Streamed results truncated to {self.stream_max_rows} rows")
+                            break
+
+        except psycopg2.Error as e:
+            if _is_query_canceled(e):
+                raise QueryTimeoutException(f"Query execution timed out after {self.timeout} seconds") from e
+            raise
+
+        yield {'row_count': row_count, 'truncated': truncated}
+
+    def execute_paged_query(self, sql_query: str, page_size: int) -> Dict[str, Any]:
+        """
+        First page of a query's results. When there are more rows, ``page``
+        carries a ``next_token`` for ``fetch_page``.
 
+        Later pages re-query on the ORDER BY column (keyset) when the query
+        sorts by one result column; otherwise the rest of the result, up to
+        ``SQL_PAGE_SNAPSHOT_MAX_ROWS``, is read now and held in the cache.
+        """
+        try:
+            with span('db.validate'):
+                analysis = analyze_query(sql_query)
+                if not analysis.is_safe:
+                    raise ValueError("Query contains potentially unsafe operations")
+                self._check_schema(sql_query)
+
+            cursor = {
+                'query': analysis.formatted_query(),
+                'order_key': analysis.order_key,
+                'page_size': max(1, min(page_size, self.max_rows)),
+            }
+            with span('db.execute'):
+                return self._read_page(cursor, None, 0)
+
+        except SchemaValidationException as e:
+            logger.error(f"Query failed schema validation: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e),
+                'query': sql_query,
+                'validation_errors': e.errors
+            }
+        except QueryCostException as e:
+            logger.error(f"Query rejected by cost guard: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e),
+                'query': sql_query,
+                'estimate': e.estimate
+            }
         except Exception as e:
-            logger.warning(f"Could not parse query, using original: {str(e)}")
-            return sql_query
+            logger.error(f"Error executing paged query: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e),
+                'query': sql_query
+            }
 
-    def _execute_with_timeout(self, sql_query: str) -> Dict[str, Any]:
+    def fetch_page(self, page_token: str) -> Dict[str, Any]:
         """
-        Execute query with timeout protection
+        The page a continuation token points to
         """
-        result = {'data': [], 'columns': [], 'row_count': 0}
-        exception_container = [None]
+        try:
+            cursor_id, page = decode_token(page_token)
+            store = PageStore()
+            cursor = store.cursor(cursor_id)
+            entry = store.page(cursor_id, page)
 
-        def query_executor():
-            try:
-                with connections['default'].cursor() as cursor:
-                    cursor.execute(sql_query)
+            if 'rows' in entry:
+                annotate(source='snapshot')
+                next_token = encode_token(cursor_id, page + 1) if entry['next'] else None
+                return self._page_response(cursor, page, entry['rows'], PAGE_MODE_SNAPSHOT, next_token,
+                                           truncated=entry.get('truncated', False))
 
-                    # Get column names
-                    if cursor.description:
-                        result['columns'] = [col[0] for col in cursor.description]
+            with span('db.execute'):
+                return self._read_page(cursor, cursor_id, page, entry['after'])
 
-                        # Fetch results with row limit
-                        rows = cursor.fetchmany(self.max_rows)
-                        result['data'] = [[self._serialize_value(val) for val in row] for row in rows]
-                        result['row_count'] = len(rows)
+        except Exception as e:
+            logger.error(f"Error fetching result page: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e),
+                'page_token': page_token
+            }
 
-                        # Check if there are more rows
-                        if cursor.fetchone():
-                            result['truncated'] = True
-                            logger.warning(f"Query results truncated to {self.max_rows} rows")
-                    else:
-                        # Query didn't return results (shouldn't happen with SELECT)
-                        result['row_count'] = cursor.rowcount
+    def _read_page(self, cursor: Dict[str, Any], cursor_id: Optional[str], page: int, after=None) -> Dict[str, Any]:
+        """
+        Run the query (page 0) or its keyset continuation through a
+        server-side cursor, read one page plus one row, and record how the
+        next page will be produced.
+        """
+        page_size = cursor['page_size']
+        if page == 0:
+            sql_query, params = cursor['query'], None
+        else:
+            sql_query, params = keyset_query(cursor['query'], cursor['column'], cursor['descending'],
+                                             cursor['nulls_first'], after)
 
-            except Exception as e:
-                exception_container[0] = e
+        watchdog = get_cancel_watchdog()
+        estimate = None
+        next_pages = {}
+        mode = None
+        truncated = False
+        pool = get_router().choose()
+        annotate(source=pool.name)
 
-        # Create and start thread
-        thread = threading.Thread(target=query_executor)
-        thread.daemon = True
-        thread.start()
+        try:
+            with pool.connection() as connection:
+                with connection.cursor() as plain_cursor:
+                    plain_cursor.execute(f"SET LOCAL statement_timeout = {int(self.timeout * 1000)}")
+                    if page == 0 and self.cost_guard.enabled:
+                        with watchdog.guard(connection, self.timeout + self.cancel_grace_period):
+                            # Estimated as the page is read (one page and one row), not the whole result
+                            _, estimate = self.cost_guard.check(plain_cursor, limit_query(sql_query, page_size + 1),
+                                                                rewrite=False)
+
+                with connection.cursor(name=f'page_{uuid.uuid4().hex}') as named_cursor:
+                    named_cursor.execute(sql_query, params)
+                    with watchdog.guard(connection, self.timeout + self.cancel_grace_period):
+                        rows = named_cursor.fetchmany(page_size + 1)
+
+                    description = named_cursor.description
+                    columns = [col[0] for col in description] if description else []
+                    serialize_rows = compile_row_serializer(description)
+
+                    if len(rows) > page_size:
+                        if page == 0:
+                            index = resolve_order_column(cursor['order_key'], columns) if cursor['order_key'] else None
+                            if index is not None:
+                                _, cursor['descending'], cursor['nulls_first'] = cursor['order_key']
+                                cursor['column'] = columns[index]
+                        else:
+                            index = columns.index(cursor['column'])
+
+                        boundary = rows[page_size - 1][index] if index is not None else None
+                        if (index is not None and boundary != rows[page_size][index]
+                                and is_sorted_on(rows, index, cursor['descending'], cursor['nulls_first'])):
+                            # No ties across the boundary, so "after it" is exactly the rest
+                            mode = PAGE_MODE_KEYSET
+                            next_pages[page + 1] = {'after': boundary}
+                        else:
+                            mode = PAGE_MODE_SNAPSHOT
+                            remaining, truncated = self._spill_rows(connection, named_cursor, rows[page_size:])
+                            chunks = [remaining[start:start + page_size] for start in range(0, len(remaining), page_size)]
+                            for offset, chunk in enumerate(chunks, 1):
+                                last = offset == len(chunks)
+                                next_pages[page + offset] = {
+                                    'rows': serialize_rows(chunk),
+                                    'next': not last,
+                                    'truncated': truncated and last,
+                                }
+
+        except psycopg2.Error as e:
+            if _is_query_canceled(e):
+                raise QueryTimeoutException(f"Query execution timed out after {self.timeout} seconds") from e
+            raise
+
+        next_token = None
+        if next_pages:
+            store = PageStore()
+            if cursor_id is None:
+                cursor['columns'] = columns
+                cursor_id = store.create(cursor)
+            store.set_pages(cursor_id, next_pages)
+            next_token = encode_token(cursor_id, page + 1)
+
+        response = self._page_response(cursor, page, serialize_rows(rows[:page_size]), mode, next_token, columns=columns)
+        if estimate is not None:
+            response['estimate'] = estimate
+        return response
+
+    def _spill_rows(self, connection, named_cursor, rows: List) -> Tuple[List, bool]:
+        """Read the rest of a paged result, up to SQL_PAGE_SNAPSHOT_MAX_ROWS"""
+        watchdog = get_cancel_watchdog()
+        rows = list(rows)
+        while len(rows) < self.page_snapshot_max_rows:
+            with watchdog.guard(connection, self.timeout + self.cancel_grace_period):
+                chunk = named_cursor.fetchmany(min(self.stream_chunk_size, self.page_snapshot_max_rows - len(rows)))
+            if not chunk:
+                return rows, False
+            rows.extend(chunk)
+
+        with watchdog.guard(connection, self.timeout + self.cancel_grace_period):
+            truncated = named_cursor.fetchone() is not None
+        if truncated:
+            logger.warning(f"Paged results truncated to {self.page_snapshot_max_rows} rows")
+        return rows, truncated
+
+    def _page_response(self, cursor: Dict[str, Any], page: int, data: List, mode: Optional[str],
+                       next_token: Optional[str], columns: Optional[List[str]] = None,
+                       truncated: bool = False) -> Dict[str, Any]:
+        response = {
+            'success': True,
+            'data': data,
+            'columns': cursor.get('columns', []) if columns is None else columns,
+            'row_count': len(data),
+            'query': cursor['query'],
+            'page': {
+                'number': page + 1,
+                'size': cursor['page_size'],
+                'mode': mode,
+                'next_token': next_token,
+            }
+        }
+        if truncated:
+            response['truncated'] = True
+        return response
+
+    def _compile_chunk_encoder(self, description, result_format: str):
+        """
+        Header event and per-chunk encoder for a streamed result set
+        """
+        header = {
+            'columns': [col[0] for col in description] if description else [],
+            'column_types': column_type_names(description),
+        }
 
-        # Wait for completion or timeout
-        thread.join(timeout=self.timeout)
+        if result_format == RESULT_FORMAT_ARROW:
+            header['schema'], build_batch = compile_batch_builder(description)
 
-        if thread.is_alive():
-            # Query is still running, it timed out
-            raise QueryTimeoutException(f"Query execution timed out after {self.timeout} seconds")
+            def encode_chunk(rows):
+                return {'batch': build_batch(rows)}
+        else:
+            serialize_rows = compile_row_serializer(description)
 
-        if exception_container[0]:
-            raise exception_container[0]
+            def encode_chunk(rows):
+                return {'rows': serialize_rows(rows)}
 
-        return result
+        return header, encode_chunk
 
-    def get_database_stats(self) -> Dict[str, Any]:
+    def _parse_and_format_query(self, sql_query: str, add_limit: bool = True) -> str:
         """
-        Get database statistics including table row counts and relationships
+        Parse and format the SQL query
+        """
+        return analyze_query(sql_query).formatted_query(self.max_rows if add_limit else None)
+
+    def _execute_with_timeout(self, sql_query: str, timeout: Optional[float] = None,
+                              result_format: str = RESULT_FORMAT_ROWS, min_lsn: Optional[str] = None,
+                              check_cost: bool = True) -> Dict[str, Any]:
         """
+        Execute query with a server-side statement timeout.
+
+        Postgres aborts the statement itself once ``statement_timeout`` is
+        reached; the watchdog cancels the backend if it still hasn't returned
+        after the grace period (e.g. stuck on the network).
+
+        Reads are routed to a replica when one is within the lag limit.
+        With ``min_lsn``, ``fresh`` reports whether that replica had replayed
+        the primary up to that WAL position.
+
+        The cost guard EXPLAINs the query on the same connection first; if it
+        rewrites the query, the SQL that ran is returned as ``query``.
+        """
+        if timeout is None or timeout > self.timeout:
+            timeout = self.timeout
+
+        result = {'data': [], 'columns': [], 'row_count': 0}
+        router = get_router()
+        pool = router.choose()
+        annotate(source=pool.name)
+
         try:
-            with connections['default'].cursor() as cursor:
-                # Get all tables first
-                cursor.execute("""
-                    SELECT table_name
-                    FROM information_schema.tables
-                    WHERE table_schema = 'public'
-                    AND table_type = 'BASE TABLE'
-                    ORDER BY table_name
-                """)
-
-                tables = []
-                total_rows = 0
-
-                # Define table descriptions
-                table_descriptions = {
-                    'branches': 'Bank branch locations and contact information',
-                    'customers': 'Customer personal and financial information',
-                    'accounts': 'Bank accounts (checking, savings, etc.) with balances',
-                    'transactions': 'All account transactions and transfers',
-                    'credit_cards': 'Credit card information and limits',
-                    'credit_card_transactions': 'Credit card purchases and payments',
-                    'loans': 'Loan information (mortgages, personal, auto loans)',
-                    'loan_payments': 'Individual loan payment records',
-                    'auth_user': 'Django user accounts for system access',
-                    'django_migrations': 'Database migration tracking',
-                    'embeddings_schemaembedding': 'Schema embeddings for RAG system'
-                }
+            # SET LOCAL only lasts until the checkout's transaction is rolled
+            # back, so the connection goes back to the pool with its default timeout
+            with pool.connection() as connection:
+                with connection.cursor() as cursor:
+                    if router.is_replica(pool):
+                        if min_lsn is None:
+                            result['fresh'] = False
+                        else:
+                            cursor.execute("SELECT pg_last_wal_replay_lsn() >= %s::pg_lsn", [min_lsn])
+                            result['fresh'] = bool(cursor.fetchone()[0])
+
+                    cursor.execute(f"SET LOCAL statement_timeout = {max(1, int(timeout * 1000))}")
+
+                    with get_cancel_watchdog().guard(connection, timeout + self.cancel_grace_period):
+                        if check_cost and self.cost_guard.enabled:
+                            checked_query, result['estimate'] = self.cost_guard.check(cursor, sql_query)
+                            annotate(plan_cost=result['estimate']['total_cost'])
+                            if checked_query != sql_query:
+                                sql_query = result['query'] = checked_query
+
+                        cursor.execute(sql_query)
+
+                        # Get column names
+                        if cursor.description:
+                            result['columns'] = [col[0] for col in cursor.description]
+
+                            # Fetch results with row limit
+                            rows = cursor.fetchmany(self.max_rows)
+                            result['column_types'] = column_type_names(cursor.description)
+                            if result_format == RESULT_FORMAT_COLUMNAR:
+                                result['data'] = compile_column_serializer(cursor.description)(rows)
+                            else:
+                                result['data'] = compile_row_serializer(cursor.description)(rows)
+                            result['row_count'] = len(rows)
+
+                            # Check if there are more rows
+                            if cursor.fetchone():
+                                result['truncated'] = True
+                                logger.warning(f"Query results truncated to {self.max_rows} rows")
+                        else:
+                            # Query didn't return results (shouldn't happen with SELECT)
+                            result['row_count'] = cursor.rowcount
+
+        except psycopg2.Error as e:
+            if _is_query_canceled(e):
+                raise QueryTimeoutException(f"Query execution timed out after {timeout} seconds") from e
+            raise
+
+        return result
 
-                table_names = [row[0] for row in cursor.fetchall()]
+    def get_database_stats(self, exact: bool = False) -> Dict[str, Any]:
+        """
+        Get database statistics including table row counts and relationships.
 
-                for table_name in table_names:
+        Row counts come from the planner's estimates (``pg_class.reltuples``)
+        unless exact counts have been cached by the background refresh;
+        ``row_count_source`` says which. Stale or missing exact counts
+        schedule a refresh. ``exact=True`` counts every table now instead.
+        """
+        try:
+            with connections['default'].cursor() as cursor:
+                # One catalog query for every table instead of a COUNT(*) each
+                cursor.execute(TABLE_CATALOG_SQL)
+                catalog = [
+                    row for row in cursor.fetchall()
                     # Skip Django internal tables for cleaner display
-                    if table_name.startswith(('auth_', 'django_')) or table_name == 'embeddings_schemaembedding':
-                        continue
-
-                    # Get accurate row count for each table
-                    cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-                    row_count = cursor.fetchone()[0]
+                    if not row[0].startswith(('auth_', 'django_')) and row[0] != 'embeddings_schemaembedding'
+                ]
 
-                    tables.append({
-                        'table_name': table_name,
-                        'row_count': row_count,
-                        'description': table_descriptions.get(table_name, f'Database table: {table_name}')
-                    })
-                    total_rows += row_count
+            if exact:
+                exact_counts = self.refresh_exact_counts([row[0] for row in catalog])
+            else:
+                exact_counts = self._cached_exact_counts()
+
+            counts = exact_counts['counts'] if exact_counts else {}
+            tables = []
+            total_rows = 0
+            for table_name, estimated_rows, size_bytes in catalog:
+                row_count = counts.get(table_name)
+                tables.append({
+                    'table_name': table_name,
+                    'row_count': estimated_rows if row_count is None else row_count,
+                    'row_count_source': 'estimate' if row_count is None else 'exact',
+                    'estimated_row_count': estimated_rows,
+                    'size_bytes': size_bytes,
+                    'description': TABLE_DESCRIPTIONS.get(table_name, f'Database table: {table_name}')
+                })
+                total_rows += tables[-1]['row_count']
 
-                return {
-                    'success': True,
-                    'total_tables': len(tables),
-                    'total_rows': total_rows,
-                    'tables': tables,
-                    'relationships': [
-                        {'from': 'customers', 'to': 'accounts', 'type': 'one-to-many'},
-                        {'from': 'customers', 'to': 'credit_cards', 'type': 'one-to-many'},
-                        {'from': 'customers', 'to': 'loans', 'type': 'one-to-many'},
-                        {'from': 'accounts', 'to': 'transactions', 'type': 'one-to-many'},
-                        {'from': 'credit_cards', 'to': 'credit_card_transactions', 'type': 'one-to-many'},
-                        {'from': 'loans', 'to': 'loan_payments', 'type': 'one-to-many'},
-                        {'from': 'branches', 'to': 'customers', 'type': 'one-to-many'},
-                        {'from': 'branches', 'to': 'accounts', 'type': 'one-to-many'}
-                    ]
-                }
+            return {
+                'success': True,
+                'total_tables': len(tables),
+                'total_rows': total_rows,
+                'exact_counts_refreshed_at': exact_counts['refreshed_at'] if exact_counts else None,
+                'tables': tables,
+                'relationships': TABLE_RELATIONSHIPS
+            }
 
         except Exception as e:
             logger.error(f"Error getting database stats: {str(e)}")
@@ -265,6 +818,60 @@ class DatabaseService:
                 'error': str(e)
             }
 
+    def _cached_exact_counts(self) -> Optional[Dict[str, Any]]:
+        """Exact counts from the last refresh, scheduling a new one when they're stale"""
+        exact_counts = cache.get(EXACT_COUNTS_CACHE_KEY)
+        if exact_counts is None or time.time() - exact_counts['refreshed_at_ts'] > self.stats_exact_ttl:
+            self._schedule_exact_counts_refresh()
+        return exact_counts
+
+    def _schedule_exact_counts_refresh(self):
+        # The lock keeps concurrent dashboard loads from queueing one refresh each
+        token = uuid.uuid4().hex
+        if not cache.add(EXACT_COUNTS_LOCK_KEY, token, int(self.stats_exact_ttl)):
+            return
+        try:
+            from .tasks import refresh_exact_counts_task
+            refresh_exact_counts_task.delay(lock_token=token)
+        except Exception as e:
+            cache.delete(EXACT_COUNTS_LOCK_KEY)
+            logger.warning(f"Could not schedule exact row count refresh: {str(e)}")
+
+    def refresh_exact_counts(self, table_names: Optional[List[str]] = None,
+                             lock_token: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Count rows of every table with ``COUNT(*)`` and cache the counts.
+        Runs on the read pool (or a replica), one table per checkout. A
+        refresh queued by ``_schedule_exact_counts_refresh`` passes its lock
+        token, and releases the lock when done.
+        """
+        try:
+            if table_names is None:
+                with connections['default'].cursor() as cursor:
+                    cursor.execute(TABLE_CATALOG_SQL)
+                    table_names = [row[0] for row in cursor.fetchall()]
+
+            counts = {}
+            for table_name in table_names:
+                with get_router().choose().connection() as connection, connection.cursor() as cursor:
+                    cursor.execute(f"SET LOCAL statement_timeout = {int(self.stats_count_timeout * 1000)}")
+                    cursor.execute(sql.SQL("SELECT COUNT(*) FROM {}").format(sql.Identifier(table_name)))
+                    counts[table_name] = cursor.fetchone()[0]
+
+            refreshed_at = timezone.now()
+            exact_counts = {
+                'counts': counts,
+                'refreshed_at': refreshed_at.isoformat(),
+                'refreshed_at_ts': refreshed_at.timestamp(),
+            }
+            # Kept past the refresh interval, so a slow refresh still has counts to show
+            cache.set(EXACT_COUNTS_CACHE_KEY, exact_counts, int(self.stats_exact_ttl * 2))
+            return exact_counts
+        finally:
+            # Only the refresh holding the lock releases it, not an exact=true request
+            if lock_token is not None and cache.get(EXACT_COUNTS_LOCK_KEY) == lock_token:
+                cache.delete(EXACT_COUNTS_LOCK_KEY)
+
     def test_connection(self) -> Dict[str, Any]:
         """
         Test database connection
@@ -287,32 +894,31 @@ class DatabaseService:
 
     def get_table_info(self, table_name: str) -> Dict[str, Any]:
         """
-        Get information about a specific table
+        Get information about a specific table, from the schema catalog
         """
         try:
-            query = """
-                SELECT column_name, data_type, is_nullable, column_default
-                FROM information_schema.columns
-                WHERE table_name = %s
-                ORDER BY ordinal_position;
-            """
-
-            with connections['default'].cursor() as cursor:
-                cursor.execute(query, [table_name])
-                columns = cursor.fetchall()
+            table = get_schema_catalog().table(table_name)
+            if table is None:
+                return {
+                    'success': False,
+                    'error': f"Table '{table_name}' does not exist"
+                }
 
             return {
                 'success': True,
                 'table_name': table_name,
                 'columns': [
                     {
-                        'name': col[0],
-                        'type': col[1],
-                        'nullable': col[2] == 'YES',
-                        'default': col[3]
+                        'name': column['name'],
+                        'type': column['type'],
+                        'nullable': column['nullable'],
+                        'default': column['default']
                     }
-                    for col in columns
-                ]
+                    for column in table['columns']
+                ],
+                'primary_key': table['primary_key'],
+                'foreign_keys': table['foreign_keys'],
+                'enums': table['enums']
             }
         except Exception as e:
             return {
@@ -322,21 +928,10 @@ class DatabaseService:
 
     def get_available_tables(self) -> List[str]:
         """
-        Get list of available tables
+        Get list of available tables, from the schema catalog
         """
         try:
-            query = """
-                SELECT table_name
-                FROM information_schema.tables
-                WHERE table_schema = 'public'
-                ORDER BY table_name;
-            """
-
-            with connections['default'].cursor() as cursor:
-                cursor.execute(query)
-                tables = [row[0] for row in cursor.fetchall()]
-
-            return tables
+            return get_schema_catalog().tables()
         except Exception as e:
             logger.error(f"Error getting available tables: {str(e)}")
             return []
\ No newline at end of file
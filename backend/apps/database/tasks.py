@@ -0,0 +1,12 @@
+from celery import shared_task
+
+
+@shared_task
+def refresh_exact_counts_task(lock_token: str = None) -> dict:
+    """
+    Count every table exactly and cache the counts for the stats endpoint
+    """
+    from .services import DatabaseService
+
+    exact_counts = DatabaseService().refresh_exact_counts(lock_token=lock_token)
+    return {'tables': len(exact_counts['counts']), 'refreshed_at': exact_counts['refreshed_at']}
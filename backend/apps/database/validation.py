@@ -0,0 +1,89 @@
+import difflib
+import logging
+from typing import Dict, Any, List, Optional
+
+from .analysis import QueryAnalysis
+
+logger = logging.getLogger(__name__)
+
+
+class SchemaValidationException(ValueError):
+    """Exception raised when a query names tables or columns the schema doesn't have"""
+
+    def __init__(self, errors: List[str]):
+        super().__init__(f"Query does not match the database schema: {'; '.join(errors)}")
+        self.errors = errors
+
+
+def _suggestion(name: str, candidates) -> str:
+    matches = difflib.get_close_matches(name, sorted(candidates), n=1)
+    return f"; did you mean '{matches[0]}'?" if matches else ''
+
+
+def validate_references(analysis: QueryAnalysis, catalog) -> List[str]:
+    """
+    Resolve every table and column reference in an analyzed query against
+    the schema catalog, without touching the database.
+
+    Aliases resolve within their SELECT and the ones enclosing it; columns
+    of CTEs, subqueries and set-returning functions aren't known, so a
+    scope reading one of those only has its qualified references to real
+    tables checked. Returns one message per problem, empty when all resolve.
+    """
+    errors: List[str] = []
+    scopes = analysis.scopes
+
+    def lookup(schema: Optional[str], relation: Optional[str]) -> Optional[Dict[str, Any]]:
+        if relation is None or relation in analysis.ctes or schema not in (None, 'public'):
+            return None
+        return catalog.table(relation)
+
+    def chain(index: Optional[int]):
+        while index is not None:
+            yield scopes[index]
+            index = scopes[index].parent
+
+    for scope in scopes:
+        for _, schema, relation in scope.sources:
+            if relation is not None and relation not in analysis.ctes and schema in (None, 'public') \
+                    and catalog.table(relation) is None:
+                errors.append(f"Table '{relation}' does not exist" + _suggestion(relation, catalog.tables()))
+
+    for index, scope in enumerate(scopes):
+        visible = list(chain(index))
+        opaque = any(outer.opaque for outer in visible)
+        bound = {}
+        for outer in reversed(visible):
+            for alias, schema, relation in outer.sources:
+                if alias is not None:
+                    bound[alias] = (relation, lookup(schema, relation))
+
+        for qualifier, name in scope.columns:
+            if qualifier is not None:
+                if qualifier not in bound:
+                    if not opaque:
+                        in_scope = ', '.join(
+                            f"{alias} ({relation})" if relation and relation != alias else alias
+                            for alias, (relation, _) in bound.items()
+                        )
+                        errors.append(f"Unknown table or alias '{qualifier}' in '{qualifier}.{name}'"
+                                      + (f"; tables in scope: {in_scope}" if in_scope else ''))
+                    continue
+                relation, table = bound[qualifier]
+                if table is not None and name.lower() not in table['column_names']:
+                    errors.append(f"Column '{name}' does not exist in table '{relation}'"
+                                  + _suggestion(name.lower(), table['column_names']))
+                continue
+
+            tables = [table for _, table in bound.values()]
+            if opaque or any(table is None for table in tables) or not tables:
+                continue
+            if name.lower() in bound or any(name.lower() in outer.aliases for outer in visible):
+                continue
+            if not any(name.lower() in table['column_names'] for table in tables):
+                names = ', '.join(sorted({relation for relation, _ in bound.values()}))
+                candidates = set().union(*(table['column_names'] for table in tables))
+                errors.append(f"Column '{name}' does not exist in {names}" + _suggestion(name.lower(), candidates))
+
+    # Same message once, in order of appearance
+    return list(dict.fromkeys(errors))
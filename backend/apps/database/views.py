@@ -1,37 +1,119 @@
+import json
 import logging
+from django.http import StreamingHttpResponse
 from rest_framework import status
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, renderer_classes
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from django.conf import settings
 
-from .services import DatabaseService
+from utils.caching import StaleWhileRevalidateCache
+
+from .arrow import ARROW_STREAM_MEDIA_TYPE, ipc_stream
+from .renderers import ColumnarJSONRenderer, ArrowStreamRenderer
+from .pool import get_read_pool, get_router
+from .services import DatabaseService, RESULT_FORMAT_ARROW, RESULT_FORMAT_COLUMNAR
 from .serializers import QueryRequestSerializer
 
 logger = logging.getLogger(__name__)
 
+# Listings and stats are served from the cache and recomputed behind it
+schema_list_cache = StaleWhileRevalidateCache(
+    'schema_list', settings.SQL_SCHEMA_LIST_CACHE_TTL, settings.SQL_SCHEMA_LIST_CACHE_MAX_AGE,
+    cacheable=lambda tables: bool(tables)
+)
+stats_cache = StaleWhileRevalidateCache(
+    'database_stats', settings.SQL_STATS_CACHE_TTL, settings.SQL_STATS_CACHE_MAX_AGE,
+    cacheable=lambda stats: stats.get('success', False)
+)
+
 
 @api_view(['POST'])
+@renderer_classes(api_settings.DEFAULT_RENDERER_CLASSES + [ColumnarJSONRenderer, ArrowStreamRenderer])
 def execute_query(request):
     """
     Execute a SQL query safely
+
+    With ``stream=true`` the full result is streamed as NDJSON: a
+    ``{"columns": [...]}`` line, one JSON array per row, then a
+    ``{"row_count": n, "truncated": bool}`` line.
+
+    ``?format=columnar`` returns one array per column, and ``?format=arrow``
+    (or ``Accept: application/vnd.apache.arrow.stream``) streams the full
+    result as an Arrow IPC stream.
+
+    With ``page_size`` the first page is returned with a
+    ``page.next_token``; post ``{"page_token": ...}`` for the next one.
     """
     serializer = QueryRequestSerializer(data=request.data)
     if not serializer.is_valid():
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return _json_response(request, serializer.errors, status.HTTP_400_BAD_REQUEST)
 
-    sql_query = serializer.validated_data['query']
+    sql_query = serializer.validated_data.get('query')
+    result_format = request.accepted_renderer.format
 
     try:
         db_service = DatabaseService()
-        result = db_service.execute_safe_query(sql_query)
+
+        if 'page_token' in serializer.validated_data:
+            result = db_service.fetch_page(serializer.validated_data['page_token'])
+            if not result['success']:
+                return Response(result, status=status.HTTP_400_BAD_REQUEST)
+            return Response(result)
+
+        if 'page_size' in serializer.validated_data:
+            result = db_service.execute_paged_query(sql_query, serializer.validated_data['page_size'])
+            if not result['success']:
+                return Response(result, status=status.HTTP_400_BAD_REQUEST)
+            return Response(result)
+
+        if result_format == RESULT_FORMAT_ARROW:
+            try:
+                events = db_service.stream_query(sql_query, result_format=RESULT_FORMAT_ARROW)
+                # Run the query now, so errors can still be sent as JSON
+                header = next(events)
+            except Exception as e:
+                return _json_response(request, {
+                    'success': False,
+                    'error': str(e),
+                    'query': sql_query
+                }, status.HTTP_400_BAD_REQUEST)
+
+            response = StreamingHttpResponse(ipc_stream(header['schema'], _arrow_batches(events)),
+                                             content_type=ARROW_STREAM_MEDIA_TYPE)
+            response['Cache-Control'] = 'no-cache'
+            response['X-Accel-Buffering'] = 'no'
+            return response
+
+        if serializer.validated_data['stream'] or request.query_params.get('stream', '').lower() == 'true':
+            try:
+                events = db_service.stream_query(sql_query)
+            except ValueError as e:
+                return Response({
+                    'success': False,
+                    'error': str(e),
+                    'query': sql_query
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            response = StreamingHttpResponse(_ndjson_lines(events), content_type='application/x-ndjson')
+            response['Cache-Control'] = 'no-cache'
+            response['X-Accel-Buffering'] = 'no'
+            return response
+
+        if result_format == RESULT_FORMAT_COLUMNAR:
+            result = db_service.execute_safe_query(sql_query, result_format=RESULT_FORMAT_COLUMNAR)
+        else:
+            result = db_service.execute_safe_query(sql_query)
 
         return Response(result)
 
     except Exception as e:
         logger.error(f"Error executing query: {str(e)}")
-        return Response({
+        return _json_response(request, {
             'success': False,
             'error': str(e)
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        }, status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
 @api_view(['GET'])
@@ -52,14 +134,25 @@ def test_connection(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+def pool_stats(request):
+    """
+    Size and saturation of the read-only connection pool and replica pools
+    """
+    return Response({
+        'success': True,
+        'pool': get_read_pool().stats(),
+        'replicas': get_router().stats()
+    })
+
+
 @api_view(['GET'])
 def list_tables(request):
     """
     Get list of available tables
     """
     try:
-        db_service = DatabaseService()
-        tables = db_service.get_available_tables()
+        tables = schema_list_cache.get('tables', lambda: DatabaseService().get_available_tables())
 
         return Response({
             'success': True,
@@ -97,10 +190,16 @@ def table_info(request, table_name):
 def database_stats(request):
     """
     Get database statistics including table row counts
+
+    Counts are planner estimates or cached exact counts; ``?exact=true``
+    counts every table now. The response is served stale-while-revalidate.
     """
     try:
-        db_service = DatabaseService()
-        stats = db_service.get_database_stats()
+        if request.query_params.get('exact', '').lower() == 'true':
+            stats = DatabaseService().get_database_stats(exact=True)
+            stats_cache.set('stats', stats)
+        else:
+            stats = stats_cache.get('stats', lambda: DatabaseService().get_database_stats())
         return Response(stats)
 
     except Exception as e:
@@ -108,4 +207,39 @@ def database_stats(request):
         return Response({
             'success': False,
             'error': str(e)
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def _ndjson_lines(events):
+    """
+    Encode streamed query events as NDJSON, one write per fetched chunk
+    """
+    try:
+        for event in events:
+            if 'rows' in event:
+                yield ''.join(json.dumps(row, default=str) + '\n' for row in event['rows'])
+            else:
+                yield json.dumps(event) + '\n'
+    except Exception as e:
+        # Headers are already sent, so the error goes in the stream
+        logger.error(f"Error streaming query: {str(e)}")
+        yield json.dumps({'error': str(e)}) + '\n'
+
+
+def _arrow_batches(events):
+    """Record batches from a streamed query, logging errors that end the stream early"""
+    try:
+        for event in events:
+            if 'batch' in event:
+                yield event['batch']
+    except Exception as e:
+        # Re-raised so the IPC stream is left without its end-of-stream marker
+        logger.error(f"Error streaming query: {str(e)}")
+        raise
+
+
+def _json_response(request, data, status_code):
+    """Error bodies are JSON whatever format was negotiated"""
+    request.accepted_renderer = JSONRenderer()
+    request.accepted_media_type = JSONRenderer.media_type
+    return Response(data, status=status_code)
@@ -1,20 +1,40 @@
 import logging
+import threading
 import uuid
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
 from sentence_transformers import SentenceTransformer
 from django.conf import settings
 
 from .models import SchemaEmbedding
+from apps.database.catalog import get_schema_catalog
+from utils.tracing import span, annotate
 
 logger = logging.getLogger(__name__)
 
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_embedding_model():
+    """
+    Return the process-wide sentence transformer, loading it on first use
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    return _model
+
 
 class EmbeddingService:
     def __init__(self):
         self.client = QdrantClient(url=settings.QDRANT_URL)
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+        self.model = get_embedding_model()
         self.collection_name = "schema_embeddings"
         self._ensure_collection_exists()
 
@@ -86,21 +106,29 @@ class EmbeddingService:
             logger.error(f"Error embedding schema for {table_name}: {str(e)}")
             raise
 
-    def search_similar_schemas(self, query: str, limit: int = 3) -> List[Dict[str, Any]]:
+    def search_similar_schemas(self, query: str, limit: int = 3,
+                               query_embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
         """
-        Search for similar schemas based on user query
+        Search for similar schemas based on user query.
+
+        A precomputed ``query_embedding`` (e.g. from intent classification)
+        skips re-encoding the query.
         """
         try:
             # Generate embedding for the query
-            query_embedding = self.model.encode(query).tolist()
+            if query_embedding is None:
+                with span('embedding.encode'):
+                    query_embedding = self.model.encode(query).tolist()
 
             # Search in Qdrant
-            search_results = self.client.search(
-                collection_name=self.collection_name,
-                query_vector=query_embedding,
-                limit=limit,
-                with_payload=True
-            )
+            with span('embedding.search', limit=limit):
+                search_results = self.client.search(
+                    collection_name=self.collection_name,
+                    query_vector=query_embedding,
+                    limit=limit,
+                    with_payload=True
+                )
+                annotate(results=len(search_results))
 
             # Format results
             results = []
@@ -112,6 +140,7 @@ class EmbeddingService:
                     'score': result.score
                 })
 
+            results = self._with_live_schema(results)
             logger.info(f"Found {len(results)} similar schemas for query: {query[:50]}...")
             return results
 
@@ -119,6 +148,23 @@ class EmbeddingService:
             logger.error(f"Error searching similar schemas: {str(e)}")
             return []
 
+    def _with_live_schema(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Swap stored DDL for the schema catalog's, which carries keys and
+        allowed values, and drop hits for tables that no longer exist
+        """
+        try:
+            catalog = get_schema_catalog()
+            live = []
+            for result in results:
+                ddl = catalog.ddl(result['table_name'])
+                if ddl is not None:
+                    live.append({**result, 'ddl_statement': ddl})
+            return live
+        except Exception as e:
+            logger.warning(f"Schema catalog unavailable, using stored DDL: {str(e)}")
+            return results
+
     def embed_all_schemas(self, schema_definitions: List[Dict[str, str]]):
         """
         Embed multiple schema definitions at once
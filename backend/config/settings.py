@@ -69,6 +69,26 @@ DATABASES = {
     }
 }
 
+# Read-only pooled connections for user and LLM SQL (see apps/database/pool.py).
+# Defaults to the main credentials; point it at a SELECT-only role in production.
+SQL_READONLY_DATABASE = {
+    'dbname': DATABASES['default']['NAME'],
+    'user': os.getenv('SQL_READONLY_DB_USER', DATABASES['default']['USER']),
+    'password': os.getenv('SQL_READONLY_DB_PASSWORD', DATABASES['default']['PASSWORD']),
+    'host': DATABASES['default']['HOST'],
+    'port': DATABASES['default']['PORT'],
+}
+SQL_POOL_MIN_SIZE = int(os.getenv('SQL_POOL_MIN_SIZE', '2'))
+SQL_POOL_MAX_SIZE = int(os.getenv('SQL_POOL_MAX_SIZE', '10'))
+SQL_POOL_TIMEOUT = float(os.getenv('SQL_POOL_TIMEOUT', '5'))  # seconds to wait for a free connection
+SQL_POOL_HEALTH_CHECK_INTERVAL = float(os.getenv('SQL_POOL_HEALTH_CHECK_INTERVAL', '30'))  # idle seconds before a ping
+
+# Read replicas for analytical SQL: comma-separated DSNs (with the read-only role's credentials)
+SQL_REPLICA_URLS = [url.strip() for url in os.getenv('SQL_REPLICA_URLS', '').split(',') if url.strip()]
+SQL_REPLICA_ROUTING = os.getenv('SQL_REPLICA_ROUTING', 'round_robin')  # 'round_robin' or 'least_loaded'
+SQL_REPLICA_MAX_LAG = float(os.getenv('SQL_REPLICA_MAX_LAG', '5'))  # seconds behind before a replica is skipped
+SQL_REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('SQL_REPLICA_LAG_CHECK_INTERVAL', '5'))  # seconds
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -117,6 +137,22 @@ CORS_ALLOW_ALL_ORIGINS = DEBUG
 # Celery Configuration
 CELERY_BROKER_URL = os.getenv('REDIS_URL', 'redis://localhost:6379')
 CELERY_RESULT_BACKEND = os.getenv('REDIS_URL', 'redis://localhost:6379')
+CELERY_TASK_TRACK_STARTED = True
+CELERY_RESULT_EXPIRES = int(os.getenv('CELERY_RESULT_EXPIRES', '3600'))
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1  # long inference-bound tasks
+# Inference-bound jobs go to a dedicated queue so they scale on their own workers
+CELERY_TASK_ROUTES = {
+    'apps.chat.tasks.*': {'queue': 'inference'},
+    'apps.analytics.tasks.refresh_rollups_task': {'queue': 'maintenance'},
+    'apps.analytics.tasks.snapshot_metrics_task': {'queue': 'maintenance'},
+    'apps.analytics.tasks.*': {'queue': 'inference'},
+    'apps.database.tasks.*': {'queue': 'maintenance'},
+}
+
+# Async job progress streaming: each open stream holds a web worker, so
+# streams end after JOB_EVENTS_MAX_DURATION and clients reconnect
+JOB_EVENTS_POLL_INTERVAL = float(os.getenv('JOB_EVENTS_POLL_INTERVAL', '0.5'))  # seconds
+JOB_EVENTS_MAX_DURATION = float(os.getenv('JOB_EVENTS_MAX_DURATION', '20'))  # seconds
 
 # Cache Configuration
 CACHES = {
@@ -125,12 +161,50 @@ CACHES = {
         'LOCATION': os.getenv('REDIS_URL', 'redis://localhost:6379'),
     }
 }
+# Stale-while-revalidate entries (utils.caching): TTLs are scaled by up to +/- this fraction
+CACHE_SWR_JITTER = float(os.getenv('CACHE_SWR_JITTER', '0.1'))
+CACHE_SWR_LOCK_TTL = float(os.getenv('CACHE_SWR_LOCK_TTL', '30'))  # seconds a lock outlives a holder that stops extending it
+CACHE_SWR_WAIT_TIMEOUT = float(os.getenv('CACHE_SWR_WAIT_TIMEOUT', '60'))  # seconds a cold read waits on another's recompute
 
 # AI Configuration
 QDRANT_URL = os.getenv('QDRANT_URL', 'http://localhost:6333')
 OLLAMA_URL = os.getenv('OLLAMA_URL', 'http://localhost:11434')
 OLLAMA_MODEL = os.getenv('OLLAMA_MODEL', 'gpt-oss:latest')
 
+# Intent Classification
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv('INTENT_CONFIDENCE_THRESHOLD', '0.45'))
+
+# Analytics: business metrics run as one fused statement ('fused') or concurrently ('parallel')
+ANALYTICS_METRICS_MODE = os.getenv('ANALYTICS_METRICS_MODE', 'fused')
+# Transaction metrics and cohorts read daily/monthly rollups, refreshed by celery beat
+ANALYTICS_USE_ROLLUPS = os.getenv('ANALYTICS_USE_ROLLUPS', 'True').lower() == 'true'
+ANALYTICS_ROLLUP_INTERVAL = float(os.getenv('ANALYTICS_ROLLUP_INTERVAL', '300'))  # seconds
+ANALYTICS_ROLLUP_RECOMPUTE_DAYS = int(os.getenv('ANALYTICS_ROLLUP_RECOMPUTE_DAYS', '3'))  # trailing days rebuilt each run
+# Rollups older than this (seconds) are bypassed for the raw tables; 0 never bypasses them
+ANALYTICS_ROLLUP_MAX_LAG = float(os.getenv('ANALYTICS_ROLLUP_MAX_LAG', '1800'))
+# Business metrics are stored as BusinessMetric snapshots by celery beat and served from the latest
+ANALYTICS_METRICS_SNAPSHOT_INTERVAL = float(os.getenv('ANALYTICS_METRICS_SNAPSHOT_INTERVAL', '900'))  # seconds
+ANALYTICS_METRICS_RETENTION_DAYS = int(os.getenv('ANALYTICS_METRICS_RETENTION_DAYS', '365'))  # 0 keeps every snapshot
+ANALYTICS_METRICS_CACHE_TTL = float(os.getenv('ANALYTICS_METRICS_CACHE_TTL', '60'))  # seconds the latest snapshot is cached fresh
+ANALYTICS_METRICS_CACHE_MAX_AGE = float(os.getenv('ANALYTICS_METRICS_CACHE_MAX_AGE', '3600'))  # seconds it may be served stale
+
+CELERY_BEAT_SCHEDULE = {
+    'refresh-analytics-rollups': {
+        'task': 'apps.analytics.tasks.refresh_rollups_task',
+        'schedule': ANALYTICS_ROLLUP_INTERVAL,
+    },
+    'snapshot-business-metrics': {
+        'task': 'apps.analytics.tasks.snapshot_metrics_task',
+        'schedule': ANALYTICS_METRICS_SNAPSHOT_INTERVAL,
+    },
+}
+
+# Chat Pipeline
+TRACE_STATS_MAX_MESSAGES = int(os.getenv('TRACE_STATS_MAX_MESSAGES', '5000'))
+CHAT_PIPELINE_WORKERS = int(os.getenv('CHAT_PIPELINE_WORKERS', '4'))
+CHAT_REQUEST_DEADLINE = float(os.getenv('CHAT_REQUEST_DEADLINE', '20'))  # seconds per chat request
+CHAT_JOB_DEADLINE = float(os.getenv('CHAT_JOB_DEADLINE', '120'))  # seconds per queued chat job
+
 # LLM Provider Configuration
 LLM_PROVIDER = os.getenv('LLM_PROVIDER', 'ollama')  # 'ollama' or 'gemini'
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
@@ -139,6 +213,38 @@ GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-pro')
 # Security Settings
 SQL_QUERY_TIMEOUT = int(os.getenv('SQL_QUERY_TIMEOUT', '30'))
 MAX_RESULT_ROWS = int(os.getenv('MAX_RESULT_ROWS', '1000'))
+SQL_CANCEL_GRACE_PERIOD = float(os.getenv('SQL_CANCEL_GRACE_PERIOD', '2'))  # seconds past statement_timeout before cancelling
+SQL_STREAM_CHUNK_SIZE = int(os.getenv('SQL_STREAM_CHUNK_SIZE', '2000'))  # rows per server-side cursor fetch
+SQL_STREAM_MAX_ROWS = int(os.getenv('SQL_STREAM_MAX_ROWS', '5000000'))
+SQL_ANALYSIS_CACHE_SIZE = int(os.getenv('SQL_ANALYSIS_CACHE_SIZE', '2048'))  # parsed queries kept per process
+SQL_PAGE_CURSOR_TTL = int(os.getenv('SQL_PAGE_CURSOR_TTL', '600'))  # seconds a continuation token stays valid
+SQL_PAGE_SNAPSHOT_MAX_ROWS = int(os.getenv('SQL_PAGE_SNAPSHOT_MAX_ROWS', '100000'))  # rows held for pages without a keyset
+
+# Schema catalog: kept in memory, re-checked against a fingerprint of the system catalogs
+SQL_SCHEMA_CATALOG_CHECK_INTERVAL = float(os.getenv('SQL_SCHEMA_CATALOG_CHECK_INTERVAL', '60'))  # seconds between fingerprint checks
+SQL_SCHEMA_CHANGE_LISTEN = os.getenv('SQL_SCHEMA_CHANGE_LISTEN', 'True').lower() == 'true'  # LISTEN for schema_changed notifications
+SQL_SCHEMA_VALIDATION = os.getenv('SQL_SCHEMA_VALIDATION', 'True').lower() == 'true'  # reject unknown tables/columns before execution
+SQL_REPAIR_MAX_ATTEMPTS = int(os.getenv('SQL_REPAIR_MAX_ATTEMPTS', '2'))  # LLM retries with validation errors
+SQL_SCHEMA_LIST_CACHE_TTL = float(os.getenv('SQL_SCHEMA_LIST_CACHE_TTL', '60'))  # seconds a table listing is fresh
+SQL_SCHEMA_LIST_CACHE_MAX_AGE = float(os.getenv('SQL_SCHEMA_LIST_CACHE_MAX_AGE', '86400'))  # seconds it may be served stale
+
+# Database stats: planner estimates, with exact counts refreshed in the background
+SQL_STATS_EXACT_TTL = int(os.getenv('SQL_STATS_EXACT_TTL', '3600'))  # seconds before exact counts are recounted
+SQL_STATS_COUNT_TIMEOUT = int(os.getenv('SQL_STATS_COUNT_TIMEOUT', '300'))  # statement timeout per table COUNT(*)
+SQL_STATS_CACHE_TTL = float(os.getenv('SQL_STATS_CACHE_TTL', '60'))  # seconds the stats response is fresh
+SQL_STATS_CACHE_MAX_AGE = float(os.getenv('SQL_STATS_CACHE_MAX_AGE', '3600'))  # seconds it may be served stale
+
+# Plan cost guard: EXPLAIN before running, 'reject' or 'warn' over the limits, or 'off'
+SQL_COST_GUARD = os.getenv('SQL_COST_GUARD', 'reject')
+SQL_MAX_PLAN_COST = float(os.getenv('SQL_MAX_PLAN_COST', '1000000'))  # planner cost units, 0 disables
+SQL_MAX_PLAN_ROWS = int(os.getenv('SQL_MAX_PLAN_ROWS', '1000000'))  # estimated result rows, 0 disables
+SQL_COST_GUARD_REWRITE_LIMIT = int(os.getenv('SQL_COST_GUARD_REWRITE_LIMIT', '0'))  # retry over-budget queries under this LIMIT, 0 disables
+
+# SQL result cache (in-process LRU in front of the Redis cache)
+SQL_RESULT_CACHE_ENABLED = os.getenv('SQL_RESULT_CACHE_ENABLED', 'True').lower() == 'true'
+SQL_RESULT_CACHE_TTL = int(os.getenv('SQL_RESULT_CACHE_TTL', '300'))  # seconds
+SQL_RESULT_CACHE_MAX_BYTES = int(os.getenv('SQL_RESULT_CACHE_MAX_BYTES', '1048576'))  # per result
+SQL_RESULT_CACHE_LOCAL_MAX_BYTES = int(os.getenv('SQL_RESULT_CACHE_LOCAL_MAX_BYTES', '33554432'))  # per process
 
 # Logging Configuration
 LOGGING = {
@@ -0,0 +1,178 @@
+import contextlib
+import contextvars
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from utils.tracing import annotate
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """
+    Return the shared executor that recomputes stale entries in the background
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='cache-refresh')
+    return _executor
+
+
+class StaleWhileRevalidateCache:
+    """
+    Values in the Django cache with a soft and a hard TTL.
+
+    Until the soft TTL a value is simply served. After it the value is still
+    served, and one process, holding a lock key set with ``cache.add`` (SET NX
+    on Redis), recomputes it in a background thread. Only past the hard TTL,
+    or on the very first read, does a request wait; then one request
+    computes while the others poll for its result. The lock is extended for
+    as long as its holder computes; if the lock is released or lost with no
+    value stored, the next waiter to take it computes. A waiter gives up
+    after ``wait_timeout`` seconds and computes without the lock, so a hung
+    holder can't stall every request for the key. Both TTLs are jittered so
+    entries written together don't expire together.
+    """
+
+    def __init__(self, namespace: str, soft_ttl: float, hard_ttl: float,
+                 jitter: Optional[float] = None, lock_ttl: Optional[float] = None,
+                 wait_timeout: Optional[float] = None,
+                 cacheable: Callable[[Any], bool] = lambda value: True):
+        self.namespace = namespace
+        self.soft_ttl = soft_ttl
+        self.hard_ttl = max(hard_ttl, soft_ttl)
+        self.jitter = settings.CACHE_SWR_JITTER if jitter is None else jitter
+        self.lock_ttl = settings.CACHE_SWR_LOCK_TTL if lock_ttl is None else lock_ttl
+        self.wait_timeout = settings.CACHE_SWR_WAIT_TIMEOUT if wait_timeout is None else wait_timeout
+        self.cacheable = cacheable
+
+    def _key(self, key: str) -> str:
+        return f"swr:{self.namespace}:{key}"
+
+    def _lock_key(self, key: str) -> str:
+        return f"swr:{self.namespace}:{key}:lock"
+
+    def _jittered(self, ttl: float) -> float:
+        return ttl * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def get(self, key: str, compute: Callable[[], Any]) -> Any:
+        """The cached value for ``key``, computing it with ``compute`` only when there is none"""
+        entry = cache.get(self._key(key))
+        if entry is not None:
+            stale = time.time() >= entry['fresh_until']
+            annotate(cache='stale' if stale else 'hit')
+            if stale:
+                self._refresh_in_background(key, compute)
+            return entry['value']
+
+        annotate(cache='miss')
+        return self._compute_cold(key, compute)
+
+    def set(self, key: str, value: Any):
+        if not self.cacheable(value):
+            return
+        soft_ttl = self._jittered(self.soft_ttl)
+        entry = {'value': value, 'stored_at': time.time(), 'fresh_until': time.time() + soft_ttl}
+        cache.set(self._key(key), entry, int(max(self._jittered(self.hard_ttl), soft_ttl)) + 1)
+
+    def refresh(self, key: str, compute: Callable[[], Any]) -> Any:
+        """Recompute and store a value now, e.g. to warm the cache ahead of requests"""
+        value = compute()
+        self.set(key, value)
+        return value
+
+    def mark_stale(self, key: str):
+        """Keep serving the value, but recompute it on the next read"""
+        entry = cache.get(self._key(key))
+        if entry is not None:
+            entry['fresh_until'] = 0
+            cache.set(self._key(key), entry, int(self.hard_ttl))
+
+    def delete(self, key: str):
+        cache.delete(self._key(key))
+
+    def _lock_timeout(self) -> int:
+        return max(1, math.ceil(self.lock_ttl))
+
+    def _acquire(self, key: str) -> Optional[str]:
+        token = uuid.uuid4().hex
+        return token if cache.add(self._lock_key(key), token, self._lock_timeout()) else None
+
+    @contextlib.contextmanager
+    def _holding(self, key: str, token: str):
+        """Extend the lock while the block runs, however long it takes, then release it"""
+        done = threading.Event()
+
+        def extend():
+            while not done.wait(self.lock_ttl / 3):
+                # Not atomic either: at worst a lost lock is held a little longer
+                if cache.get(self._lock_key(key)) != token:
+                    return
+                cache.touch(self._lock_key(key), self._lock_timeout())
+
+        threading.Thread(target=extend, name='cache-lock', daemon=True).start()
+        try:
+            yield
+        finally:
+            done.set()
+            self._release(key, token)
+
+    def _release(self, key: str, token: str):
+        # Not atomic, but the lock expires on its own if this misses
+        if cache.get(self._lock_key(key)) == token:
+            cache.delete(self._lock_key(key))
+
+    def _compute_cold(self, key: str, compute: Callable[[], Any]) -> Any:
+        token = self._acquire(key)
+        deadline = time.monotonic() + self.wait_timeout
+        while token is None:
+            if time.monotonic() >= deadline:
+                logger.warning(f"Gave up waiting for the recompute of {self._key(key)}, computing without the lock")
+                return self.refresh(key, compute)
+            # Someone else is computing it: wait for their result
+            time.sleep(0.05)
+            entry = cache.get(self._key(key))
+            if entry is not None:
+                return entry['value']
+            if cache.get(self._lock_key(key)) is None:
+                # They finished without a value worth caching, or died: one waiter takes over
+                token = self._acquire(key)
+
+        with self._holding(key, token):
+            return self.refresh(key, compute)
+
+    def _refresh_in_background(self, key: str, compute: Callable[[], Any]):
+        token = self._acquire(key)
+        if token is None:
+            return
+
+        def run():
+            try:
+                with self._holding(key, token):
+                    self.refresh(key, compute)
+            except Exception as e:
+                logger.warning(f"Background refresh of {self._key(key)} failed, serving stale value: {str(e)}")
+            finally:
+                # This thread's own database connections, not the request's
+                connections.close_all()
+
+        try:
+            _get_executor().submit(contextvars.copy_context().run, run)
+        except Exception as e:
+            self._release(key, token)
+            logger.warning(f"Could not schedule refresh of {self._key(key)}: {str(e)}")
@@ -0,0 +1,99 @@
+import json
+import logging
+import time
+from typing import Dict, Any, Iterator, Optional
+
+from celery.result import AsyncResult
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+logger = logging.getLogger(__name__)
+
+# Celery states after which a job will not change any more
+FINISHED_STATES = ('SUCCESS', 'FAILURE', 'REVOKED')
+
+
+def job_accepted(job_id: str, status_url: str, events_url: str, **extra) -> Dict[str, Any]:
+    """
+    Body of the 202 response returned when a request is queued as a job
+    """
+    return {
+        'success': True,
+        'job_id': job_id,
+        'status': 'pending',
+        'status_url': status_url,
+        'events_url': events_url,
+        **extra
+    }
+
+
+def get_job_status(job_id: str) -> Dict[str, Any]:
+    """
+    Describe a queued job from the Celery result backend
+    """
+    result = AsyncResult(job_id)
+    state = result.state
+    payload = {'job_id': job_id, 'status': state.lower()}
+
+    if state == 'PROGRESS':
+        payload['progress'] = result.info or {}
+    elif state == 'SUCCESS':
+        job_result = result.result or {}
+        payload['status_code'] = job_result.get('status_code', 200)
+        payload['result'] = job_result.get('response')
+    elif state == 'FAILURE':
+        payload['error'] = str(result.result)
+
+    return payload
+
+
+def job_event_stream(job_id: str, poll_interval: Optional[float] = None,
+                     max_duration: Optional[float] = None) -> Iterator[str]:
+    """
+    Yield Server-Sent Events for each status change of a job until it
+    finishes, or until ``max_duration`` has passed. The stream polls the
+    result backend from a sync view and holds its web worker while open,
+    so it is kept short: it then ends with a ``reconnect`` event, and
+    EventSource clients reconnect on their own after the ``retry`` delay.
+    """
+    poll_interval = settings.JOB_EVENTS_POLL_INTERVAL if poll_interval is None else poll_interval
+    max_duration = settings.JOB_EVENTS_MAX_DURATION if max_duration is None else max_duration
+    deadline = time.monotonic() + max_duration
+    last_payload = None
+
+    yield f"retry: {max(1, round(poll_interval * 1000))}\n\n"
+
+    while True:
+        try:
+            payload = get_job_status(job_id)
+        except Exception as e:
+            logger.error(f"Error reading job {job_id}: {str(e)}")
+            yield _sse_event('error', {'job_id': job_id, 'error': str(e)})
+            return
+
+        if payload != last_payload:
+            yield _sse_event(payload['status'], payload)
+            last_payload = payload
+
+        if payload['status'].upper() in FINISHED_STATES:
+            return
+        if time.monotonic() >= deadline:
+            yield _sse_event('reconnect', {'job_id': job_id, 'status': payload['status']})
+            return
+
+        time.sleep(poll_interval)
+
+
+def job_events_response(job_id: str) -> StreamingHttpResponse:
+    """
+    Stream job progress as ``text/event-stream``
+    """
+    response = StreamingHttpResponse(job_event_stream(job_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
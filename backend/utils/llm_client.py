@@ -3,6 +3,8 @@ import os
 from typing import List, Dict, Any, Optional
 from django.conf import settings
 
+from .tracing import span, annotate
+
 logger = logging.getLogger(__name__)
 
 
@@ -17,14 +19,21 @@ class LLMClient:
         else:
             raise ValueError(f"Unsupported LLM provider: {self.provider}")
 
-    def generate_sql(self, user_question: str, relevant_schemas: List[Dict[str, Any]]) -> str:
-        return self.client.generate_sql(user_question, relevant_schemas)
+    def generate_sql(self, user_question: str, relevant_schemas: List[Dict[str, Any]],
+                     timeout: Optional[float] = None, previous_sql: Optional[str] = None,
+                     errors: Optional[List[str]] = None) -> str:
+        with span('llm.generate_sql', provider=self.provider, repair=bool(errors)):
+            return self.client.generate_sql(user_question, relevant_schemas, timeout=timeout,
+                                            previous_sql=previous_sql, errors=errors)
 
-    def generate_response(self, user_question: str, sql_query: str, query_result: Dict[str, Any]) -> str:
-        return self.client.generate_response(user_question, sql_query, query_result)
+    def generate_response(self, user_question: str, sql_query: str, query_result: Dict[str, Any],
+                          timeout: Optional[float] = None) -> str:
+        with span('llm.generate_response', provider=self.provider):
+            return self.client.generate_response(user_question, sql_query, query_result, timeout=timeout)
 
-    def generate_brief_response(self, user_question: str) -> str:
-        return self.client.generate_brief_response(user_question)
+    def generate_brief_response(self, user_question: str, timeout: Optional[float] = None) -> str:
+        with span('llm.generate_brief_response', provider=self.provider):
+            return self.client.generate_brief_response(user_question, timeout=timeout)
 
     def test_connection(self) -> Dict[str, Any]:
         return self.client.test_connection()
@@ -42,7 +51,8 @@ class GeminiClient:
         self.model_name = os.getenv('GEMINI_MODEL', 'gemini-pro')
         self.model = genai.GenerativeModel(self.model_name)
 
-    def _make_request(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+    def _make_request(self, prompt: str, system_prompt: Optional[str] = None,
+                      timeout: Optional[float] = None) -> str:
         """
         Make a request to Gemini API
         """
@@ -53,24 +63,39 @@ class GeminiClient:
             else:
                 full_prompt = prompt
 
+            request_kwargs = {}
+            if timeout is not None:
+                request_kwargs['request_options'] = {'timeout': timeout}
+
             response = self.model.generate_content(
                 full_prompt,
                 generation_config={
                     'temperature': 0.1,
                     'top_p': 0.9,
                     'max_output_tokens': 500,
-                }
+                },
+                **request_kwargs
             )
 
+            usage = getattr(response, 'usage_metadata', None)
+            if usage is not None:
+                annotate(prompt_tokens=getattr(usage, 'prompt_token_count', None),
+                         completion_tokens=getattr(usage, 'candidates_token_count', None))
+
             return response.text.strip()
 
         except Exception as e:
             logger.error(f"Gemini API request failed: {str(e)}")
             raise Exception(f"Failed to connect to Gemini: {str(e)}")
 
-    def generate_sql(self, user_question: str, relevant_schemas: List[Dict[str, Any]]) -> str:
+    def generate_sql(self, user_question: str, relevant_schemas: List[Dict[str, Any]],
+                     timeout: Optional[float] = None, previous_sql: Optional[str] = None,
+                     errors: Optional[List[str]] = None) -> str:
         """
-        Generate SQL query based on user question and relevant schemas
+        Generate SQL query based on user question and relevant schemas.
+
+        With ``previous_sql`` and its schema validation ``errors``, asks for
+        a corrected query instead.
         """
         system_prompt = """You are a SQL expert. Generate accurate, safe PostgreSQL queries based on the provided database schema and user questions.
 
@@ -89,15 +114,27 @@ Rules:
             for schema in relevant_schemas
         ])
 
+        repair_context = ""
+        if previous_sql and errors:
+            problems = "\n".join(f"- {error}" for error in errors)
+            repair_context = f"""
+Previous Query:
+{previous_sql}
+
+The previous query does not match the schema:
+{problems}
+Correct it using only the tables and columns defined above.
+"""
+
         prompt = f"""Database Schema:
 {schema_context}
 
 User Question: {user_question}
-
+{repair_context}
 Generate a PostgreSQL SELECT query to answer this question. Return only the SQL query:"""
 
         try:
-            sql_query = self._make_request(prompt, system_prompt)
+            sql_query = self._make_request(prompt, system_prompt, timeout=timeout)
 
             # Clean up the response (remove markdown formatting if present)
             sql_query = sql_query.replace('```sql', '').replace('```', '').strip()
@@ -112,7 +149,8 @@ Generate a PostgreSQL SELECT query to answer this question. Return only the SQL
             logger.error(f"Error generating SQL: {str(e)}")
             raise Exception(f"Failed to generate SQL query: {str(e)}")
 
-    def generate_response(self, user_question: str, sql_query: str, query_result: Dict[str, Any]) -> str:
+    def generate_response(self, user_question: str, sql_query: str, query_result: Dict[str, Any],
+                          timeout: Optional[float] = None) -> str:
         """
         Generate natural language response based on query results
         """
@@ -155,14 +193,14 @@ Query Results: {result_text}
 Provide a helpful response to the user's question based on these results:"""
 
         try:
-            response = self._make_request(prompt, system_prompt)
+            response = self._make_request(prompt, system_prompt, timeout=timeout)
             return response
 
         except Exception as e:
             logger.error(f"Error generating response: {str(e)}")
             return f"I found the data you requested, but encountered an error generating the response. The query returned {query_result.get('row_count', 0)} results."
 
-    def generate_brief_response(self, user_question: str) -> str:
+    def generate_brief_response(self, user_question: str, timeout: Optional[float] = None) -> str:
         """
         Generate brief response for non-database questions
         """
@@ -173,7 +211,7 @@ Provide a helpful response to the user's question based on these results:"""
 This question doesn't seem to be about database queries. Provide a brief response and suggest asking about the banking database instead:"""
 
         try:
-            response = self._make_request(prompt, system_prompt)
+            response = self._make_request(prompt, system_prompt, timeout=timeout)
             # Ensure response is brief
             if len(response) > 200:
                 response = response[:197] + "..."
@@ -3,6 +3,8 @@ import requests
 from typing import List, Dict, Any, Optional
 from django.conf import settings
 
+from .tracing import annotate
+
 logger = logging.getLogger(__name__)
 
 
@@ -12,7 +14,8 @@ class OllamaClient:
         self.model = settings.OLLAMA_MODEL
         self.session = requests.Session()
 
-    def _make_request(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+    def _make_request(self, prompt: str, system_prompt: Optional[str] = None,
+                      timeout: Optional[float] = None) -> str:
         """
         Make a request to Ollama API
         """
@@ -33,10 +36,11 @@ class OllamaClient:
             if system_prompt:
                 payload["system"] = system_prompt
 
-            response = self.session.post(url, json=payload, timeout=60)
+            response = self.session.post(url, json=payload, timeout=timeout if timeout is not None else 60)
             response.raise_for_status()
 
             result = response.json()
+            annotate(prompt_tokens=result.get('prompt_eval_count'), completion_tokens=result.get('eval_count'))
             return result.get('response', '').strip()
 
         except requests.exceptions.RequestException as e:
@@ -46,9 +50,14 @@ class OllamaClient:
             logger.error(f"Error in Ollama request: {str(e)}")
             raise
 
-    def generate_sql(self, user_question: str, relevant_schemas: List[Dict[str, Any]]) -> str:
+    def generate_sql(self, user_question: str, relevant_schemas: List[Dict[str, Any]],
+                     timeout: Optional[float] = None, previous_sql: Optional[str] = None,
+                     errors: Optional[List[str]] = None) -> str:
         """
-        Generate SQL query based on user question and relevant schemas
+        Generate SQL query based on user question and relevant schemas.
+
+        With ``previous_sql`` and its schema validation ``errors``, asks for
+        a corrected query instead.
         """
         system_prompt = """You are a SQL expert. Generate accurate, safe PostgreSQL queries based on the provided database schema and user questions.
 
@@ -67,15 +76,27 @@ Rules:
             for schema in relevant_schemas
         ])
 
+        repair_context = ""
+        if previous_sql and errors:
+            problems = "\n".join(f"- {error}" for error in errors)
+            repair_context = f"""
+Previous Query:
+{previous_sql}
+
+The previous query does not match the schema:
+{problems}
+Correct it using only the tables and columns defined above.
+"""
+
         prompt = f"""Database Schema:
 {schema_context}
 
 User Question: {user_question}
-
+{repair_context}
 Generate a PostgreSQL SELECT query to answer this question. Return only the SQL query:"""
 
         try:
-            sql_query = self._make_request(prompt, system_prompt)
+            sql_query = self._make_request(prompt, system_prompt, timeout=timeout)
 
             # Clean up the response (remove markdown formatting if present)
             sql_query = sql_query.replace('```sql', '').replace('```', '').strip()
@@ -90,7 +111,8 @@ Generate a PostgreSQL SELECT query to answer this question. Return only the SQL
             logger.error(f"Error generating SQL: {str(e)}")
             raise Exception(f"Failed to generate SQL query: {str(e)}")
 
-    def generate_response(self, user_question: str, sql_query: str, query_result: Dict[str, Any]) -> str:
+    def generate_response(self, user_question: str, sql_query: str, query_result: Dict[str, Any],
+                          timeout: Optional[float] = None) -> str:
         """
         Generate natural language response based on query results
         """
@@ -133,14 +155,14 @@ Query Results: {result_text}
 Provide a helpful response to the user's question based on these results:"""
 
         try:
-            response = self._make_request(prompt, system_prompt)
+            response = self._make_request(prompt, system_prompt, timeout=timeout)
             return response
 
         except Exception as e:
             logger.error(f"Error generating response: {str(e)}")
             return f"I found the data you requested, but encountered an error generating the response. The query returned {query_result.get('row_count', 0)} results."
 
-    def generate_brief_response(self, user_question: str) -> str:
+    def generate_brief_response(self, user_question: str, timeout: Optional[float] = None) -> str:
         """
         Generate brief response for non-database questions
         """
@@ -151,7 +173,7 @@ Provide a helpful response to the user's question based on these results:"""
 This question doesn't seem to be about database queries. Provide a brief response and suggest asking about the banking database instead:"""
 
         try:
-            response = self._make_request(prompt, system_prompt)
+            response = self._make_request(prompt, system_prompt, timeout=timeout)
             # Ensure response is brief
             if len(response) > 200:
                 response = response[:197] + "..."
@@ -0,0 +1,106 @@
+import contextvars
+import math
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Iterable, List
+
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+class Trace:
+    """
+    Span timings collected while handling one request.
+
+    Spans are plain dicts so the compact form can be stored as JSON.
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+
+    def offset_ms(self) -> float:
+        return round((time.perf_counter() - self.started_at) * 1000, 2)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'total_ms': self.offset_ms(),
+            'spans': sorted(self.spans, key=lambda entry: entry['start_ms']),
+        }
+
+
+@contextmanager
+def start_trace():
+    """
+    Collect spans opened in this context (and contexts copied from it)
+    """
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    Time a block as a named span. A no-op when no trace is active.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    entry = {'name': name, 'start_ms': trace.offset_ms(), **attrs}
+    token = _current_span.set(entry)
+    start = time.perf_counter()
+    try:
+        yield entry
+    except Exception:
+        entry['error'] = True
+        raise
+    finally:
+        entry['ms'] = round((time.perf_counter() - start) * 1000, 2)
+        _current_span.reset(token)
+        trace.spans.append(entry)
+
+
+def annotate(**attrs):
+    """Attach attributes (row counts, token counts...) to the innermost open span"""
+    entry = _current_span.get()
+    if entry is not None:
+        entry.update({key: value for key, value in attrs.items() if value is not None})
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def aggregate_spans(traces: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Summarize span durations by name across stored traces
+    """
+    durations: Dict[str, List[float]] = {}
+    for trace in traces:
+        if not trace:
+            continue
+        for entry in trace.get('spans', []):
+            durations.setdefault(entry['name'], []).append(entry.get('ms', 0.0))
+        durations.setdefault('total', []).append(trace.get('total_ms', 0.0))
+
+    summary = {}
+    for name, values in durations.items():
+        values.sort()
+        summary[name] = {
+            'count': len(values),
+            'p50': percentile(values, 50),
+            'p95': percentile(values, 95),
+            'p99': percentile(values, 99),
+            'max': values[-1],
+        }
+    return summary
@@ -0,0 +1,19 @@
+-- Read-only role used by the pooled connections that run user and LLM SQL
+-- (SQL_READONLY_DB_USER / SQL_READONLY_DB_PASSWORD)
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'sql_reader') THEN
+        CREATE ROLE sql_reader LOGIN PASSWORD 'sql_reader';
+    END IF;
+END
+$$;
+
+ALTER ROLE sql_reader SET default_transaction_read_only = on;
+
+GRANT CONNECT ON DATABASE banking_db TO sql_reader;
+GRANT USAGE ON SCHEMA public TO sql_reader;
+GRANT SELECT ON ALL TABLES IN SCHEMA public TO sql_reader;
+
+-- Tables created later (e.g. by Django migrations) are readable too
+ALTER DEFAULT PRIVILEGES IN SCHEMA public GRANT SELECT ON TABLES TO sql_reader;
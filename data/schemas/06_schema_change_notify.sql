@@ -0,0 +1,16 @@
+-- Notify listeners when DDL changes the schema, so the application's
+-- schema catalog reloads straight away instead of at its next poll
+-- (SQL_SCHEMA_CHANGE_LISTEN / SQL_SCHEMA_CATALOG_CHECK_INTERVAL)
+
+CREATE OR REPLACE FUNCTION notify_schema_change() RETURNS event_trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_notify('schema_changed', tg_tag);
+END;
+$$;
+
+DROP EVENT TRIGGER IF EXISTS schema_change_notify;
+
+CREATE EVENT TRIGGER schema_change_notify
+    ON ddl_command_end
+    EXECUTE FUNCTION notify_schema_change();
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+"""
+Benchmark DataFrame construction from query results: trial conversion of
+every column vs dtypes taken from the result's column types
+"""
+
+import os
+import sys
+import timeit
+import tracemalloc
+import warnings
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from apps.analytics.frames import typed_dataframe
+
+ROWS = 100_000
+REPEAT = 5
+
+COLUMNS = ['transaction_id', 'account_id', 'amount', 'balance_after', 'transaction_type',
+           'merchant_category', 'status', 'description', 'transaction_date', 'posted_on']
+COLUMN_TYPES = ['int4', 'int4', 'numeric', 'numeric', 'varchar',
+                'varchar', 'varchar', 'text', 'timestamp', 'date']
+
+TYPES = ['deposit', 'withdrawal', 'transfer', 'payment', 'fee']
+CATEGORIES = ['grocery', 'travel', 'utilities', 'dining', 'retail', None]
+STATUSES = ['completed', 'pending', 'failed']
+
+
+def build_rows():
+    """Rows as execute_safe_query returns them: numerics as floats, dates as ISO strings"""
+    start = datetime(2024, 1, 1)
+    return [
+        [
+            row,
+            row % 5000,
+            round(row * 0.37 % 2500, 2),
+            None if row % 97 == 0 else round(row * 1.3 % 90000, 2),
+            TYPES[row % len(TYPES)],
+            CATEGORIES[row % len(CATEGORIES)],
+            STATUSES[row % len(STATUSES)],
+            f'Transaction {row} at merchant {row % 40000}',
+            (start + timedelta(minutes=row)).isoformat(),
+            (date(2024, 1, 1) + timedelta(days=row % 365)).isoformat(),
+        ]
+        for row in range(ROWS)
+    ]
+
+
+def trial_conversion(columns, data):
+    """The previous approach: an object frame, then to_numeric and to_datetime tried on every column"""
+    df = pd.DataFrame(data, columns=columns)
+    for col in df.columns:
+        try:
+            df[col] = pd.to_numeric(df[col])
+        except (ValueError, TypeError):
+            pass
+        if pd.api.types.is_string_dtype(df[col].dtype):
+            try:
+                df[col] = pd.to_datetime(df[col])
+            except (ValueError, TypeError):
+                pass
+    return df
+
+
+def measure(label, build):
+    seconds = min(timeit.repeat(build, number=1, repeat=REPEAT))
+    tracemalloc.start()
+    df = build()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    size = df.memory_usage(deep=True).sum()
+    print(f"   - {label:<18} {seconds * 1000:8.1f} ms   frame {size / 2**20:6.1f} MiB   "
+          f"peak while building {peak / 2**20:6.1f} MiB")
+    return seconds, df
+
+
+def main():
+    # to_datetime warns on every text column the trial path tries
+    warnings.simplefilter('ignore', UserWarning)
+    rows = build_rows()
+    columnar = [list(column) for column in zip(*rows)]
+
+    print(f"⏱️  Building a DataFrame from {ROWS} x {len(COLUMNS)} results (best of {REPEAT}):")
+    baseline, trial_df = measure("trial conversion", lambda: trial_conversion(COLUMNS, rows))
+    typed, typed_df = measure("typed (rows)", lambda: typed_dataframe(COLUMNS, rows, COLUMN_TYPES))
+    typed_columnar, _ = measure("typed (columnar)", lambda: typed_dataframe(COLUMNS, columnar, COLUMN_TYPES,
+                                                                            columnar=True))
+    print(f"   speedup {baseline / typed:4.1f}x from rows, {baseline / typed_columnar:4.1f}x from columns")
+
+    print("\n   dtypes (trial -> typed):")
+    for col in COLUMNS:
+        print(f"   - {col:<18} {str(trial_df[col].dtype):<22} {typed_df[col].dtype}")
+
+
+if __name__ == "__main__":
+    main()
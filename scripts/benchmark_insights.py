@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""
+Benchmark insight and visualization generation on a wide result: one
+linregress per (date, numeric) column pair and nested correlation loops vs
+one sort per date column and matrix-wide fits
+"""
+
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from apps.analytics.plan import AnalysisFrame
+from apps.analytics.services import AnalyticsService
+
+ROWS = 20_000
+DATE_COLUMNS = 2
+NUMERIC_COLUMNS = 46
+TEXT_COLUMNS = 2
+REPEAT = 5
+
+
+def build_frame() -> pd.DataFrame:
+    """A 50-column result: dates, trending and correlated numerics with NULLs, categories"""
+    rng = np.random.default_rng(42)
+    columns = {}
+    for i in range(DATE_COLUMNS):
+        dates = pd.Series(pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.permutation(ROWS), unit='h'))
+        dates[rng.random(ROWS) < 0.01] = pd.NaT
+        columns[f'date_{i}'] = dates
+    drift = np.linspace(0, 1, ROWS)
+    for i in range(NUMERIC_COLUMNS):
+        values = rng.normal(size=ROWS) + drift * (i % 5)
+        if i % 3 == 0 and i > 0:
+            values = columns[f'num_{i - 1}'] * 2 + rng.normal(scale=0.1, size=ROWS)
+        values = np.where(rng.random(ROWS) < 0.02, np.nan, values)
+        columns[f'num_{i}'] = values
+    for i in range(TEXT_COLUMNS):
+        columns[f'text_{i}'] = pd.Categorical(rng.choice(['retail', 'premium', 'business'], size=ROWS))
+    return pd.DataFrame(columns)
+
+
+def pairwise_insights(df: pd.DataFrame) -> list:
+    """The previous approach: a sorted copy and linregress per pair, correlations walked in Python"""
+    insights = []
+    numeric_cols = df.select_dtypes(include=[np.number]).columns
+    datetime_cols = df.select_dtypes(include=['datetime64', 'datetimetz']).columns
+    for date_col in datetime_cols:
+        for num_col in numeric_cols:
+            temp_df = df[[date_col, num_col]].dropna().sort_values(date_col)
+            if len(temp_df) > 3:
+                slope, _, r_value, p_value, _ = stats.linregress(np.arange(len(temp_df)), temp_df[num_col].values)
+                if abs(r_value) > 0.3 and p_value < 0.05:
+                    insights.append(('trend', num_col, abs(r_value)))
+
+    for col in numeric_cols:
+        data = df[col].dropna()
+        if len(data) > 10:
+            outliers = np.sum(np.abs(stats.zscore(data)) > 3)
+            if outliers > 0:
+                insights.append(('anomaly', col, min(outliers / len(data), 1.0)))
+
+    corr_matrix = df[numeric_cols].corr()
+    for i, col1 in enumerate(numeric_cols):
+        for col2 in numeric_cols[i + 1:]:
+            corr_value = corr_matrix.loc[col1, col2]
+            if abs(corr_value) > 0.7:
+                insights.append(('correlation', f"{col1}_vs_{col2}", abs(corr_value)))
+    return insights
+
+
+def vectorized_insights(service: AnalyticsService, df: pd.DataFrame) -> list:
+    return service._generate_insights(AnalysisFrame(df), '')
+
+
+def main():
+    df = build_frame()
+    service = AnalyticsService()
+
+    print(f"⏱️  Insights on {ROWS} x {len(df.columns)} results (best of {REPEAT}):")
+    pairwise = min(timeit.repeat(lambda: pairwise_insights(df), number=1, repeat=REPEAT))
+    vectorized = min(timeit.repeat(lambda: vectorized_insights(service, df), number=1, repeat=REPEAT))
+    print(f"   - pairwise           {pairwise * 1000:8.1f} ms")
+    print(f"   - vectorized         {vectorized * 1000:8.1f} ms   speedup {pairwise / vectorized:5.1f}x")
+
+    expected = sorted(pairwise_insights(df), key=lambda insight: insight[2], reverse=True)[:10]
+    found = [(insight['type'], insight['metric']) for insight in vectorized_insights(service, df)]
+    print(f"   same top 10 insights: {found == [(kind, metric) for kind, metric, _ in expected]}")
+
+    visualizations = min(timeit.repeat(lambda: service._generate_visualization_config(AnalysisFrame(df)),
+                                       number=1, repeat=REPEAT))
+    print(f"   - visualizations     {visualizations * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""
+Benchmark SQL validation and formatting: separate sqlparse passes vs one
+parse per query, cold and memoized
+"""
+
+import os
+import sys
+import timeit
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import django
+from django.conf import settings
+
+settings.configure(SQL_ANALYSIS_CACHE_SIZE=1024)
+django.setup()
+
+import sqlparse
+
+from apps.database.analysis import QueryAnalysis, AnalysisCache, DANGEROUS_KEYWORDS
+from apps.database.result_cache import VOLATILE_SQL
+
+MAX_ROWS = 1000
+REPEAT = 20
+
+# Shaped like the queries the LLM generates for the banking schema
+QUERIES = [
+    "SELECT * FROM customers LIMIT 10;",
+    "SELECT c.first_name, c.last_name, SUM(a.balance) AS total_balance FROM customers c "
+    "JOIN accounts a ON a.customer_id = c.id GROUP BY c.id, c.first_name, c.last_name "
+    "ORDER BY total_balance DESC LIMIT 10;",
+    "SELECT DATE_TRUNC('month', t.transaction_date) AS month, t.transaction_type, COUNT(*) AS count, "
+    "SUM(t.amount) AS volume FROM transactions t WHERE t.transaction_date >= '2024-01-01' "
+    "GROUP BY 1, 2 ORDER BY 1, 2;",
+    "WITH monthly AS (SELECT customer_id, DATE_TRUNC('month', created_at) AS month, COUNT(*) AS n "
+    "FROM accounts GROUP BY 1, 2) SELECT m.month, AVG(m.n) FROM monthly m JOIN customers c "
+    "ON c.id = m.customer_id WHERE c.id IN (SELECT customer_id FROM loans WHERE status = 'active') "
+    "GROUP BY m.month ORDER BY m.month;",
+]
+
+
+def separate_passes(sql_query):
+    """The previous path: one sqlparse pass per question asked of the query"""
+    # _is_safe_query
+    for statement in sqlparse.parse(sql_query):
+        next(token for token in statement.flatten() if not token.is_whitespace)
+    any(keyword in sql_query.upper() for keyword in DANGEROUS_KEYWORDS)
+    # _parse_and_format_query
+    formatted = sqlparse.format(str(sqlparse.parse(sql_query)[0]), reindent=True, keyword_case='upper')
+    if 'LIMIT' not in formatted.upper():
+        formatted = f"{formatted.rstrip(';')} LIMIT {MAX_ROWS};"
+    # Result cache: volatility, referenced tables and the normalized key text
+    VOLATILE_SQL.search(formatted)
+    sqlparse.parse(formatted)
+    sqlparse.format(formatted, strip_comments=True, keyword_case='upper')
+    return formatted
+
+
+def single_parse(sql_query):
+    analysis = QueryAnalysis(sql_query)
+    VOLATILE_SQL.search(analysis.normalized)
+    analysis.normalized_query(MAX_ROWS)
+    return analysis.formatted_query(MAX_ROWS)
+
+
+def main():
+    analyses = AnalysisCache(max_entries=1024)
+
+    def memoized(sql_query):
+        analysis = analyses.analyze(sql_query)
+        VOLATILE_SQL.search(analysis.normalized)
+        analysis.normalized_query(MAX_ROWS)
+        return analysis.formatted_query(MAX_ROWS)
+
+    print(f"⏱️  Validating and formatting generated queries (best of {REPEAT}):")
+    for index, sql_query in enumerate(QUERIES, 1):
+        assert single_parse(sql_query) == separate_passes(sql_query)
+
+        baseline = min(timeit.repeat(lambda: separate_passes(sql_query), number=10, repeat=REPEAT)) / 10
+        cold = min(timeit.repeat(lambda: single_parse(sql_query), number=10, repeat=REPEAT)) / 10
+        warm = min(timeit.repeat(lambda: memoized(sql_query), number=1000, repeat=REPEAT)) / 1000
+        print(f"   - query {index} ({len(sql_query):3} chars)  separate {baseline * 1000:6.2f} ms   "
+              f"single {cold * 1000:6.2f} ms ({baseline / cold:3.1f}x)   memoized {warm * 1e6:6.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
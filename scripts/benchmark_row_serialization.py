@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Benchmark per-cell vs per-column (compiled) row serialization
+"""
+
+import os
+import sys
+import timeit
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from apps.database.serialization import (
+    serialize_value, compile_row_serializer,
+    PG_INT4, PG_NUMERIC, PG_FLOAT8, PG_TEXT, PG_DATE, PG_TIMESTAMP,
+)
+
+ROWS = 1000
+COLUMNS = 20
+REPEAT = 20
+
+
+def per_cell(rows):
+    """The previous approach: an isinstance chain for every value"""
+    return [[serialize_value(val) for val in row] for row in rows]
+
+
+def build_result(type_codes, make_value):
+    description = [(f'col_{i}', code) for i, code in enumerate(type_codes)]
+    rows = [tuple(make_value(r, c) for c in range(len(type_codes))) for r in range(ROWS)]
+    return description, rows
+
+
+def numeric_value(row, column):
+    if column % 2:
+        return Decimal(row * column) / 100
+    return row * column
+
+
+def date_value(row, column):
+    start = datetime(2024, 1, 1)
+    if column % 2:
+        return (start + timedelta(hours=row + column)).date()
+    return start + timedelta(minutes=row * column)
+
+
+def mixed_value(row, column):
+    return [row, f'name {row}', Decimal(row) / 7, date(2024, 1, 1) + timedelta(days=row % 365), float(row)][column % 5]
+
+
+def run(label, description, rows):
+    compiled = compile_row_serializer(description)
+    assert compiled(rows) == per_cell(rows)
+
+    baseline = min(timeit.repeat(lambda: per_cell(rows), number=1, repeat=REPEAT))
+    optimized = min(timeit.repeat(lambda: compiled(rows), number=1, repeat=REPEAT))
+    print(f"   - {label:<26} per-cell {baseline * 1000:7.2f} ms   compiled {optimized * 1000:7.2f} ms   "
+          f"speedup {baseline / optimized:4.1f}x")
+
+
+def main():
+    print(f"⏱️  Serializing {ROWS} x {COLUMNS} results (best of {REPEAT}):")
+    run("wide numeric (int/numeric)",
+        *build_result([PG_INT4 if i % 2 == 0 else PG_NUMERIC for i in range(COLUMNS)], numeric_value))
+    run("wide dates (date/timestamp)",
+        *build_result([PG_TIMESTAMP if i % 2 == 0 else PG_DATE for i in range(COLUMNS)], date_value))
+    run("mixed",
+        *build_result([[PG_INT4, PG_TEXT, PG_NUMERIC, PG_DATE, PG_FLOAT8][i % 5] for i in range(COLUMNS)], mixed_value))
+    run("ints and text only",
+        *build_result([PG_INT4 if i % 2 == 0 else PG_TEXT for i in range(COLUMNS)],
+                      lambda r, c: r * c if c % 2 == 0 else f'value {r}'))
+
+
+if __name__ == "__main__":
+    main()
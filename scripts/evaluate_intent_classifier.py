@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+"""
+Evaluate the chat intent classifier: accuracy and per-message latency
+"""
+
+import os
+import sys
+import django
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+# Setup Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from apps.chat.intent import IntentClassifier, INTENT_EVALUATION_SET
+
+
+def main():
+    print("🧭 Building intent centroids...")
+    classifier = IntentClassifier()
+
+    # Warm up the model so the first sample doesn't skew latency
+    classifier.classify("warm up")
+
+    report = classifier.evaluate(INTENT_EVALUATION_SET)
+
+    print(f"\n📊 Accuracy: {report['accuracy']:.1%} on {report['samples']} samples")
+    print(f"   Above threshold ({report['threshold']:.2f}): {report['confident_rate']:.1%}")
+
+    print("\n🎯 Per intent:")
+    for intent, stats in report['per_intent'].items():
+        print(f"   - {intent:<10} {stats['correct']}/{stats['total']} ({stats['accuracy']:.1%})")
+
+    print("\n⏱️  Latency (ms):")
+    for stage, summary in report['latency_ms'].items():
+        print(f"   - {stage:<8} p50 {summary['p50']:.3f}  p95 {summary['p95']:.3f}  "
+              f"p99 {summary['p99']:.3f}  max {summary['max']:.3f}")
+
+    if report['errors']:
+        print("\n❌ Misclassified:")
+        for error in report['errors']:
+            print(f"   - \"{error['text']}\": expected {error['expected']}, "
+                  f"got {error['predicted']} ({error['confidence']:.2f})")
+
+
+if __name__ == "__main__":
+    main()
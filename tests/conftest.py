@@ -22,6 +22,7 @@ def pytest_configure():
         STATIC_URL='/static/',
         ROOT_URLCONF='config.urls',
         INSTALLED_APPS=[
+            'django.contrib.admin',
             'django.contrib.auth',
             'django.contrib.contenttypes',
             'django.contrib.sessions',
@@ -32,6 +33,7 @@ def pytest_configure():
             'apps.chat',
             'apps.embeddings',
             'apps.database',
+            'apps.analytics',
         ],
         MIDDLEWARE=[
             'django.middleware.security.SecurityMiddleware',
@@ -51,6 +53,58 @@ def pytest_configure():
         OLLAMA_MODEL='test-model',
         SQL_QUERY_TIMEOUT=30,
         MAX_RESULT_ROWS=1000,
+        SQL_CANCEL_GRACE_PERIOD=2.0,
+        SQL_STREAM_CHUNK_SIZE=2000,
+        SQL_STREAM_MAX_ROWS=5000000,
+        SQL_ANALYSIS_CACHE_SIZE=256,
+        SQL_PAGE_CURSOR_TTL=600,
+        SQL_PAGE_SNAPSHOT_MAX_ROWS=100000,
+        SQL_SCHEMA_CATALOG_CHECK_INTERVAL=60.0,
+        SQL_SCHEMA_CHANGE_LISTEN=False,
+        SQL_SCHEMA_VALIDATION=False,
+        SQL_REPAIR_MAX_ATTEMPTS=2,
+        SQL_STATS_EXACT_TTL=3600,
+        SQL_STATS_COUNT_TIMEOUT=300,
+        SQL_COST_GUARD='off',
+        SQL_MAX_PLAN_COST=1000000.0,
+        SQL_MAX_PLAN_ROWS=1000000,
+        SQL_COST_GUARD_REWRITE_LIMIT=0,
+        SQL_READONLY_DATABASE={'dbname': 'test', 'user': 'test', 'password': 'test', 'host': 'localhost', 'port': '5432'},
+        SQL_POOL_MIN_SIZE=1,
+        SQL_POOL_MAX_SIZE=2,
+        SQL_POOL_TIMEOUT=0.2,
+        SQL_POOL_HEALTH_CHECK_INTERVAL=30.0,
+        SQL_REPLICA_URLS=[],
+        SQL_REPLICA_ROUTING='round_robin',
+        SQL_REPLICA_MAX_LAG=5.0,
+        SQL_REPLICA_LAG_CHECK_INTERVAL=5.0,
+        SQL_RESULT_CACHE_ENABLED=True,
+        SQL_RESULT_CACHE_TTL=300,
+        SQL_RESULT_CACHE_MAX_BYTES=1048576,
+        SQL_RESULT_CACHE_LOCAL_MAX_BYTES=33554432,
+        INTENT_CONFIDENCE_THRESHOLD=0.45,
+        ANALYTICS_METRICS_MODE='fused',
+        ANALYTICS_USE_ROLLUPS=True,
+        ANALYTICS_ROLLUP_INTERVAL=300.0,
+        ANALYTICS_ROLLUP_RECOMPUTE_DAYS=3,
+        ANALYTICS_ROLLUP_MAX_LAG=1800.0,
+        ANALYTICS_METRICS_SNAPSHOT_INTERVAL=900.0,
+        ANALYTICS_METRICS_RETENTION_DAYS=365,
+        ANALYTICS_METRICS_CACHE_TTL=60.0,
+        ANALYTICS_METRICS_CACHE_MAX_AGE=3600.0,
+        CACHE_SWR_JITTER=0.1,
+        CACHE_SWR_LOCK_TTL=2.0,
+        CACHE_SWR_WAIT_TIMEOUT=10.0,
+        SQL_STATS_CACHE_TTL=60.0,
+        SQL_STATS_CACHE_MAX_AGE=3600.0,
+        SQL_SCHEMA_LIST_CACHE_TTL=60.0,
+        SQL_SCHEMA_LIST_CACHE_MAX_AGE=86400.0,
+        CHAT_PIPELINE_WORKERS=2,
+        CHAT_REQUEST_DEADLINE=20.0,
+        CHAT_JOB_DEADLINE=120.0,
+        TRACE_STATS_MAX_MESSAGES=5000,
+        JOB_EVENTS_POLL_INTERVAL=0.01,
+        JOB_EVENTS_MAX_DURATION=5.0,
     )
     django.setup()
 
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+from django.test import TestCase
+from unittest.mock import patch
+from apps.analytics.plan import AnalysisFrame, AnalysisPlan, SECTIONS, linear_trends
+from apps.analytics.services import AnalyticsService, stats
+
+RESULT = {
+    'success': True,
+    'columns': ['day', 'amount', 'fee', 'segment'],
+    'column_types': ['date', 'numeric', 'numeric', 'varchar'],
+    'data': [[f'2024-01-{day:02d}', day * 10.0, day * 0.5 + (day % 3), 'premium' if day % 2 else 'standard']
+             for day in range(1, 29)],
+    'row_count': 28,
+}
+
+
+class TestAnalysisPlan(TestCase):
+    def setUp(self):
+        self.service = AnalyticsService()
+
+    def test_descriptive_skips_statistical_tests(self):
+        """Test that a descriptive analysis runs none of the scipy tests it doesn't report"""
+        with patch.object(stats, 'shapiro') as mock_shapiro, patch.object(stats.t, 'interval') as mock_interval:
+            analysis = self.service.analyze_query_result('SELECT ...', RESULT, 'descriptive')
+
+        mock_shapiro.assert_not_called()
+        mock_interval.assert_not_called()
+        self.assertNotIn('statistical', analysis)
+        self.assertEqual(analysis['metadata']['sections'],
+                         ['descriptive', 'insights', 'visualizations', 'recommendations'])
+        self.assertIn('amount', analysis['descriptive']['numeric_summary']['describe'])
+
+    def test_outlier_includes_statistical(self):
+        """Test that an outlier analysis reports the statistical section"""
+        analysis = self.service.analyze_query_result('SELECT ...', RESULT, 'outlier')
+
+        self.assertIn('amount', analysis['statistical']['confidence_intervals'])
+        self.assertNotIn('visualizations', analysis)
+
+    def test_unknown_type_gets_every_section(self):
+        """Test that a type without a plan computes every section"""
+        self.assertEqual(AnalysisPlan('something-else').sections, SECTIONS)
+
+    def test_intermediates_are_shared(self):
+        """Test that sections reuse one correlation matrix and one NULL-free series per column"""
+        frame = AnalysisFrame(pd.DataFrame({'a': [1.0, None, 3.0, 4.0], 'b': [2.0, 4.0, 5.0, 9.0]}))
+
+        with patch.object(pd.DataFrame, 'corr', wraps=frame.df.corr) as mock_corr:
+            self.service._descriptive_analysis(frame)
+            self.service._generate_insights(frame, 'SELECT ...')
+        mock_corr.assert_called_once()
+
+        self.assertIs(frame.series('a'), frame.series('a'))
+        self.assertEqual(frame.series('a').tolist(), [1.0, 3.0, 4.0])
+
+
+class TestVectorizedInsights(TestCase):
+    def setUp(self):
+        self.service = AnalyticsService()
+
+    def test_linear_trends_match_linregress(self):
+        """Test that fitting all columns at once matches linregress per column, NaNs skipped"""
+        rng = np.random.default_rng(7)
+        values = rng.normal(size=(40, 4)).cumsum(axis=0)
+        values[rng.random(values.shape) < 0.2] = np.nan
+        values[:, 3] = 5.0
+
+        trends = linear_trends(values)
+
+        for col in range(3):
+            y = values[~np.isnan(values[:, col]), col]
+            expected = stats.linregress(np.arange(len(y)), y)
+            self.assertEqual(trends['n'][col], len(y))
+            self.assertAlmostEqual(trends['slope'][col], expected.slope)
+            self.assertAlmostEqual(trends['r_value'][col], expected.rvalue)
+            self.assertAlmostEqual(trends['p_value'][col], expected.pvalue)
+        self.assertEqual(trends['r_value'][3], 0.0)
+
+    def test_trends_sort_by_each_date_column(self):
+        """Test that trends follow date order, not row order, and skip rows without a date"""
+        df = pd.DataFrame({
+            'day': pd.to_datetime(['2024-01-05', '2024-01-01', None, '2024-01-03', '2024-01-02', '2024-01-04']),
+            'amount': [50.0, 10.0, 999.0, 30.0, 20.0, 40.0],
+        })
+
+        insights = self.service._generate_insights(AnalysisFrame(df), 'SELECT ...')
+
+        trend = next(insight for insight in insights if insight['type'] == 'trend')
+        self.assertEqual(trend['title'], 'amount shows increasing trend over time')
+        self.assertAlmostEqual(trend['value'], 10.0)
+
+    def test_correlations_reported_once_per_pair(self):
+        """Test that each strongly correlated pair is one insight, in column order"""
+        base = np.arange(20, dtype=float)
+        df = pd.DataFrame({'a': base, 'b': base * 2 + 1, 'c': -base, 'd': np.tile([1.0, -1.0], 10)})
+
+        insights = self.service._generate_insights(df, 'SELECT ...')
+
+        pairs = [insight['metric'] for insight in insights if insight['type'] == 'correlation']
+        self.assertEqual(pairs, ['a_vs_b', 'a_vs_c', 'b_vs_c'])
+
+    def test_visualizations_stop_at_limit(self):
+        """Test that visualizations keep their order and stop at eight"""
+        df = pd.DataFrame({f'n{i}': np.arange(5, dtype=float) for i in range(6)})
+
+        configs = self.service._generate_visualization_config(df)
+
+        self.assertEqual([config['type'] for config in configs], ['histogram'] * 6 + ['scatter'] * 2)
+        self.assertEqual((configs[-1]['x_column'], configs[-1]['y_column']), ('n0', 'n2'))
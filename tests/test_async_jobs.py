@@ -0,0 +1,104 @@
+import json
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory
+from unittest.mock import patch, Mock
+from apps.chat.views import chat
+from apps.analytics.views import analyze_data
+from utils.jobs import get_job_status, job_event_stream
+
+
+class TestAsyncJobSubmission(TestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+
+    @patch('apps.chat.tasks.process_chat_message_task')
+    def test_chat_async_returns_job_id(self, mock_task):
+        """Test that async chat requests are queued and return 202"""
+        mock_delay = mock_task.delay
+        mock_delay.return_value = Mock(id='job-123')
+        request = self.factory.post('/api/chat/', {'message': 'How many customers?', 'async': True}, format='json')
+
+        response = chat(request)
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['job_id'], 'job-123')
+        self.assertTrue(response.data['status_url'].endswith('/api/chat/jobs/job-123/'))
+        mock_delay.assert_called_once_with('How many customers?', response.data['session_id'])
+
+    @patch('apps.chat.tasks.process_chat_message_task')
+    def test_chat_async_broker_unavailable(self, mock_task):
+        """Test that an unreachable broker is reported as 503"""
+        mock_delay = mock_task.delay
+        mock_delay.side_effect = ConnectionError("broker down")
+        request = self.factory.post('/api/chat/?async=true', {'message': 'How many customers?'}, format='json')
+
+        response = chat(request)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.data['success'])
+
+    @patch('apps.analytics.tasks.run_analysis_task')
+    def test_analysis_async_returns_job_id(self, mock_task):
+        """Test that async analysis requests are queued and return 202"""
+        mock_delay = mock_task.delay
+        mock_delay.return_value = Mock(id='job-456')
+        request = self.factory.post('/api/analytics/analyze/', {
+            'query': 'SELECT * FROM accounts', 'analysis_type': 'trend', 'async': True
+        }, format='json')
+
+        response = analyze_data(request)
+
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(response.data['events_url'].endswith('/api/analytics/jobs/job-456/events/'))
+        mock_delay.assert_called_once_with('SELECT * FROM accounts', 'trend', None)
+
+
+class TestJobStatus(TestCase):
+    @patch('utils.jobs.AsyncResult')
+    def test_progress_status(self, mock_result):
+        """Test that in-flight jobs report their progress metadata"""
+        mock_result.return_value = Mock(state='PROGRESS', info={'stage': 'execution'})
+
+        payload = get_job_status('job-1')
+
+        self.assertEqual(payload['status'], 'progress')
+        self.assertEqual(payload['progress']['stage'], 'execution')
+
+    @patch('utils.jobs.AsyncResult')
+    def test_success_status_includes_result(self, mock_result):
+        """Test that finished jobs include the response body"""
+        mock_result.return_value = Mock(state='SUCCESS', result={'status_code': 200, 'response': {'success': True}})
+
+        payload = get_job_status('job-1')
+
+        self.assertEqual(payload['status'], 'success')
+        self.assertEqual(payload['result'], {'success': True})
+
+    @patch('utils.jobs.AsyncResult')
+    def test_event_stream_emits_changes_until_finished(self, mock_result):
+        """Test that the SSE stream emits one event per status change and stops when done"""
+        mock_result.side_effect = [
+            Mock(state='PENDING'),
+            Mock(state='PENDING'),
+            Mock(state='PROGRESS', info={'stage': 'analytics'}),
+            Mock(state='SUCCESS', result={'status_code': 200, 'response': {'success': True}}),
+        ]
+
+        retry, *events = job_event_stream('job-1', poll_interval=0)
+
+        self.assertEqual(retry, 'retry: 1\n\n')
+        self.assertEqual([event.split('\n')[0] for event in events],
+                         ['event: pending', 'event: progress', 'event: success'])
+        last = json.loads(events[-1].split('data: ', 1)[1])
+        self.assertEqual(last['result'], {'success': True})
+
+    @patch('utils.jobs.AsyncResult')
+    def test_event_stream_ends_with_reconnect(self, mock_result):
+        """Test that a stream open past its maximum duration tells the client to reconnect"""
+        mock_result.return_value = Mock(state='STARTED')
+
+        retry, *events = job_event_stream('job-1', poll_interval=0.5, max_duration=0)
+
+        self.assertEqual(retry, 'retry: 500\n\n')
+        self.assertEqual([event.split('\n')[0] for event in events], ['event: started', 'event: reconnect'])
+        self.assertEqual(json.loads(events[-1].split('data: ', 1)[1]), {'job_id': 'job-1', 'status': 'started'})
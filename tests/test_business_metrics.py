@@ -0,0 +1,95 @@
+import threading
+from django.test import TestCase
+from unittest.mock import patch, Mock
+from apps.analytics.metrics import MetricsEngine, MetricQuery, fuse_queries, BUSINESS_METRIC_QUERIES
+from apps.analytics.services import AnalyticsService
+from apps.database.services import DatabaseService
+
+FUSED_COLUMNS = [
+    'total_customers', 'premium_customers', 'avg_credit_score', 'avg_income',
+    'total_accounts', 'total_balance', 'avg_balance', 'negative_balance_accounts',
+    'total_loans', 'total_loan_amount', 'total_outstanding', 'defaulted_loans', 'avg_interest_rate',
+    'transaction_count', 'transaction_volume', 'avg_transaction_amount',
+]
+FUSED_ROW = [200, 50, 700.0, 65000.0, 400, 1000000.0, 2500.0, 4, 100, 500000.0, 250000.0, 5, 6.5, 3000, 90000.0, 30.0]
+
+
+def _result(columns, row):
+    return {'success': True, 'columns': columns, 'data': [row], 'row_count': 1}
+
+
+class TestMetricsEngine(TestCase):
+    def test_fuse_queries_builds_one_statement(self):
+        """Test that a batch becomes one WITH statement cross-joining every aggregate"""
+        sql = fuse_queries([MetricQuery('a', 'SELECT COUNT(*) AS n FROM customers'),
+                            MetricQuery('b', 'SELECT SUM(balance) AS s FROM accounts')])
+
+        self.assertEqual(sql, "WITH a AS (SELECT COUNT(*) AS n FROM customers),\n"
+                              "b AS (SELECT SUM(balance) AS s FROM accounts)\nSELECT * FROM a, b")
+
+    def test_business_metrics_use_one_round_trip(self):
+        """Test that the dashboard metrics come from a single trusted query"""
+        db_service = Mock()
+        db_service.execute_trusted_query.return_value = _result(FUSED_COLUMNS, FUSED_ROW)
+        service = AnalyticsService.__new__(AnalyticsService)
+        service.db_service = db_service
+
+        with self.settings(ANALYTICS_METRICS_MODE='fused'):
+            result = service.calculate_business_metrics()
+
+        db_service.execute_trusted_query.assert_called_once()
+        db_service.execute_safe_query.assert_not_called()
+        metrics = result['metrics']
+        self.assertEqual(metrics['customer_metrics']['premium_customer_rate'], 25.0)
+        self.assertEqual(metrics['account_metrics']['negative_balance_rate'], 1.0)
+        self.assertEqual(metrics['loan_metrics']['default_rate'], 5.0)
+        self.assertEqual(metrics['transaction_metrics']['monthly_transaction_count'], 3000)
+
+    def test_fused_failure_falls_back_to_separate_queries(self):
+        """Test that one failing aggregate doesn't lose the others"""
+        db_service = Mock()
+
+        def execute(sql_query):
+            if sql_query.startswith('WITH') or 'FROM loans' in sql_query:
+                return {'success': False, 'error': 'relation "loans" does not exist'}
+            return _result(['total'], [1])
+        db_service.execute_trusted_query.side_effect = execute
+
+        rows = MetricsEngine(db_service, mode='fused').run(BUSINESS_METRIC_QUERIES)
+
+        self.assertIsNone(rows['loan_stats'])
+        self.assertEqual(rows['customer_stats'], {'total': 1})
+        self.assertEqual(db_service.execute_trusted_query.call_count, 1 + len(BUSINESS_METRIC_QUERIES))
+
+    def test_parallel_mode_runs_queries_concurrently(self):
+        """Test that parallel mode has every query in flight at once"""
+        # The executor is sized to SQL_POOL_MAX_SIZE (2 in tests)
+        queries = [MetricQuery(f'q{i}', f'SELECT {i} AS v{i}') for i in range(2)]
+        barrier = threading.Barrier(len(queries), timeout=5)
+        db_service = Mock()
+
+        def execute(sql_query):
+            barrier.wait()  # raises BrokenBarrierError if the queries ran one after another
+            return _result(['v'], [int(sql_query.split()[1])])
+        db_service.execute_trusted_query.side_effect = execute
+
+        rows = MetricsEngine(db_service, mode='parallel').run(queries)
+
+        self.assertEqual(rows, {'q0': {'v': 0}, 'q1': {'v': 1}})
+
+
+class TestTrustedQuery(TestCase):
+    @patch('apps.database.services.analyze_query')
+    @patch.object(DatabaseService, '_execute_with_timeout')
+    def test_trusted_query_skips_parsing_and_cost_guard(self, mock_execute, mock_analyze):
+        """Test that trusted SQL runs as written, without analysis or EXPLAIN"""
+        mock_execute.return_value = {'data': [[1]], 'columns': ['n'], 'row_count': 1}
+        db_service = DatabaseService()
+
+        result = db_service.execute_trusted_query("SELECT COUNT(*) AS n FROM customers")
+
+        self.assertTrue(result['success'])
+        self.assertEqual(result['data'], [[1]])
+        mock_analyze.assert_not_called()
+        self.assertEqual(mock_execute.call_args.args[0], "SELECT COUNT(*) AS n FROM customers")
+        self.assertFalse(mock_execute.call_args.kwargs['check_cost'])
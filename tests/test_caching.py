@@ -0,0 +1,156 @@
+import threading
+import time
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory
+from unittest.mock import patch, Mock
+from apps.database.views import database_stats
+from utils.caching import StaleWhileRevalidateCache
+
+
+class _InlineExecutor:
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+class TestStaleWhileRevalidateCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.swr = StaleWhileRevalidateCache('test', soft_ttl=60, hard_ttl=600, jitter=0.1, lock_ttl=2)
+
+    def test_miss_computes_and_hit_does_not(self):
+        """Test that a value is computed once and then served from the cache"""
+        compute = Mock(return_value={'n': 1})
+
+        self.assertEqual(self.swr.get('key', compute), {'n': 1})
+        self.assertEqual(self.swr.get('key', compute), {'n': 1})
+        compute.assert_called_once()
+
+    def test_soft_ttl_is_jittered(self):
+        """Test that entries go stale within the jitter band of the soft TTL"""
+        before = time.time()
+        self.swr.set('key', 1)
+
+        entry = cache.get('swr:test:key')
+        self.assertGreaterEqual(entry['fresh_until'], before + 54)
+        self.assertLessEqual(entry['fresh_until'], time.time() + 66)
+
+    @patch('utils.caching.connections')
+    @patch('utils.caching._get_executor', return_value=_InlineExecutor())
+    def test_stale_value_is_served_and_refreshed_in_background(self, mock_executor, mock_connections):
+        """Test that a stale read returns the old value and recomputes behind it"""
+        self.swr.set('key', 'old')
+        self.swr.mark_stale('key')
+
+        self.assertEqual(self.swr.get('key', lambda: 'new'), 'old')
+        self.assertEqual(self.swr.get('key', lambda: 'newer'), 'new')
+        self.assertIsNone(cache.get('swr:test:key:lock'))
+
+    @patch('utils.caching._get_executor')
+    def test_only_lock_holder_refreshes(self, mock_executor):
+        """Test that a stale read doesn't start a refresh while another holds the lock"""
+        self.swr.set('key', 'old')
+        self.swr.mark_stale('key')
+        cache.add('swr:test:key:lock', 'someone-else', 2)
+
+        self.assertEqual(self.swr.get('key', lambda: 'new'), 'old')
+        mock_executor.return_value.submit.assert_not_called()
+
+    @patch('utils.caching.connections')
+    @patch('utils.caching._get_executor', return_value=_InlineExecutor())
+    def test_failed_refresh_keeps_stale_value(self, mock_executor, mock_connections):
+        """Test that an error while revalidating leaves the old value in place"""
+        self.swr.set('key', 'old')
+        self.swr.mark_stale('key')
+
+        def fail():
+            raise RuntimeError('database unavailable')
+
+        self.assertEqual(self.swr.get('key', fail), 'old')
+        self.assertEqual(cache.get('swr:test:key')['value'], 'old')
+
+    def test_concurrent_cold_reads_compute_once(self):
+        """Test that requests arriving on an empty cache wait for one recompute"""
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.swr.get('key', compute))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ['value'] * 4)
+        self.assertEqual(len(calls), 1)
+
+    def test_compute_longer_than_lock_ttl_runs_once(self):
+        """Test that the lock outlives its TTL while computing, so waiters don't recompute"""
+        swr = StaleWhileRevalidateCache('test', soft_ttl=60, hard_ttl=600, lock_ttl=1)
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(2.5)
+            return 'value'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(swr.get('key', compute))) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ['value'] * 3)
+        self.assertEqual(len(calls), 1)
+        self.assertIsNone(cache.get('swr:test:key:lock'))
+
+    def test_waiters_give_up_on_a_hung_recompute(self):
+        """Test that a cold read stops waiting on a lock that is never released and computes itself"""
+        swr = StaleWhileRevalidateCache('test', soft_ttl=60, hard_ttl=600, lock_ttl=5, wait_timeout=0.3)
+        cache.add('swr:test:key:lock', 'hung', 5)
+
+        started = time.monotonic()
+        self.assertEqual(swr.get('key', lambda: 'value'), 'value')
+
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(cache.get('swr:test:key:lock'), 'hung')
+
+    def test_uncacheable_values_are_not_stored(self):
+        """Test that results the cacheable check rejects are recomputed next time"""
+        swr = StaleWhileRevalidateCache('test', soft_ttl=60, hard_ttl=600, cacheable=lambda value: value['success'])
+        compute = Mock(return_value={'success': False})
+
+        swr.get('key', compute)
+        swr.get('key', compute)
+
+        self.assertEqual(compute.call_count, 2)
+
+
+class TestDatabaseStatsCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+
+    @patch('apps.database.views.DatabaseService')
+    def test_stats_served_from_cache(self, mock_service_class):
+        """Test that repeated stats requests reuse one computation and ?exact=true refreshes it"""
+        mock_service = mock_service_class.return_value
+        mock_service.get_database_stats.return_value = {'success': True, 'total_rows': 10}
+
+        database_stats(self.factory.get('/api/database/stats/'))
+        response = database_stats(self.factory.get('/api/database/stats/'))
+
+        self.assertEqual(response.data['total_rows'], 10)
+        mock_service.get_database_stats.assert_called_once_with()
+
+        mock_service.get_database_stats.return_value = {'success': True, 'total_rows': 12}
+        database_stats(self.factory.get('/api/database/stats/', {'exact': 'true'}))
+        response = database_stats(self.factory.get('/api/database/stats/'))
+
+        self.assertEqual(response.data['total_rows'], 12)
+        mock_service.get_database_stats.assert_called_with(exact=True)
@@ -0,0 +1,205 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.test import TestCase
+from unittest.mock import patch, Mock
+from apps.analytics.services import AnalyticsService
+from apps.chat.views import _handle_database_query, _merge_insights
+from apps.chat.pipeline import RequestPipeline, DeadlineExceeded
+
+
+QUERY_RESULT = {
+    'success': True,
+    'data': [[1, 100.0], [2, 250.0]],
+    'columns': ['id', 'balance'],
+    'row_count': 2
+}
+
+ANALYSIS = {
+    'insights': [{'title': 'balance shows increasing trend over time'}],
+    'recommendations': ['Segment accounts by balance'],
+    'descriptive': {}
+}
+
+
+@patch('apps.chat.views.EmbeddingService')
+@patch('apps.chat.views.DatabaseService')
+@patch('apps.chat.views.LLMClient')
+class TestDatabaseQueryPipeline(TestCase):
+    def _configure(self, mock_llm, mock_db, mock_embedding):
+        mock_embedding.return_value.search_similar_schemas.return_value = []
+        mock_llm.return_value.generate_sql.return_value = "SELECT id, balance FROM accounts"
+        mock_llm.return_value.generate_response.return_value = "There are 2 accounts."
+        mock_db.return_value.execute_safe_query.return_value = QUERY_RESULT
+        mock_db.return_value.validate_query.return_value = []
+        return mock_llm.return_value
+
+    @patch('apps.chat.views._run_analytics')
+    def test_narrative_generated_once_and_merged(self, mock_analytics, mock_llm, mock_db, mock_embedding):
+        """Test that the LLM narrative is generated once and merged with insights"""
+        llm = self._configure(mock_llm, mock_db, mock_embedding)
+        mock_analytics.return_value = ANALYSIS
+
+        response, sql_query, result = _handle_database_query("Show account balances")
+
+        llm.generate_response.assert_called_once()
+        self.assertTrue(response.startswith("There are 2 accounts."))
+        self.assertIn('Key Insights', response)
+        self.assertEqual(result['analysis'], ANALYSIS)
+
+    @patch('apps.chat.views._run_analytics')
+    def test_analytics_runs_concurrently_with_narrative(self, mock_analytics, mock_llm, mock_db, mock_embedding):
+        """Test that analytics and the narrative call overlap"""
+        llm = self._configure(mock_llm, mock_db, mock_embedding)
+        analytics_started = threading.Event()
+
+        def analytics(*args, **kwargs):
+            analytics_started.set()
+            return ANALYSIS
+
+        def narrative(*args, **kwargs):
+            # Analytics must be able to start while the narrative is in flight
+            self.assertTrue(analytics_started.wait(timeout=5))
+            return "There are 2 accounts."
+
+        mock_analytics.side_effect = analytics
+        llm.generate_response.side_effect = narrative
+
+        response, _, result = _handle_database_query("Show account balances")
+
+        self.assertIn('analysis', result)
+
+    @patch('apps.chat.views._run_analytics')
+    def test_analytics_failure_keeps_single_narrative(self, mock_analytics, mock_llm, mock_db, mock_embedding):
+        """Test the fallback path does not call the LLM a second time"""
+        llm = self._configure(mock_llm, mock_db, mock_embedding)
+        mock_analytics.return_value = None
+
+        response, _, result = _handle_database_query("Show account balances")
+
+        llm.generate_response.assert_called_once()
+        self.assertEqual(response, "There are 2 accounts.")
+        self.assertNotIn('analysis', result)
+
+
+    @patch('apps.chat.views._run_analytics')
+    def test_short_budget_skips_optional_stages(self, mock_analytics, mock_llm, mock_db, mock_embedding):
+        """Test that analytics is skipped and the narrative templated when time is short"""
+        llm = self._configure(mock_llm, mock_db, mock_embedding)
+        pipeline = RequestPipeline(deadline=1.0)
+
+        response, _, result = _handle_database_query("Show account balances", pipeline=pipeline)
+
+        mock_analytics.assert_not_called()
+        llm.generate_response.assert_not_called()
+        self.assertIn('2 row(s)', response)
+        self.assertEqual(set(pipeline.report()['degraded']), {'analytics', 'insights', 'narrative'})
+
+    @patch('apps.chat.views._run_analytics')
+    def test_slow_analytics_is_dropped(self, mock_analytics, mock_llm, mock_db, mock_embedding):
+        """Test that analytics exceeding its budget is reported as timed out"""
+        self._configure(mock_llm, mock_db, mock_embedding)
+        release = threading.Event()
+        mock_analytics.side_effect = lambda *args: release.wait(5) and ANALYSIS
+        pipeline = RequestPipeline(deadline=5.0)
+
+        try:
+            response, _, result = _handle_database_query("Show account balances", pipeline=pipeline)
+        finally:
+            release.set()
+
+        self.assertNotIn('analysis', result)
+        self.assertEqual(pipeline.stages['analytics']['status'], 'timeout')
+        self.assertIn('analytics', pipeline.degraded)
+
+    def test_timed_out_analytics_frees_its_worker(self, mock_llm, mock_db, mock_embedding):
+        """Test that analytics abandoned at its budget stops and gives its executor slot back"""
+        self._configure(mock_llm, mock_db, mock_embedding)
+        executor = ThreadPoolExecutor(max_workers=1)
+        slow_section = lambda *args: time.sleep(0.6) or {}
+        pipeline = RequestPipeline(deadline=5.0)
+
+        with patch('apps.chat.views._get_pipeline_executor', return_value=executor), \
+                patch.object(AnalyticsService, '_descriptive_analysis', side_effect=slow_section), \
+                patch.object(AnalyticsService, '_generate_insights', side_effect=slow_section), \
+                patch.object(AnalyticsService, '_generate_visualization_config', side_effect=slow_section) as mock_visualizations, \
+                patch.object(AnalyticsService, '_generate_recommendations', side_effect=slow_section):
+            _, _, result = _handle_database_query("Show account balances", pipeline=pipeline)
+
+            self.assertEqual(pipeline.stages['analytics']['status'], 'timeout')
+            # The whole analysis would hold the only worker for another 1.4s
+            self.assertIsNone(executor.submit(lambda: None).result(timeout=0.8))
+            mock_visualizations.assert_not_called()
+        executor.shutdown()
+
+    def test_passes_stage_budgets_as_timeouts(self, mock_llm, mock_db, mock_embedding):
+        """Test that SQL generation and execution receive their stage budgets"""
+        self._configure(mock_llm, mock_db, mock_embedding)
+        mock_db.return_value.execute_safe_query.return_value = {'success': True, 'data': [], 'row_count': 0}
+
+        _handle_database_query("Show account balances", pipeline=RequestPipeline(deadline=10.0))
+
+        sql_timeout = mock_llm.return_value.generate_sql.call_args.kwargs['timeout']
+        execution_timeout = mock_db.return_value.execute_safe_query.call_args.kwargs['timeout']
+        self.assertAlmostEqual(sql_timeout, 4.0, places=1)
+        self.assertAlmostEqual(execution_timeout, 3.0, places=1)
+
+    def test_invalid_sql_is_repaired_before_execution(self, mock_llm, mock_db, mock_embedding):
+        """Test that schema validation errors are fed back to the LLM and only the repaired SQL runs"""
+        llm = self._configure(mock_llm, mock_db, mock_embedding)
+        llm.generate_sql.side_effect = ["SELECT id, balanc FROM accounts", "SELECT id, balance FROM accounts"]
+        errors = ["Column 'balanc' does not exist in accounts; did you mean 'balance'?"]
+        mock_db.return_value.validate_query.side_effect = [errors, []]
+
+        _, sql_query, _ = _handle_database_query("Show account balances")
+
+        self.assertEqual(sql_query, "SELECT id, balance FROM accounts")
+        repair_call = llm.generate_sql.call_args_list[1]
+        self.assertEqual(repair_call.kwargs['previous_sql'], "SELECT id, balanc FROM accounts")
+        self.assertEqual(repair_call.kwargs['errors'], errors)
+        mock_db.return_value.execute_safe_query.assert_called_once()
+        self.assertEqual(mock_db.return_value.execute_safe_query.call_args.args[0], "SELECT id, balance FROM accounts")
+
+
+class TestRequestPipeline(TestCase):
+    def test_required_stage_raises_after_deadline(self):
+        """Test that required stages refuse to start once the deadline has passed"""
+        pipeline = RequestPipeline(deadline=0.0)
+
+        with self.assertRaises(DeadlineExceeded):
+            with pipeline.stage('execution'):
+                pass
+
+        self.assertEqual(pipeline.stages['execution']['status'], 'deadline_exceeded')
+
+    def test_budget_is_capped_by_remaining_time(self):
+        """Test that a stage budget never exceeds the time left"""
+        pipeline = RequestPipeline(deadline=10.0)
+        self.assertAlmostEqual(pipeline.budget_for('narrative'), 4.0, places=3)
+
+        pipeline.started_at -= 9.0
+        self.assertLess(pipeline.budget_for('narrative'), 1.01)
+        self.assertFalse(pipeline.can_run('narrative'))
+
+    def test_report_lists_stages(self):
+        """Test that completed stages appear in the report"""
+        pipeline = RequestPipeline(deadline=10.0)
+        with pipeline.stage('intent'):
+            pass
+
+        report = pipeline.report()
+        self.assertEqual(report['stages']['intent']['status'], 'ok')
+        self.assertEqual(report['degraded'], [])
+
+
+class TestMergeInsights(TestCase):
+    def test_merge_appends_sections(self):
+        """Test that insights and recommendations are appended to the narrative"""
+        merged = _merge_insights("Base answer.", ANALYSIS)
+
+        self.assertTrue(merged.startswith("Base answer."))
+        self.assertIn('Recommendations', merged)
+
+    def test_merge_without_insights_returns_base(self):
+        """Test that an empty analysis leaves the narrative untouched"""
+        self.assertEqual(_merge_insights("Base answer.", {}), "Base answer.")
@@ -1,7 +1,18 @@
 import pytest
 from django.test import TestCase
-from unittest.mock import patch, Mock
-from apps.database.services import DatabaseService, QueryTimeoutException
+import threading
+import time
+from unittest import skipUnless
+import psycopg2
+from psycopg2.extensions import QueryCanceledError
+from unittest.mock import patch, Mock, MagicMock
+from apps.database.services import DatabaseService, QueryTimeoutException, QueryCancelWatchdog
+from apps.database.pool import ConnectionPool, PoolTimeout, ReplicaRouter
+from apps.database.cost_guard import CostGuard, limit_query
+from apps.database.paging import keyset_query, decode_token
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from apps.database.arrow import ARROW_AVAILABLE, compile_batch_builder, ipc_stream
+from apps.database.serialization import compile_row_serializer, compile_column_serializer, PG_INT4, PG_TEXT, PG_NUMERIC, PG_DATE, PG_TIMESTAMP
 
 
 class TestDatabaseService(TestCase):
@@ -97,18 +108,19 @@ class TestDatabaseService(TestCase):
         self.assertTrue(result['success'])
         self.assertEqual(result['result'], 1)
 
-    @patch('apps.database.services.connections')
-    def test_get_table_info_success(self, mock_connections):
-        """Test retrieving table information"""
-        mock_cursor = Mock()
-        mock_cursor.fetchall.return_value = [
-            ('id', 'integer', 'NO', None),
-            ('name', 'character varying', 'YES', 'Anonymous')
-        ]
-
-        mock_connection = Mock()
-        mock_connection.cursor.return_value.__enter__.return_value = mock_cursor
-        mock_connections.__getitem__.return_value = mock_connection
+    @patch('apps.database.services.get_schema_catalog')
+    def test_get_table_info_success(self, mock_get_catalog):
+        """Test retrieving table information from the schema catalog"""
+        mock_get_catalog.return_value.table.return_value = {
+            'name': 'customers',
+            'columns': [
+                {'name': 'id', 'type': 'integer', 'nullable': False, 'default': None},
+                {'name': 'name', 'type': 'character varying', 'nullable': True, 'default': 'Anonymous'},
+            ],
+            'primary_key': ['id'],
+            'foreign_keys': [],
+            'enums': {},
+        }
 
         result = self.db_service.get_table_info('customers')
 
@@ -117,20 +129,22 @@ class TestDatabaseService(TestCase):
         self.assertEqual(len(result['columns']), 2)
         self.assertEqual(result['columns'][0]['name'], 'id')
         self.assertFalse(result['columns'][0]['nullable'])
+        self.assertEqual(result['primary_key'], ['id'])
 
-    @patch('apps.database.services.connections')
-    def test_get_available_tables_success(self, mock_connections):
-        """Test retrieving list of available tables"""
-        mock_cursor = Mock()
-        mock_cursor.fetchall.return_value = [
-            ('customers',),
-            ('accounts',),
-            ('transactions',)
-        ]
+    @patch('apps.database.services.get_schema_catalog')
+    def test_get_table_info_unknown_table(self, mock_get_catalog):
+        """Test that an unknown table is reported instead of returning no columns"""
+        mock_get_catalog.return_value.table.return_value = None
 
-        mock_connection = Mock()
-        mock_connection.cursor.return_value.__enter__.return_value = mock_cursor
-        mock_connections.__getitem__.return_value = mock_connection
+        result = self.db_service.get_table_info('missing')
+
+        self.assertFalse(result['success'])
+        self.assertIn('does not exist', result['error'])
+
+    @patch('apps.database.services.get_schema_catalog')
+    def test_get_available_tables_success(self, mock_get_catalog):
+        """Test retrieving list of available tables"""
+        mock_get_catalog.return_value.tables.return_value = ['accounts', 'customers', 'transactions']
 
         tables = self.db_service.get_available_tables()
 
@@ -149,4 +163,805 @@ class TestDatabaseService(TestCase):
     def test_row_limit_configuration(self):
         """Test that row limit is properly configured"""
         self.assertIsInstance(self.db_service.max_rows, int)
-        self.assertGreater(self.db_service.max_rows, 0)
\ No newline at end of file
+        self.assertGreater(self.db_service.max_rows, 0)
+
+
+def _cursor_context(cursor):
+    context = MagicMock()
+    context.__enter__.return_value = cursor
+    return context
+
+
+def _mock_pool(mock_get_router, cursor, named_cursor=None, replica=False):
+    """Routed pool whose connection hands out ``cursor``, or ``named_cursor`` for named cursors"""
+    connection = MagicMock()
+    connection.cursor.side_effect = lambda name=None: _cursor_context(named_cursor if name else cursor)
+    router = mock_get_router.return_value
+    router.replicas = []
+    router.is_replica.return_value = replica
+    router.choose.return_value.connection.return_value.__enter__.return_value = connection
+    return connection
+
+
+class TestStatementTimeout(TestCase):
+    def setUp(self):
+        self.db_service = DatabaseService()
+
+    @patch('apps.database.services.get_router')
+    def test_statement_timeout_is_set_per_query(self, mock_get_router):
+        """Test that the timeout is applied server-side inside the checkout's transaction"""
+        cursor = MagicMock()
+        cursor.description = [('id',)]
+        cursor.fetchmany.return_value = [(1,)]
+        cursor.fetchone.return_value = None
+        _mock_pool(mock_get_router, cursor)
+
+        result = self.db_service._execute_with_timeout("SELECT id FROM customers LIMIT 1;", timeout=2.5)
+
+        self.assertEqual(result['data'], [[1]])
+        self.assertEqual(cursor.execute.call_args_list[0].args[0], "SET LOCAL statement_timeout = 2500")
+        mock_get_router.return_value.choose.return_value.connection.assert_called_once()
+
+    @patch('apps.database.services.get_router')
+    def test_timeout_is_capped_by_setting(self, mock_get_router):
+        """Test that a caller cannot raise the timeout above SQL_QUERY_TIMEOUT"""
+        cursor = MagicMock()
+        cursor.description = None
+        _mock_pool(mock_get_router, cursor)
+
+        self.db_service._execute_with_timeout("SELECT 1;", timeout=600)
+
+        self.assertEqual(cursor.execute.call_args_list[0].args[0],
+                         f"SET LOCAL statement_timeout = {self.db_service.timeout * 1000}")
+
+    @patch('apps.database.services.get_router')
+    def test_cancelled_statement_raises_timeout(self, mock_get_router):
+        """Test that a query cancelled by Postgres surfaces as a timeout"""
+        cursor = MagicMock()
+        cursor.execute.side_effect = [None, QueryCanceledError("canceling statement due to statement timeout")]
+        _mock_pool(mock_get_router, cursor)
+
+        with self.assertRaises(QueryTimeoutException):
+            self.db_service._execute_with_timeout("SELECT pg_sleep(10);", timeout=1)
+
+    @patch('apps.database.services.get_router')
+    def test_other_database_errors_propagate(self, mock_get_router):
+        """Test that non-timeout errors are not reported as timeouts"""
+        cursor = MagicMock()
+        cursor.execute.side_effect = [None, psycopg2.ProgrammingError("relation does not exist")]
+        _mock_pool(mock_get_router, cursor)
+
+        with self.assertRaises(psycopg2.ProgrammingError):
+            self.db_service._execute_with_timeout("SELECT * FROM missing;", timeout=1)
+
+
+
+def _plan(total_cost, rows):
+    return ([{'Plan': {'Node Type': 'Nested Loop', 'Startup Cost': 0.0, 'Total Cost': total_cost, 'Plan Rows': rows}}],)
+
+
+class TestCostGuard(TestCase):
+    def setUp(self):
+        self.db_service = DatabaseService()
+        self.cursor = MagicMock()
+        self.cursor.description = [('id', PG_INT4)]
+        self.cursor.fetchmany.return_value = [(1,)]
+
+    def _executed(self):
+        return [call.args[0] for call in self.cursor.execute.call_args_list]
+
+    @patch('apps.database.services.get_router')
+    def test_expensive_plan_is_rejected_before_running(self, mock_get_router):
+        """Test that a plan over the cost limit never executes"""
+        self.cursor.fetchone.side_effect = [_plan(5e9, 10 ** 10)]
+        _mock_pool(mock_get_router, self.cursor)
+        self.db_service.cost_guard = CostGuard(mode='reject', max_cost=1e6, max_rows=1e6, rewrite_limit=0)
+
+        result = self.db_service.execute_safe_query("SELECT * FROM customers, accounts", use_cache=False)
+
+        self.assertFalse(result['success'])
+        self.assertEqual(result['estimate']['total_cost'], 5e9)
+        self.assertEqual(len(result['estimate']['exceeds']), 2)
+        self.assertEqual(len(self._executed()), 2)
+        self.assertTrue(self._executed()[1].startswith("EXPLAIN (FORMAT JSON) SELECT"))
+
+    @patch('apps.database.services.get_router')
+    def test_warn_mode_runs_and_reports_estimate(self, mock_get_router):
+        """Test that warn mode runs the query with the reasons attached"""
+        self.cursor.fetchone.side_effect = [_plan(5e9, 10), None]
+        _mock_pool(mock_get_router, self.cursor)
+        self.db_service.cost_guard = CostGuard(mode='warn', max_cost=1e6, max_rows=1e6, rewrite_limit=0)
+
+        result = self.db_service.execute_safe_query("SELECT id FROM customers", use_cache=False)
+
+        self.assertTrue(result['success'])
+        self.assertEqual(result['estimate']['exceeds'], ["estimated cost 5000000000 exceeds 1000000"])
+        self.assertEqual(result['data'], [[1]])
+
+    @patch('apps.database.services.get_router')
+    def test_over_budget_query_is_rewritten_with_limit(self, mock_get_router):
+        """Test that a query fitting the limits under a tighter LIMIT runs in that form"""
+        self.cursor.fetchone.side_effect = [_plan(5e9, 10 ** 8), _plan(120.0, 100), None]
+        _mock_pool(mock_get_router, self.cursor)
+        self.db_service.cost_guard = CostGuard(mode='reject', max_cost=1e6, max_rows=1e6, rewrite_limit=100)
+
+        result = self.db_service.execute_safe_query("SELECT id FROM customers, accounts", use_cache=False)
+
+        self.assertTrue(result['success'])
+        self.assertTrue(result['query'].endswith(") AS cost_limited LIMIT 100;"))
+        self.assertEqual(self._executed()[-1], result['query'])
+        self.assertEqual(result['estimate']['total_cost'], 120.0)
+        self.assertEqual(result['estimate']['rewritten_from']['rows'], 10 ** 8)
+
+    @patch('apps.database.services.get_router')
+    def test_cheap_plan_returns_estimate(self, mock_get_router):
+        """Test that queries within budget run unchanged with their estimate"""
+        self.cursor.fetchone.side_effect = [_plan(35.5, 1), None]
+        _mock_pool(mock_get_router, self.cursor)
+        self.db_service.cost_guard = CostGuard(mode='reject', max_cost=1e6, max_rows=1e6, rewrite_limit=0)
+
+        result = self.db_service.execute_safe_query("SELECT id FROM customers WHERE id = 1", use_cache=False)
+
+        self.assertTrue(result['success'])
+        self.assertNotIn('exceeds', result['estimate'])
+        self.assertEqual(result['query'], self._executed()[-1])
+
+    def test_limit_rewrite_survives_trailing_comment(self):
+        """Test that the wrapping LIMIT isn't commented out"""
+        wrapped = limit_query("SELECT * FROM orders -- every order\n;", 50)
+
+        self.assertEqual(wrapped.splitlines()[-1], ") AS cost_limited LIMIT 50;")
+
+
+class TestQueryCancelWatchdog(TestCase):
+    def test_cancels_connection_past_deadline(self):
+        """Test that a query still running past its deadline is cancelled"""
+        watchdog = QueryCancelWatchdog()
+        cancelled = threading.Event()
+        raw_connection = Mock()
+        raw_connection.cancel.side_effect = cancelled.set
+
+        with watchdog.guard(raw_connection, 0.01):
+            self.assertTrue(cancelled.wait(2))
+
+    def test_finished_query_is_not_cancelled(self):
+        """Test that leaving the guard disarms the cancel"""
+        watchdog = QueryCancelWatchdog()
+        raw_connection = Mock()
+
+        with watchdog.guard(raw_connection, 0.05):
+            pass
+
+        cancelled = threading.Event()
+        with watchdog.guard(Mock(cancel=Mock(side_effect=cancelled.set)), 0.1):
+            self.assertTrue(cancelled.wait(2))
+        raw_connection.cancel.assert_not_called()
+
+
+class TestStreamQuery(TestCase):
+    def setUp(self):
+        self.db_service = DatabaseService()
+        self.db_service.stream_chunk_size = 2
+
+    def _stream(self, mock_get_router, rows):
+        named_cursor = MagicMock()
+        named_cursor.description = [('id',), ('name',)]
+        chunks = [rows[i:i + 2] for i in range(0, len(rows), 2)]
+        named_cursor.fetchmany.side_effect = chunks + [[]]
+        named_cursor.fetchone.return_value = None
+
+        _mock_pool(mock_get_router, MagicMock(), named_cursor)
+        return named_cursor
+
+    @patch('apps.database.services.get_router')
+    def test_streams_rows_in_chunks(self, mock_get_router):
+        """Test that rows are read from a named cursor chunk by chunk"""
+        named_cursor = self._stream(mock_get_router, [(1, 'a'), (2, 'b'), (3, 'c')])
+
+        events = list(self.db_service.stream_query("SELECT id, name FROM customers"))
+
+        self.assertEqual(events[0]['columns'], ['id', 'name'])
+        self.assertEqual(events[1], {'rows': [[1, 'a'], [2, 'b']]})
+        self.assertEqual(events[2], {'rows': [[3, 'c']]})
+        self.assertEqual(events[-1], {'row_count': 3, 'truncated': False})
+        # No LIMIT is appended to streamed queries
+        self.assertNotIn('LIMIT', named_cursor.execute.call_args.args[0])
+
+    @patch('apps.database.services.get_router')
+    def test_stream_stops_at_max_rows(self, mock_get_router):
+        """Test that the stream is capped and reports truncation"""
+        named_cursor = self._stream(mock_get_router, [(1, 'a'), (2, 'b')])
+        named_cursor.fetchone.return_value = (3, 'c')
+        self.db_service.stream_max_rows = 2
+
+        events = list(self.db_service.stream_query("SELECT id, name FROM customers"))
+
+        self.assertEqual(events[-1], {'row_count': 2, 'truncated': True})
+
+    def test_stream_rejects_unsafe_query_before_streaming(self):
+        """Test that validation errors are raised eagerly"""
+        with self.assertRaises(ValueError):
+            self.db_service.stream_query("DELETE FROM customers")
+
+
+class TestExecuteQueryStreaming(TestCase):
+    @patch('apps.database.views.DatabaseService')
+    def test_stream_returns_ndjson(self, mock_service_class):
+        """Test that stream=true answers with NDJSON lines"""
+        from rest_framework.test import APIRequestFactory
+        from apps.database.views import execute_query
+
+        mock_service_class.return_value.stream_query.return_value = iter([
+            {'columns': ['id']},
+            {'rows': [[1], [2]]},
+            {'row_count': 2, 'truncated': False},
+        ])
+
+        request = APIRequestFactory().post('/api/database/execute/', {'query': 'SELECT id FROM customers', 'stream': True}, format='json')
+        response = execute_query(request)
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines, ['{"columns": ["id"]}', '[1]', '[2]', '{"row_count": 2, "truncated": false}'])
+
+
+class TestRowSerializer(TestCase):
+    def test_converts_by_column_type(self):
+        """Test that converters are picked from the type OIDs"""
+        from datetime import date, datetime
+        from decimal import Decimal
+
+        serialize_rows = compile_row_serializer([
+            ('id', PG_INT4), ('name', PG_TEXT), ('balance', PG_NUMERIC),
+            ('opened', PG_DATE), ('updated', PG_TIMESTAMP),
+        ])
+        rows = serialize_rows([
+            (1, 'John', Decimal('10.50'), date(2024, 1, 2), datetime(2024, 1, 2, 3, 4, 5)),
+            (2, None, None, None, None),
+        ])
+
+        self.assertEqual(rows[0], [1, 'John', 10.5, '2024-01-02', '2024-01-02T03:04:05'])
+        self.assertEqual(rows[1], [2, None, None, None, None])
+
+    def test_unknown_types_fall_back_to_value_checks(self):
+        """Test that columns without a known OID are still serialized"""
+        from decimal import Decimal
+
+        serialize_rows = compile_row_serializer([('amount',), ('label', None)])
+
+        self.assertEqual(serialize_rows([(Decimal('1.5'), 'x')]), [[1.5, 'x']])
+
+
+class TestColumnarResults(TestCase):
+    def test_column_serializer_transposes_and_converts(self):
+        """Test that columnar output has one converted list per column"""
+        from decimal import Decimal
+
+        serialize_columns = compile_column_serializer([('id', PG_INT4), ('balance', PG_NUMERIC)])
+
+        self.assertEqual(serialize_columns([(1, Decimal('2.5')), (2, None)]), [[1, 2], [2.5, None]])
+        self.assertEqual(serialize_columns([]), [[], []])
+
+    @patch('apps.database.services.get_router')
+    def test_execute_safe_query_columnar(self, mock_get_router):
+        """Test that execute_safe_query can return column arrays with types"""
+        cursor = MagicMock()
+        cursor.description = [('id', PG_INT4), ('name', PG_TEXT)]
+        cursor.fetchmany.return_value = [(1, 'John'), (2, 'Jane')]
+        cursor.fetchone.return_value = None
+        _mock_pool(mock_get_router, cursor)
+
+        result = DatabaseService().execute_safe_query("SELECT id, name FROM customers LIMIT 2",
+                                                      result_format='columnar', use_cache=False)
+
+        self.assertTrue(result['success'])
+        self.assertEqual(result['format'], 'columnar')
+        self.assertEqual(result['data'], [[1, 2], ['John', 'Jane']])
+        self.assertEqual(result['column_types'], ['int4', 'text'])
+
+    @patch('apps.database.services.get_router')
+    def test_row_results_carry_column_types(self, mock_get_router):
+        """Test that row-format results also report the column types"""
+        cursor = MagicMock()
+        cursor.description = [('id', PG_INT4), ('name', PG_TEXT)]
+        cursor.fetchmany.return_value = [(1, 'John')]
+        cursor.fetchone.return_value = None
+        _mock_pool(mock_get_router, cursor)
+
+        result = DatabaseService().execute_safe_query("SELECT id, name FROM customers LIMIT 1", use_cache=False)
+
+        self.assertEqual(result['data'], [[1, 'John']])
+        self.assertEqual(result['column_types'], ['int4', 'text'])
+
+    def test_analytics_loads_columnar_result(self):
+        """Test that the analytics DataFrame path accepts columnar results"""
+        from apps.analytics.services import AnalyticsService
+
+        df = AnalyticsService()._result_to_dataframe({
+            'format': 'columnar',
+            'columns': ['id', 'balance'],
+            'data': [[1, 2], [10.5, 20.0]],
+        })
+
+        self.assertEqual(list(df.columns), ['id', 'balance'])
+        self.assertEqual(df['balance'].tolist(), [10.5, 20.0])
+
+
+@skipUnless(ARROW_AVAILABLE, "pyarrow is not installed")
+class TestArrowResults(TestCase):
+    def test_batches_use_typed_schema(self):
+        """Test that Arrow types come from the Postgres type OIDs"""
+        import pyarrow as pa
+        from datetime import date
+        from decimal import Decimal
+
+        schema, build_batch = compile_batch_builder([
+            ('id', PG_INT4), ('balance', PG_NUMERIC), ('opened', PG_DATE), ('meta', 3802), ('other', None),
+        ])
+        batch = build_batch([(1, Decimal('1.25'), date(2024, 1, 2), {'a': 1}, 7)])
+
+        self.assertEqual(schema.field('id').type, pa.int32())
+        self.assertEqual(schema.field('balance').type, pa.float64())
+        self.assertEqual(schema.field('opened').type, pa.date32())
+        self.assertEqual(schema.field('other').type, pa.string())
+        self.assertEqual(batch.to_pylist(), [
+            {'id': 1, 'balance': 1.25, 'opened': date(2024, 1, 2), 'meta': '{"a": 1}', 'other': '7'}
+        ])
+
+    def test_ipc_stream_round_trip(self):
+        """Test that the streamed bytes read back as one table"""
+        import pyarrow as pa
+
+        schema, build_batch = compile_batch_builder([('id', PG_INT4), ('name', PG_TEXT)])
+        stream = b''.join(ipc_stream(schema, [build_batch([(1, 'a')]), build_batch([(2, 'b')])]))
+
+        table = pa.ipc.open_stream(stream).read_all()
+
+        self.assertEqual(table.to_pydict(), {'id': [1, 2], 'name': ['a', 'b']})
+
+    @patch('apps.database.views.DatabaseService')
+    def test_execute_query_negotiates_arrow(self, mock_service_class):
+        """Test that ?format=arrow answers with an Arrow IPC stream"""
+        import pyarrow as pa
+        from rest_framework.test import APIRequestFactory
+        from apps.database.views import execute_query
+
+        schema, build_batch = compile_batch_builder([('id', PG_INT4)])
+        mock_service_class.return_value.stream_query.return_value = iter([
+            {'columns': ['id'], 'column_types': ['int4'], 'schema': schema},
+            {'batch': build_batch([(1,), (2,)])},
+            {'row_count': 2, 'truncated': False},
+        ])
+
+        request = APIRequestFactory().post('/api/database/execute/?format=arrow', {'query': 'SELECT id FROM customers'}, format='json')
+        response = execute_query(request)
+
+        self.assertEqual(response['Content-Type'], 'application/vnd.apache.arrow.stream')
+        table = pa.ipc.open_stream(b''.join(response.streaming_content)).read_all()
+        self.assertEqual(table.column('id').to_pylist(), [1, 2])
+
+    @patch('apps.database.views.DatabaseService')
+    def test_arrow_errors_are_json(self, mock_service_class):
+        """Test that errors before streaming starts are still JSON"""
+        from rest_framework.test import APIRequestFactory
+        from apps.database.views import execute_query
+
+        mock_service_class.return_value.stream_query.side_effect = ValueError("Query contains potentially unsafe operations")
+
+        request = APIRequestFactory().post('/api/database/execute/?format=arrow', {'query': 'DROP TABLE customers'}, format='json')
+        response = execute_query(request)
+        response.render()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+
+class TestConnectionPool(TestCase):
+    def _pool(self, **kwargs):
+        options = {'min_size': 1, 'max_size': 2, 'timeout': 0.05, 'health_check_interval': 30.0}
+        options.update(kwargs)
+        return ConnectionPool('test', {'dbname': 'test'}, **options)
+
+    def _connection(self):
+        connection = MagicMock()
+        connection.closed = 0
+        connection.info.transaction_status = TRANSACTION_STATUS_IDLE
+        return connection
+
+    @patch('apps.database.pool.psycopg2.connect')
+    def test_connections_are_reused_read_only(self, mock_connect):
+        """Test that a released connection is handed out again"""
+        mock_connect.side_effect = lambda **kwargs: self._connection()
+        pool = self._pool()
+
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            pass
+
+        self.assertIs(first, second)
+        self.assertEqual(mock_connect.call_count, 1)
+        self.assertIn('default_transaction_read_only=on', mock_connect.call_args.kwargs['options'])
+        first.rollback.assert_called()
+
+    @patch('apps.database.pool.psycopg2.connect')
+    def test_exhausted_pool_times_out(self, mock_connect):
+        """Test that checkouts past max_size wait and then fail"""
+        mock_connect.side_effect = lambda **kwargs: self._connection()
+        pool = self._pool()
+
+        with pool.connection(), pool.connection():
+            self.assertEqual(pool.stats()['saturation'], 1.0)
+            with self.assertRaises(PoolTimeout):
+                with pool.connection():
+                    pass
+
+        stats = pool.stats()
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertEqual(stats['in_use'], 0)
+        self.assertEqual(stats['size'], 2)
+
+    @patch('apps.database.pool.psycopg2.connect')
+    def test_unhealthy_idle_connection_is_replaced(self, mock_connect):
+        """Test that an idle connection failing its ping is dropped"""
+        mock_connect.side_effect = lambda **kwargs: self._connection()
+        pool = self._pool(health_check_interval=0.0)
+
+        with pool.connection() as first:
+            pass
+        first.cursor.return_value.__enter__.return_value.execute.side_effect = psycopg2.OperationalError("server closed the connection")
+
+        with pool.connection() as second:
+            pass
+
+        self.assertIsNot(first, second)
+        first.close.assert_called_once()
+        self.assertEqual(pool.stats()['health_check_failures'], 1)
+
+    @patch('apps.database.pool.psycopg2.connect')
+    def test_fill_connects_outside_the_lock(self, mock_connect):
+        """Test that the pool stays usable by other threads while the fill connects"""
+        pool = self._pool()
+        blocked = []
+
+        def connect(**kwargs):
+            thread = threading.Thread(target=pool.stats)
+            thread.start()
+            thread.join(1.0)
+            blocked.append(thread.is_alive())
+            return self._connection()
+
+        mock_connect.side_effect = connect
+
+        with pool.connection():
+            pass
+
+        self.assertEqual(blocked, [False])
+
+    @patch('apps.database.pool.psycopg2.connect')
+    def test_failed_fill_is_retried(self, mock_connect):
+        """Test that a fill that couldn't connect runs again on the next checkout"""
+        mock_connect.side_effect = [psycopg2.OperationalError("starting up"), self._connection(), self._connection()]
+        pool = self._pool(min_size=2, max_size=3)
+
+        with pool.connection():
+            self.assertEqual(pool.stats()['size'], 1)
+        with pool.connection():
+            pass
+
+        self.assertEqual(mock_connect.call_count, 3)
+        self.assertEqual(pool.stats()['size'], 2)
+        self.assertEqual(pool.stats()['idle'], 2)
+
+
+class _InlineExecutor:
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+class TestReplicaRouter(TestCase):
+    def _replica(self, name, lag=None, in_use=0, error=None):
+        pool = MagicMock()
+        pool.name = name
+        pool.stats.return_value = {'saturation': in_use / 10}
+        cursor = pool.connection.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value
+        if error:
+            cursor.execute.side_effect = error
+        else:
+            cursor.fetchone.return_value = (True, lag == 0, lag)
+        return pool
+
+    def test_round_robin_over_caught_up_replicas(self):
+        """Test that reads rotate across replicas within the lag limit"""
+        primary = MagicMock()
+        replicas = [self._replica('a', lag=0), self._replica('b', lag=1.5), self._replica('c', lag=60)]
+        router = ReplicaRouter(primary, replicas, max_lag=5, executor=_InlineExecutor())
+
+        chosen = [router.choose().name for _ in range(4)]
+
+        self.assertEqual(chosen, ['a', 'b', 'a', 'b'])
+
+    def test_falls_back_to_primary_when_all_lag(self):
+        """Test that the primary serves reads when every replica is behind"""
+        primary = MagicMock()
+        router = ReplicaRouter(primary, [self._replica('a', lag=30), self._replica('b', error=psycopg2.OperationalError("down"))],
+                                max_lag=5, executor=_InlineExecutor())
+
+        self.assertIs(router.choose(), primary)
+        self.assertFalse(any(replica['eligible'] for replica in router.stats()))
+
+    def test_least_loaded_picks_emptiest_pool(self):
+        """Test least-loaded routing by pool saturation"""
+        replicas = [self._replica('a', lag=0, in_use=5), self._replica('b', lag=0, in_use=1)]
+        router = ReplicaRouter(MagicMock(), replicas, strategy='least_loaded', executor=_InlineExecutor())
+
+        self.assertEqual(router.choose().name, 'b')
+
+    def test_lag_is_rechecked_only_after_interval(self):
+        """Test that lag checks are rate limited"""
+        replica = self._replica('a', lag=0)
+        router = ReplicaRouter(MagicMock(), [replica], check_interval=60, executor=_InlineExecutor())
+
+        router.choose()
+        router.choose()
+
+        self.assertEqual(replica.connection.call_count, 1)
+
+    def test_slow_lag_check_does_not_block_routing(self):
+        """Test that reads go to the primary while a hung replica's lag check runs in the background"""
+        primary = MagicMock()
+        replica = self._replica('a', lag=0)
+        release = threading.Event()
+        checked = threading.Event()
+
+        def hang(*args):
+            release.wait(5)
+            checked.set()
+
+        replica.connection.return_value.__enter__.side_effect = hang
+        router = ReplicaRouter(primary, [replica], check_interval=0)
+
+        started = time.monotonic()
+        chosen = [router.choose() for _ in range(3)]
+
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(chosen, [primary] * 3)
+        self.assertEqual(replica.connection.call_count, 1)
+        release.set()
+        self.assertTrue(checked.wait(5))
+
+    @patch('apps.database.services.get_router')
+    def test_replica_behind_cache_version_reports_stale(self, mock_get_router):
+        """Test that a replica behind the primary's WAL position isn't cached"""
+        cursor = MagicMock()
+        cursor.description = [('id', PG_INT4)]
+        cursor.fetchmany.return_value = [(1,)]
+        cursor.fetchone.side_effect = [(False,), None]
+        _mock_pool(mock_get_router, cursor, replica=True)
+
+        result = DatabaseService()._execute_with_timeout("SELECT id FROM customers", min_lsn='0/16B3748')
+
+        self.assertFalse(result['fresh'])
+        self.assertEqual(cursor.execute.call_args_list[0].args[1], ['0/16B3748'])
+
+
+def _named_cursor(description, rows):
+    """Named cursor mock serving rows in order through fetchmany/fetchone"""
+    named_cursor = MagicMock()
+    named_cursor.description = description
+    pending = list(rows)
+
+    def fetchmany(size):
+        chunk = pending[:size]
+        del pending[:size]
+        return chunk
+
+    named_cursor.fetchmany.side_effect = fetchmany
+    named_cursor.fetchone.side_effect = lambda: pending.pop(0) if pending else None
+    return named_cursor
+
+
+class TestPagination(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.db_service = DatabaseService()
+
+    @patch('apps.database.services.get_router')
+    def test_ordered_query_pages_by_keyset(self, mock_get_router):
+        """Test that later pages re-query after the last ORDER BY value"""
+        named_cursor = _named_cursor([('id', PG_INT4), ('name', PG_TEXT)], [(i, f'c{i}') for i in range(1, 6)])
+        _mock_pool(mock_get_router, MagicMock(), named_cursor)
+
+        first = self.db_service.execute_paged_query("SELECT id, name FROM customers ORDER BY id", page_size=2)
+
+        self.assertEqual(first['data'], [[1, 'c1'], [2, 'c2']])
+        self.assertEqual(first['page']['mode'], 'keyset')
+        self.assertNotIn('LIMIT', named_cursor.execute.call_args.args[0])
+
+        named_cursor = _named_cursor([('id', PG_INT4), ('name', PG_TEXT)], [(3, 'c3'), (4, 'c4'), (5, 'c5')])
+        _mock_pool(mock_get_router, MagicMock(), named_cursor)
+        second = self.db_service.fetch_page(first['page']['next_token'])
+
+        sql, params = named_cursor.execute.call_args.args
+        self.assertIn('WHERE ("id" > %s OR "id" IS NULL) ORDER BY "id" ASC NULLS LAST', sql)
+        self.assertEqual(params, [2])
+        self.assertEqual(second['data'], [[3, 'c3'], [4, 'c4']])
+        self.assertEqual(second['page']['number'], 2)
+
+    @patch('apps.database.services.get_router')
+    def test_ties_at_page_boundary_spill_a_snapshot(self, mock_get_router):
+        """Test that a key shared across the boundary falls back to held pages"""
+        rows = [(1, 'a'), (2, 'a'), (3, 'a'), (4, 'b'), (5, 'c')]
+        named_cursor = _named_cursor([('id', PG_INT4), ('segment', PG_TEXT)], rows)
+        _mock_pool(mock_get_router, MagicMock(), named_cursor)
+
+        first = self.db_service.execute_paged_query("SELECT id, segment FROM customers ORDER BY segment", page_size=2)
+        mock_get_router.reset_mock()
+
+        pages = [first]
+        while pages[-1]['page']['next_token']:
+            pages.append(self.db_service.fetch_page(pages[-1]['page']['next_token']))
+
+        self.assertEqual(first['page']['mode'], 'snapshot')
+        self.assertEqual([row[0] for page in pages for row in page['data']], [1, 2, 3, 4, 5])
+        self.assertEqual(len(pages), 3)
+        mock_get_router.return_value.choose.assert_not_called()
+
+    @patch('apps.database.services.get_router')
+    def test_single_page_has_no_token(self, mock_get_router):
+        """Test that a result fitting one page needs no continuation"""
+        named_cursor = _named_cursor([('id', PG_INT4)], [(1,), (2,)])
+        _mock_pool(mock_get_router, MagicMock(), named_cursor)
+
+        result = self.db_service.execute_paged_query("SELECT id FROM customers", page_size=5)
+
+        self.assertEqual(result['row_count'], 2)
+        self.assertIsNone(result['page']['next_token'])
+
+    @patch('apps.database.services.get_router')
+    def test_cost_guard_estimates_the_page_not_the_result(self, mock_get_router):
+        """Test that paging a large table is checked as one page plus one row"""
+        cursor = MagicMock()
+        cursor.fetchone.side_effect = [_plan(40.0, 3)]
+        named_cursor = _named_cursor([('id', PG_INT4)], [(1,), (2,), (3,)])
+        _mock_pool(mock_get_router, cursor, named_cursor)
+        self.db_service.cost_guard = CostGuard(mode='reject', max_cost=1e6, max_rows=1e6, rewrite_limit=0)
+
+        result = self.db_service.execute_paged_query("SELECT id FROM transactions", page_size=2)
+
+        self.assertTrue(result['success'])
+        explain = cursor.execute.call_args_list[-1].args[0]
+        self.assertTrue(explain.startswith("EXPLAIN (FORMAT JSON) SELECT * FROM ("))
+        self.assertTrue(explain.endswith(") AS cost_limited LIMIT 3"))
+        self.assertNotIn('LIMIT', named_cursor.execute.call_args.args[0])
+
+    @patch('apps.database.views.DatabaseService')
+    def test_failed_first_page_is_a_400(self, mock_service_class):
+        """Test that a paged query that fails answers like a failed continuation"""
+        from rest_framework.test import APIRequestFactory
+        from apps.database.views import execute_query
+
+        mock_service_class.return_value.execute_paged_query.return_value = {'success': False, 'error': 'rejected'}
+
+        request = APIRequestFactory().post('/api/database/execute/', {'query': 'SELECT id FROM customers', 'page_size': 2},
+                                           format='json')
+        response = execute_query(request)
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_unknown_token_is_an_error(self):
+        """Test that expired or forged tokens are reported, not executed"""
+        self.assertFalse(self.db_service.fetch_page('not-a-token')['success'])
+
+        from apps.database.paging import encode_token
+        result = self.db_service.fetch_page(encode_token('0' * 32, 1))
+        self.assertIn('expired', result['error'])
+
+    def test_keyset_query_escapes_percent_and_handles_nulls_first(self):
+        """Test the keyset continuation for DESC order with NULLs in front"""
+        sql, params = keyset_query("SELECT name FROM customers WHERE name LIKE 'A%' ORDER BY name DESC;",
+                                   'name', True, True, None)
+
+        self.assertIn("LIKE 'A%%'", sql)
+        self.assertIn('WHERE "name" IS NOT NULL ORDER BY "name" DESC NULLS FIRST', sql)
+        self.assertEqual(params, [])
+
+    @patch('apps.database.views.DatabaseService')
+    def test_view_accepts_page_token_without_query(self, mock_service_class):
+        """Test that the next page is requested with the token alone"""
+        from rest_framework.test import APIRequestFactory
+        from apps.database.views import execute_query
+
+        mock_service_class.return_value.fetch_page.return_value = {'success': True, 'data': [[3]]}
+        request = APIRequestFactory().post('/api/database/execute/', {'page_token': 'abc'}, format='json')
+
+        response = execute_query(request)
+
+        self.assertEqual(response.status_code, 200)
+        mock_service_class.return_value.fetch_page.assert_called_once_with('abc')
+
+
+class TestDatabaseStats(TestCase):
+    CATALOG = [('accounts', 5000, 8192), ('django_migrations', 40, 8192), ('transactions', 250000000, 10 ** 10)]
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.db_service = DatabaseService()
+
+    def _catalog(self, mock_connections):
+        cursor = MagicMock()
+        cursor.fetchall.return_value = self.CATALOG
+        mock_connections.__getitem__.return_value.cursor.return_value.__enter__.return_value = cursor
+        return cursor
+
+    @patch('apps.database.tasks.refresh_exact_counts_task')
+    @patch('apps.database.services.connections')
+    def test_estimates_come_from_one_catalog_query(self, mock_connections, mock_task):
+        """Test that stats need no COUNT(*) and schedule one background refresh"""
+        cursor = self._catalog(mock_connections)
+
+        stats = self.db_service.get_database_stats()
+        self.db_service.get_database_stats()
+
+        self.assertTrue(stats['success'])
+        self.assertEqual(cursor.execute.call_count, 2)
+        self.assertEqual([table['table_name'] for table in stats['tables']], ['accounts', 'transactions'])
+        self.assertEqual(stats['total_rows'], 250005000)
+        self.assertEqual(stats['tables'][1]['row_count_source'], 'estimate')
+        mock_task.delay.assert_called_once()
+
+    @patch('apps.database.tasks.refresh_exact_counts_task')
+    @patch('apps.database.services.connections')
+    def test_cached_exact_counts_are_preferred(self, mock_connections, mock_task):
+        """Test that fresh exact counts replace the estimates"""
+        import time
+        from django.core.cache import cache
+        from apps.database.services import EXACT_COUNTS_CACHE_KEY
+        self._catalog(mock_connections)
+        cache.set(EXACT_COUNTS_CACHE_KEY, {'counts': {'accounts': 5012}, 'refreshed_at': '2024-01-01T00:00:00+00:00',
+                                           'refreshed_at_ts': time.time()})
+
+        stats = self.db_service.get_database_stats()
+
+        accounts = stats['tables'][0]
+        self.assertEqual((accounts['row_count'], accounts['row_count_source']), (5012, 'exact'))
+        self.assertEqual(stats['tables'][1]['row_count_source'], 'estimate')
+        mock_task.delay.assert_not_called()
+
+    @patch('apps.database.services.get_router')
+    def test_refresh_counts_each_table_and_caches(self, mock_get_router):
+        """Test that the refresh counts on the read pool and stores the result"""
+        from django.core.cache import cache
+        from apps.database.services import EXACT_COUNTS_CACHE_KEY
+        cursor = MagicMock()
+        cursor.fetchone.side_effect = [(5012,), (250000123,)]
+        _mock_pool(mock_get_router, cursor)
+
+        exact_counts = self.db_service.refresh_exact_counts(['accounts', 'transactions'])
+
+        self.assertEqual(exact_counts['counts'], {'accounts': 5012, 'transactions': 250000123})
+        self.assertEqual(cache.get(EXACT_COUNTS_CACHE_KEY)['counts'], exact_counts['counts'])
+        self.assertEqual(cursor.execute.call_args_list[0].args[0], "SET LOCAL statement_timeout = 300000")
+
+    @patch('apps.database.services.get_router')
+    @patch('apps.database.tasks.refresh_exact_counts_task')
+    @patch('apps.database.services.connections')
+    def test_only_the_queued_refresh_releases_its_lock(self, mock_connections, mock_task, mock_get_router):
+        """Test that an exact=true count leaves a queued refresh's lock alone, and the queued one frees it"""
+        from django.core.cache import cache
+        from apps.database.services import EXACT_COUNTS_LOCK_KEY
+        self._catalog(mock_connections)
+        cursor = MagicMock()
+        cursor.fetchone.return_value = (1,)
+        _mock_pool(mock_get_router, cursor)
+
+        self.db_service.get_database_stats()
+        token = mock_task.delay.call_args.kwargs['lock_token']
+
+        self.db_service.refresh_exact_counts(['accounts'])
+        self.assertEqual(cache.get(EXACT_COUNTS_LOCK_KEY), token)
+
+        self.db_service.refresh_exact_counts(['accounts'], lock_token=token)
+        self.assertIsNone(cache.get(EXACT_COUNTS_LOCK_KEY))
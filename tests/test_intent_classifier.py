@@ -0,0 +1,99 @@
+import re
+import zlib
+import numpy as np
+from django.test import TestCase
+from unittest.mock import patch, Mock
+from apps.chat.intent import IntentClassifier, INTENT_EVALUATION_SET
+
+
+class BagOfWordsModel:
+    """Deterministic stand-in for the sentence transformer"""
+
+    def __init__(self, dim=256):
+        self.dim = dim
+
+    def _encode_one(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in re.findall(r"[a-z]+", text.lower()):
+            vector[zlib.crc32(word.encode()) % self.dim] += 1.0
+        return vector
+
+    def encode(self, texts):
+        if isinstance(texts, str):
+            return self._encode_one(texts)
+        return np.vstack([self._encode_one(text) for text in texts])
+
+
+EXAMPLES = {
+    'database': ["show customers accounts balance", "list loans transactions"],
+    'general': ["tell me a joke", "hello how are you"],
+}
+
+
+class TestIntentClassifier(TestCase):
+    def setUp(self):
+        self.classifier = IntentClassifier(model=BagOfWordsModel(), threshold=0.3, examples=EXAMPLES)
+
+    def test_centroids_are_unit_vectors(self):
+        """Test that one normalized centroid is built per intent"""
+        self.assertEqual(self.classifier.intents, ['database', 'general'])
+        np.testing.assert_allclose(np.linalg.norm(self.classifier.centroids, axis=1), [1.0, 1.0], rtol=1e-5)
+
+    def test_classify_routes_by_nearest_centroid(self):
+        """Test that messages are assigned to the closest intent"""
+        self.assertEqual(self.classifier.classify("get me a joke")['intent'], 'general')
+        self.assertEqual(self.classifier.classify("show all loans")['intent'], 'database')
+
+    def test_classify_returns_reusable_embedding(self):
+        """Test that the message embedding is returned for schema retrieval"""
+        prediction = self.classifier.classify("show customers")
+        self.assertEqual(len(prediction['embedding']), 256)
+        self.assertIn('database', prediction['scores'])
+
+    def test_low_confidence_is_flagged(self):
+        """Test that unrelated messages fall below the confidence threshold"""
+        prediction = self.classifier.classify("quantum chromodynamics")
+        self.assertFalse(prediction['confident'])
+
+    def test_evaluate_reports_accuracy_and_latency(self):
+        """Test evaluation report structure"""
+        samples = [("tell me a joke", 'general'), ("list accounts", 'database')]
+        report = self.classifier.evaluate(samples)
+
+        self.assertEqual(report['samples'], 2)
+        self.assertEqual(report['accuracy'], 1.0)
+        self.assertIn('p99', report['latency_ms']['classify'])
+        self.assertEqual(report['errors'], [])
+
+    def test_evaluation_set_covers_every_intent(self):
+        """Test that the bundled evaluation set labels every intent"""
+        labels = {label for _, label in INTENT_EVALUATION_SET}
+        self.assertEqual(labels, {'database', 'analytics', 'follow_up', 'general'})
+
+
+class TestIntentRouting(TestCase):
+    @patch('apps.chat.views.get_intent_classifier')
+    def test_falls_back_to_keywords_when_not_confident(self, mock_get_classifier):
+        """Test keyword routing when the classifier is below threshold"""
+        from apps.chat.views import _classify_intent
+
+        mock_get_classifier.return_value.classify.return_value = {
+            'intent': 'general', 'confidence': 0.1, 'confident': False, 'embedding': [0.0]
+        }
+
+        intent = _classify_intent("How many customers do we have?")
+
+        self.assertEqual(intent['intent'], 'database')
+        self.assertEqual(intent['source'], 'keywords')
+
+    @patch('apps.chat.views.get_intent_classifier')
+    def test_falls_back_to_keywords_when_model_unavailable(self, mock_get_classifier):
+        """Test keyword routing when the classifier cannot be loaded"""
+        from apps.chat.views import _classify_intent
+
+        mock_get_classifier.side_effect = OSError("model not found")
+
+        intent = _classify_intent("Tell me a joke")
+
+        self.assertEqual(intent['intent'], 'general')
+        self.assertIsNone(intent['embedding'])
@@ -0,0 +1,132 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+from unittest.mock import patch, Mock
+from apps.analytics.models import BusinessMetric
+from apps.analytics.snapshots import take_metric_snapshot, latest_metric_snapshot, prune_metric_snapshots
+from apps.analytics.views import business_metrics, business_metric_series
+
+METRICS = {
+    'customer_metrics': {'total_customers': 200, 'premium_customer_rate': 25.0,
+                         'avg_credit_score': Decimal('700.5'), 'avg_annual_income': None},
+    'transaction_metrics': {'monthly_transaction_count': 3000, 'monthly_transaction_volume': Decimal('90000.00'),
+                            'avg_transaction_amount': Decimal('30.00')},
+}
+
+
+def _service(metrics=METRICS):
+    service = Mock()
+    service.calculate_business_metrics.return_value = {'success': True, 'metrics': metrics, 'calculated_at': ''}
+    return service
+
+
+def _store(name, value, calculated_at):
+    BusinessMetric.objects.create(name=name, category='customer', value=value, calculation_method='',
+                                  sql_query='', calculated_at=calculated_at)
+
+
+class TestMetricSnapshots(TestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        cache.clear()
+
+    def test_snapshot_stores_one_row_per_metric(self):
+        """Test that a snapshot bulk-stores every known metric under one timestamp"""
+        result = take_metric_snapshot(_service())
+
+        rows = list(BusinessMetric.objects.all())
+        self.assertEqual(result['count'], 6)
+        self.assertEqual(len(rows), 6)
+        self.assertEqual({row.calculated_at for row in rows}, {result['calculated_at']})
+        self.assertNotIn('avg_annual_income', {row.name for row in rows})
+        self.assertEqual(result['metrics']['customer_metrics']['avg_credit_score'], 700.5)
+        self.assertIn('FROM customers', BusinessMetric.objects.get(name='total_customers').sql_query)
+        self.assertEqual(latest_metric_snapshot()['metrics'], result['metrics'])
+
+    @patch('apps.analytics.snapshots.take_metric_snapshot')
+    def test_endpoint_serves_latest_snapshot(self, mock_take):
+        """Test that the dashboard reads the newest snapshot without recomputing"""
+        now = timezone.now()
+        _store('total_customers', 100, now - timedelta(minutes=20))
+        _store('total_customers', 120, now - timedelta(minutes=1))
+
+        response = business_metrics(self.factory.get('/api/analytics/metrics/'))
+
+        mock_take.assert_not_called()
+        self.assertFalse(response.data['stale'])
+        self.assertEqual(response.data['metrics'], {'customer_metrics': {'total_customers': 120.0}})
+
+    @patch('apps.analytics.tasks.snapshot_metrics_task')
+    def test_stale_snapshot_refreshes_in_background_once(self, mock_task):
+        """Test that a stale snapshot is still served and only one refresh is queued"""
+        _store('total_customers', 100, timezone.now() - timedelta(hours=1))
+
+        first = business_metrics(self.factory.get('/api/analytics/metrics/'))
+        second = business_metrics(self.factory.get('/api/analytics/metrics/'))
+
+        self.assertTrue(first.data['stale'])
+        self.assertEqual(second.data['metrics'], first.data['metrics'])
+        mock_task.delay.assert_called_once_with()
+
+    @patch('apps.analytics.services.AnalyticsService')
+    def test_first_request_computes_and_stores(self, mock_service_class):
+        """Test that with no snapshot yet the metrics are computed once and kept"""
+        mock_service_class.return_value = _service()
+
+        response = business_metrics(self.factory.get('/api/analytics/metrics/'))
+        business_metrics(self.factory.get('/api/analytics/metrics/'))
+
+        self.assertFalse(response.data['stale'])
+        self.assertEqual(response.data['metrics']['transaction_metrics']['monthly_transaction_count'], 3000.0)
+        self.assertEqual(BusinessMetric.objects.count(), 6)
+        mock_service_class.return_value.calculate_business_metrics.assert_called_once()
+
+    @patch('apps.analytics.services.AnalyticsService')
+    def test_first_request_failure_is_not_cached(self, mock_service_class):
+        """Test that a failed first calculation is a 500 and is retried by the next request"""
+        mock_service_class.return_value.calculate_business_metrics.return_value = {
+            'success': False, 'error': 'database unavailable'
+        }
+
+        response = business_metrics(self.factory.get('/api/analytics/metrics/'))
+        business_metrics(self.factory.get('/api/analytics/metrics/'))
+
+        self.assertEqual(response.status_code, 500)
+        self.assertIn('database unavailable', response.data['error'])
+        self.assertEqual(mock_service_class.return_value.calculate_business_metrics.call_count, 2)
+
+    def test_series_filters_by_name_and_range(self):
+        """Test that the series endpoint returns each metric's values in time order"""
+        now = timezone.now()
+        _store('default_rate', 2.0, now - timedelta(days=40))
+        _store('default_rate', 3.0, now - timedelta(days=2))
+        _store('default_rate', 4.0, now - timedelta(days=1))
+        _store('total_customers', 120, now - timedelta(days=1))
+
+        response = business_metric_series(
+            self.factory.get('/api/analytics/metrics/series/', {'names': 'default_rate', 'time_range': '30d'})
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.data['series']), ['default_rate'])
+        self.assertEqual([point['value'] for point in response.data['series']['default_rate']], [3.0, 4.0])
+
+    def test_series_rejects_inverted_range(self):
+        """Test that a start after the end is a 400"""
+        response = business_metric_series(self.factory.get('/api/analytics/metrics/series/', {
+            'start': '2024-02-01T00:00:00Z', 'end': '2024-01-01T00:00:00Z'
+        }))
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_prune_drops_snapshots_past_retention(self):
+        """Test that snapshots older than the retention window are deleted"""
+        now = timezone.now()
+        _store('total_customers', 100, now - timedelta(days=400))
+        _store('total_customers', 120, now)
+
+        self.assertEqual(prune_metric_snapshots(365), 1)
+        self.assertEqual(BusinessMetric.objects.count(), 1)
@@ -0,0 +1,66 @@
+import sqlparse
+from django.test import TestCase
+from apps.database.analysis import QueryAnalysis, AnalysisCache
+
+
+class TestQueryAnalysis(TestCase):
+    def test_formatting_matches_sqlparse(self):
+        """Test that the single parse formats like sqlparse.format"""
+        query = ("select c.name, sum(t.amount) as total from customers c join accounts a on a.customer_id = c.id "
+                 "join transactions t on t.account_id = a.id group by c.name order by total desc")
+        analysis = QueryAnalysis(query)
+
+        self.assertEqual(analysis.formatted, sqlparse.format(query, reindent=True, keyword_case='upper'))
+        self.assertEqual(analysis.tables, {'customers', 'accounts', 'transactions'})
+        self.assertTrue(analysis.is_safe)
+
+    def test_limit_in_subquery_still_gets_outer_limit(self):
+        """Test that only a top-level LIMIT counts as the query's limit"""
+        analysis = QueryAnalysis("SELECT id FROM customers WHERE id IN (SELECT customer_id FROM loans LIMIT 5)")
+
+        self.assertFalse(analysis.has_limit)
+        self.assertTrue(analysis.formatted_query(100).endswith(" LIMIT 100;"))
+        self.assertTrue(analysis.normalized_query(100).endswith("LIMIT 5) LIMIT 100"))
+
+    def test_existing_limit_is_kept(self):
+        """Test that queries with their own LIMIT or FETCH run unchanged"""
+        for query in ("SELECT * FROM customers LIMIT 5", "SELECT * FROM customers FETCH FIRST 5 ROWS ONLY"):
+            analysis = QueryAnalysis(query)
+            self.assertTrue(analysis.has_limit, query)
+            self.assertEqual(analysis.formatted_query(100), analysis.formatted)
+
+    def test_unsafe_statement_anywhere_is_rejected(self):
+        """Test that every statement is checked, not only the first"""
+        self.assertFalse(QueryAnalysis("SELECT 1; DELETE FROM customers;").is_safe)
+        self.assertFalse(QueryAnalysis("").is_safe)
+
+
+class TestAnalysisCache(TestCase):
+    def test_from_inside_functions_is_not_a_relation(self):
+        """Test that EXTRACT(... FROM col) doesn't count col as a table"""
+        analysis = QueryAnalysis("SELECT EXTRACT(YEAR FROM t.created_at) AS year FROM transactions t")
+
+        self.assertEqual(analysis.tables, {'transactions'})
+        self.assertEqual(analysis.scopes[0].columns, [('t', 'created_at')])
+
+    def test_repeat_queries_are_parsed_once(self):
+        """Test that a repeated SQL text reuses its analysis"""
+        analyses = AnalysisCache(max_entries=10)
+
+        first = analyses.analyze("SELECT * FROM customers")
+        second = analyses.analyze("SELECT * FROM customers")
+
+        self.assertIs(first, second)
+        self.assertEqual((analyses.hits, analyses.misses), (1, 1))
+
+    def test_least_recently_used_is_evicted(self):
+        """Test that the cache stays within max_entries"""
+        analyses = AnalysisCache(max_entries=2)
+        a = analyses.analyze("SELECT 1")
+        analyses.analyze("SELECT 2")
+        analyses.analyze("SELECT 1")
+        analyses.analyze("SELECT 3")
+
+        self.assertIs(analyses.analyze("SELECT 1"), a)
+        analyses.analyze("SELECT 2")
+        self.assertEqual(analyses.misses, 4)
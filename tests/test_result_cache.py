@@ -0,0 +1,126 @@
+from django.core.cache import cache
+from django.test import TestCase
+from unittest.mock import patch
+from apps.database.result_cache import QueryResultCache, LocalResultCache, referenced_tables, normalize_sql
+from apps.database.services import DatabaseService
+
+
+class TestReferencedTables(TestCase):
+    def test_finds_tables_in_joins_and_subqueries(self):
+        """Test that every table read by the query is found"""
+        tables, ctes = referenced_tables(
+            "SELECT c.name FROM customers c JOIN accounts a ON a.customer_id = c.id "
+            "WHERE c.id IN (SELECT customer_id FROM loans)"
+        )
+        self.assertEqual(tables, {'customers', 'accounts', 'loans'})
+        self.assertEqual(ctes, set())
+
+    def test_cte_names_are_not_tables(self):
+        """Test that CTE names are excluded from the keyed tables"""
+        result_cache = QueryResultCache()
+        tables = result_cache.cacheable_tables(
+            "WITH big AS (SELECT * FROM accounts WHERE balance > 100) SELECT * FROM big"
+        )
+        self.assertEqual(tables, {'accounts'})
+
+    def test_volatile_queries_are_not_cacheable(self):
+        """Test that queries depending on the clock are never cached"""
+        result_cache = QueryResultCache()
+        self.assertIsNone(result_cache.cacheable_tables(
+            "SELECT * FROM transactions WHERE created_at > NOW() - INTERVAL '1 day'"
+        ))
+        self.assertIsNone(result_cache.cacheable_tables("SELECT 1"))
+
+    def test_normalization_ignores_formatting(self):
+        """Test that whitespace, case and comments don't change the key text"""
+        self.assertEqual(
+            normalize_sql("select *\n  from customers -- all of them\n;"),
+            normalize_sql("SELECT * FROM customers")
+        )
+
+    def test_normalization_keeps_whitespace_in_literals(self):
+        """Test that queries differing only inside a string literal get different keys"""
+        self.assertNotEqual(
+            normalize_sql("SELECT * FROM customers WHERE city = 'New  York'"),
+            normalize_sql("SELECT * FROM customers WHERE city = 'New York'")
+        )
+        self.assertEqual(
+            normalize_sql("SELECT *  FROM customers\n WHERE city = 'New  York' ;"),
+            "SELECT * FROM customers WHERE city = 'New  York'"
+        )
+
+
+class TestLocalResultCache(TestCase):
+    def test_evicts_least_recently_used_by_size(self):
+        """Test that the LRU stays within its byte budget"""
+        local = LocalResultCache(max_bytes=100)
+        local.set('a', {'cached_at': 1e12}, 40)
+        local.set('b', {'cached_at': 1e12}, 40)
+        local.get('a', ttl=60)
+        local.set('c', {'cached_at': 1e12}, 40)
+
+        self.assertIsNotNone(local.get('a', ttl=60))
+        self.assertIsNone(local.get('b', ttl=60))
+        self.assertIsNotNone(local.get('c', ttl=60))
+
+
+class TestDatabaseServiceResultCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.result_cache = QueryResultCache()
+        patcher = patch('apps.database.services.get_result_cache', return_value=self.result_cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.db_service = DatabaseService()
+        self.versions = {'customers': (10, 0, 0, 10)}
+
+    def _execute(self, mock_execute, mock_versions):
+        mock_versions.side_effect = lambda tables: dict(self.versions)
+        mock_execute.return_value = {'data': [[1]], 'columns': ['count'], 'row_count': 1}
+        return self.db_service.execute_safe_query("SELECT COUNT(*) FROM customers")
+
+    @patch.object(DatabaseService, '_table_versions')
+    @patch.object(DatabaseService, '_execute_with_timeout')
+    def test_repeat_query_is_served_from_cache(self, mock_execute, mock_versions):
+        """Test that an unchanged table serves the cached result"""
+        first = self._execute(mock_execute, mock_versions)
+        second = self._execute(mock_execute, mock_versions)
+
+        self.assertFalse(first['cached'])
+        self.assertTrue(second['cached'])
+        self.assertGreaterEqual(second['cache_age'], 0)
+        self.assertEqual(second['data'], [[1]])
+        self.assertEqual(mock_execute.call_count, 1)
+
+    @patch.object(DatabaseService, '_table_versions')
+    @patch.object(DatabaseService, '_execute_with_timeout')
+    def test_write_to_table_invalidates(self, mock_execute, mock_versions):
+        """Test that a changed write counter misses the cache"""
+        self._execute(mock_execute, mock_versions)
+        self.versions = {'customers': (11, 0, 0, 11)}
+        result = self._execute(mock_execute, mock_versions)
+
+        self.assertFalse(result['cached'])
+        self.assertEqual(mock_execute.call_count, 2)
+
+    @patch.object(DatabaseService, '_table_versions')
+    @patch.object(DatabaseService, '_execute_with_timeout')
+    def test_shared_cache_survives_local_eviction(self, mock_execute, mock_versions):
+        """Test that a result evicted locally is still found in the shared cache"""
+        self._execute(mock_execute, mock_versions)
+        self.result_cache.local.clear()
+
+        result = self._execute(mock_execute, mock_versions)
+
+        self.assertTrue(result['cached'])
+        self.assertEqual(mock_execute.call_count, 1)
+
+    @patch.object(DatabaseService, '_table_versions', return_value=None)
+    @patch.object(DatabaseService, '_execute_with_timeout')
+    def test_views_are_not_cached(self, mock_execute, mock_versions):
+        """Test that relations without write counters are always executed"""
+        mock_execute.return_value = {'data': [[1]], 'columns': ['count'], 'row_count': 1}
+        self.db_service.execute_safe_query("SELECT COUNT(*) FROM customer_summary")
+        self.db_service.execute_safe_query("SELECT COUNT(*) FROM customer_summary")
+
+        self.assertEqual(mock_execute.call_count, 2)
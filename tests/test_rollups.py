@@ -0,0 +1,132 @@
+from datetime import date, datetime, timedelta
+from django.test import TestCase
+from django.utils import timezone
+from unittest.mock import patch, MagicMock, Mock
+from apps.analytics import rollups
+from apps.analytics.metrics import business_metric_queries, ROLLUP_TRANSACTION_STATS, BUSINESS_METRIC_QUERIES
+from apps.analytics.models import RollupWatermark
+from apps.analytics.rollups import refresh_rollups, rollups_ready, COHORT_ACTIVITY_QUERY
+from apps.analytics.services import AnalyticsService
+
+
+def _rollup_cursor(mock_connections, lock=True, high_id=150, days=()):
+    cursor = MagicMock()
+    cursor.fetchone.side_effect = [(lock,), (high_id, datetime(2024, 3, 2, 12, 0))]
+    cursor.fetchall.return_value = [(day,) for day in days]
+    mock_connections.__getitem__.return_value.cursor.return_value.__enter__.return_value = cursor
+    return cursor
+
+
+def _statements(cursor):
+    return [call.args for call in cursor.execute.call_args_list]
+
+
+class TestRefreshRollups(TestCase):
+    @patch('apps.analytics.rollups.connections')
+    def test_first_run_rebuilds_everything(self, mock_connections):
+        """Test that with no watermark yet every rollup is rebuilt from all days"""
+        cursor = _rollup_cursor(mock_connections, days=[date(2024, 3, 2), date(2024, 2, 28)])
+
+        result = refresh_rollups()
+
+        self.assertTrue(result['full'])
+        statements = _statements(cursor)
+        for table in rollups.ROLLUP_TABLES:
+            self.assertIn((f"DELETE FROM {table}",), statements)
+        self.assertIn((rollups.ALL_DAYS_SQL,), statements)
+        self.assertIn((rollups.MONTHLY_COHORT_SQL, [[date(2024, 2, 1), date(2024, 3, 1)], 150]), statements)
+        self.assertEqual(RollupWatermark.objects.get(name='transactions').last_transaction_id, 150)
+
+    @patch('apps.analytics.rollups.connections')
+    def test_incremental_run_rebuilds_only_affected_days(self, mock_connections):
+        """Test that later runs start from the watermark and rewrite only the days and months touched"""
+        RollupWatermark.objects.create(name='transactions', last_transaction_id=100)
+        days = [date(2024, 3, 1), date(2024, 3, 2)]
+        cursor = _rollup_cursor(mock_connections, days=days)
+
+        result = refresh_rollups(recompute_days=3)
+
+        self.assertFalse(result['full'])
+        self.assertEqual((result['days'], result['months']), (2, 1))
+        statements = _statements(cursor)
+        self.assertIn((rollups.AFFECTED_DAYS_SQL, [100, 150, 3]), statements)
+        self.assertIn(("DELETE FROM analytics_dailyaccountrollup WHERE day = ANY(%s::date[])", [days]), statements)
+        self.assertIn((rollups.DAILY_CATEGORY_SQL, [days, 150]), statements)
+        self.assertIn((rollups.MONTHLY_COHORT_SQL, [[date(2024, 3, 1)], 150]), statements)
+        self.assertNotIn((rollups.ALL_DAYS_SQL,), statements)
+        self.assertEqual(RollupWatermark.objects.get(name='transactions').last_transaction_id, 150)
+
+    @patch('apps.analytics.rollups.connections')
+    def test_concurrent_run_is_skipped(self, mock_connections):
+        """Test that a run that can't take the advisory lock leaves everything alone"""
+        RollupWatermark.objects.create(name='transactions', last_transaction_id=100)
+        cursor = _rollup_cursor(mock_connections, lock=False)
+
+        result = refresh_rollups()
+
+        self.assertTrue(result['skipped'])
+        self.assertEqual(cursor.execute.call_count, 1)
+        self.assertEqual(RollupWatermark.objects.get(name='transactions').last_transaction_id, 100)
+
+
+class TestRollupReaders(TestCase):
+    def setUp(self):
+        rollups._refreshed_at = None
+
+    def tearDown(self):
+        rollups._refreshed_at = None
+
+    def test_not_ready_until_first_refresh(self):
+        """Test that readers stay on raw tables until a watermark exists"""
+        self.assertFalse(rollups_ready())
+        RollupWatermark.objects.create(name='transactions', last_transaction_id=1)
+        self.assertTrue(rollups_ready())
+
+        with self.settings(ANALYTICS_USE_ROLLUPS=False):
+            self.assertFalse(rollups_ready())
+
+    def test_stale_rollups_fall_back_to_raw_tables(self):
+        """Test that rollups the scheduled refresh stopped updating aren't read"""
+        RollupWatermark.objects.create(name='transactions', last_transaction_id=1)
+        RollupWatermark.objects.update(refreshed_at=timezone.now() - timedelta(hours=2))
+
+        with self.assertLogs('apps.analytics.rollups', level='WARNING'):
+            self.assertFalse(rollups_ready())
+
+        RollupWatermark.objects.get(name='transactions').save()
+        self.assertTrue(rollups_ready())
+        with self.settings(ANALYTICS_ROLLUP_MAX_LAG=0):
+            rollups._refreshed_at = timezone.now() - timedelta(days=30)
+            self.assertTrue(rollups_ready())
+
+    @patch('apps.analytics.metrics.rollups_ready', return_value=True)
+    def test_metrics_read_transaction_rollup(self, mock_ready):
+        """Test that the 30-day transaction figures come from the daily rollup"""
+        queries = business_metric_queries()
+
+        self.assertEqual([query.name for query in queries], [query.name for query in BUSINESS_METRIC_QUERIES])
+        self.assertIn(ROLLUP_TRANSACTION_STATS, queries)
+        self.assertFalse(any('FROM transactions' in query.sql for query in queries))
+
+    @patch('apps.analytics.services.rollups_ready', return_value=True)
+    def test_cohorts_read_monthly_rollup(self, mock_ready):
+        """Test that cohort analysis reads the monthly activity rollup through the trusted path"""
+        db_service = Mock()
+        db_service.execute_trusted_query.return_value = {
+            'success': True,
+            'columns': ['cohort_month', 'transaction_month', 'active_customers', 'total_transactions', 'total_value'],
+            'data': [
+                [date(2024, 1, 1), date(2024, 1, 1), 10, 40, 1000.0],
+                [date(2024, 1, 1), date(2024, 2, 1), 5, 20, 500.0],
+            ],
+            'row_count': 2,
+        }
+        service = AnalyticsService.__new__(AnalyticsService)
+        service.db_service = db_service
+
+        result = service.perform_cohort_analysis()
+
+        db_service.execute_trusted_query.assert_called_once_with(COHORT_ACTIVITY_QUERY)
+        db_service.execute_safe_query.assert_not_called()
+        self.assertTrue(result['success'])
+        self.assertEqual([row['retention_rate'] for row in result['data']], [100.0, 50.0])
@@ -0,0 +1,113 @@
+from django.test import TestCase
+from unittest.mock import patch, Mock, MagicMock
+from apps.database.catalog import SchemaCatalog, parse_enum_check, render_ddl
+
+COLUMNS = [
+    ('accounts', 'BASE TABLE', 'account_id', 'integer', 'NO', "nextval('accounts_account_id_seq'::regclass)", None, 32, 0),
+    ('accounts', 'BASE TABLE', 'customer_id', 'integer', 'YES', None, None, 32, 0),
+    ('accounts', 'BASE TABLE', 'account_type', 'character varying', 'YES', None, 20, None, None),
+    ('accounts', 'BASE TABLE', 'balance', 'numeric', 'YES', None, None, 15, 2),
+    ('customers', 'BASE TABLE', 'customer_id', 'integer', 'NO', None, None, 32, 0),
+]
+
+CONSTRAINTS = [
+    ('accounts', 'p', ['account_id'], None, [], 'PRIMARY KEY (account_id)'),
+    ('accounts', 'f', ['customer_id'], 'customers', ['customer_id'],
+     'FOREIGN KEY (customer_id) REFERENCES customers(customer_id)'),
+    ('accounts', 'c', ['account_type'], None, [],
+     "CHECK (((account_type)::text = ANY ((ARRAY['checking'::character varying, "
+     "'savings'::character varying])::text[])))"),
+    ('customers', 'p', ['customer_id'], None, [], 'PRIMARY KEY (customer_id)'),
+]
+
+
+def _catalog_cursor(mock_connections, fingerprints):
+    """Cursor answering the fingerprint query with ``fingerprints`` in turn, and the load queries with the rows above"""
+    cursor = Mock()
+    fingerprint_rows = iter(fingerprints)
+    cursor.fetchone.side_effect = lambda: (next(fingerprint_rows),)
+    cursor.fetchall.side_effect = lambda: COLUMNS if 'information_schema' in cursor.execute.call_args[0][0] else CONSTRAINTS
+    connection = MagicMock()
+    connection.cursor.return_value.__enter__.return_value = cursor
+    mock_connections.__getitem__.return_value = connection
+    return cursor
+
+
+class TestSchemaCatalog(TestCase):
+    def test_parse_enum_check(self):
+        """Test that IN-list CHECKs are read back as allowed values, and other CHECKs are not"""
+        self.assertEqual(
+            parse_enum_check("CHECK ((status = ANY (ARRAY['open'::text, 'it''s'::text])))"),
+            ('status', ['open', "it's"])
+        )
+        self.assertIsNone(parse_enum_check("CHECK (((credit_score >= 300) AND (credit_score <= 850)))"))
+
+    @patch('apps.database.catalog.connections')
+    def test_load_builds_tables_keys_and_enums(self, mock_connections):
+        """Test that one load gives columns, keys, enums and DDL for each table"""
+        _catalog_cursor(mock_connections, ['v1'])
+        catalog = SchemaCatalog(check_interval=60)
+
+        self.assertEqual(catalog.tables(), ['accounts', 'customers'])
+        accounts = catalog.table('accounts')
+        self.assertEqual(accounts['primary_key'], ['account_id'])
+        self.assertEqual(accounts['foreign_keys'], [
+            {'columns': ['customer_id'], 'references': 'customers', 'referenced_columns': ['customer_id']}
+        ])
+        self.assertEqual(accounts['enums'], {'account_type': ['checking', 'savings']})
+        self.assertIsNone(catalog.table('loans'))
+
+        ddl = catalog.ddl('accounts')
+        self.assertIn("account_type VARCHAR(20) CHECK (account_type IN ('checking', 'savings'))", ddl)
+        self.assertIn("balance DECIMAL(15,2)", ddl)
+        self.assertIn("FOREIGN KEY (customer_id) REFERENCES customers(customer_id)", ddl)
+
+    @patch('apps.database.catalog.connections')
+    def test_lookups_are_served_from_memory(self, mock_connections):
+        """Test that lookups within the check interval don't touch the database"""
+        cursor = _catalog_cursor(mock_connections, ['v1'])
+        catalog = SchemaCatalog(check_interval=60)
+
+        catalog.tables()
+        queries = cursor.execute.call_count
+        for _ in range(10):
+            catalog.table('accounts')
+
+        self.assertEqual(cursor.execute.call_count, queries)
+        self.assertEqual(catalog.loads, 1)
+
+    @patch('apps.database.catalog.connections')
+    def test_invalidate_reloads_only_when_fingerprint_changes(self, mock_connections):
+        """Test that invalidation re-checks the fingerprint and reloads only on a change"""
+        _catalog_cursor(mock_connections, ['v1', 'v1', 'v2'])
+        catalog = SchemaCatalog(check_interval=60)
+
+        catalog.tables()
+        catalog.invalidate()
+        catalog.tables()
+        self.assertEqual(catalog.loads, 1)
+
+        catalog.invalidate()
+        catalog.tables()
+        self.assertEqual(catalog.loads, 2)
+
+    @patch('apps.database.catalog.connections')
+    def test_failed_check_keeps_serving_cached_catalog(self, mock_connections):
+        """Test that a failed fingerprint check falls back to the catalog already loaded"""
+        cursor = _catalog_cursor(mock_connections, ['v1'])
+        catalog = SchemaCatalog(check_interval=60)
+        catalog.tables()
+
+        cursor.execute.side_effect = Exception("connection refused")
+        catalog.invalidate()
+
+        self.assertEqual(catalog.tables(), ['accounts', 'customers'])
+
+    def test_render_view_ddl(self):
+        """Test that views are rendered as views"""
+        ddl = render_ddl({
+            'name': 'schema_definitions', 'kind': 'view', 'primary_key': [], 'foreign_keys': [], 'enums': {},
+            'columns': [{'name': 'table_name', 'type': 'name', 'nullable': True}],
+        })
+
+        self.assertEqual(ddl, "CREATE VIEW schema_definitions (table_name NAME);")
@@ -0,0 +1,132 @@
+from django.test import TestCase
+from unittest.mock import patch
+from apps.database.analysis import QueryAnalysis
+from apps.database.services import DatabaseService
+from apps.database.validation import validate_references
+
+
+class FakeCatalog:
+    def __init__(self, tables):
+        self._tables = {
+            name: {'name': name, 'column_names': frozenset(columns)} for name, columns in tables.items()
+        }
+
+    def tables(self):
+        return sorted(self._tables)
+
+    def table(self, name):
+        return self._tables.get(name)
+
+
+CATALOG = FakeCatalog({
+    'customers': ['customer_id', 'first_name', 'last_name', 'kyc_status', 'created_at'],
+    'accounts': ['account_id', 'customer_id', 'account_type', 'balance', 'created_at'],
+    'transactions': ['transaction_id', 'account_id', 'amount', 'created_at'],
+})
+
+
+def _errors(sql_query):
+    return validate_references(QueryAnalysis(sql_query), CATALOG)
+
+
+class TestSchemaValidation(TestCase):
+    def test_valid_query_with_aliases(self):
+        """Test that aliased columns, output aliases and EXTRACT resolve"""
+        errors = _errors(
+            "SELECT c.first_name, SUM(t.amount) AS total, EXTRACT(EPOCH FROM t.created_at) AS age "
+            "FROM customers c JOIN accounts a ON a.customer_id = c.customer_id "
+            "LEFT JOIN transactions t USING (account_id) "
+            "WHERE c.kyc_status = 'approved' AND balance > 0 "
+            "GROUP BY c.first_name ORDER BY total DESC"
+        )
+
+        self.assertEqual(errors, [])
+
+    def test_ctes_and_subqueries_resolve(self):
+        """Test that CTE names aren't tables and correlated subqueries see outer aliases"""
+        errors = _errors(
+            "WITH totals AS (SELECT account_id, SUM(amount) AS total FROM transactions GROUP BY account_id) "
+            "SELECT a.account_id, totals.total FROM accounts a JOIN totals ON totals.account_id = a.account_id "
+            "WHERE EXISTS (SELECT 1 FROM customers c WHERE c.customer_id = a.customer_id)"
+        )
+
+        self.assertEqual(errors, [])
+
+    def test_unknown_qualified_column(self):
+        """Test that a hallucinated column is reported against its table, with a suggestion"""
+        errors = _errors("SELECT c.firstname FROM customers c")
+
+        self.assertEqual(errors, ["Column 'firstname' does not exist in table 'customers'; did you mean 'first_name'?"])
+
+    def test_unknown_unqualified_column(self):
+        """Test that an unqualified column must exist in one of the tables in scope"""
+        errors = _errors("SELECT account_status FROM accounts WHERE balance > 0")
+
+        self.assertEqual(len(errors), 1)
+        self.assertIn("Column 'account_status' does not exist in accounts", errors[0])
+
+    def test_unknown_table(self):
+        """Test that a missing table is reported once, without cascading column errors"""
+        errors = _errors("SELECT id, name FROM customer")
+
+        self.assertEqual(errors, ["Table 'customer' does not exist; did you mean 'customers'?"])
+
+    def test_unknown_alias(self):
+        """Test that a qualifier bound by no FROM entry is reported with the aliases in scope"""
+        errors = _errors("SELECT x.balance FROM accounts a")
+
+        self.assertEqual(errors, ["Unknown table or alias 'x' in 'x.balance'; tables in scope: a (accounts)"])
+
+    def test_subquery_columns_are_not_guessed(self):
+        """Test that columns of derived tables aren't checked against the catalog"""
+        errors = _errors("SELECT s.total FROM (SELECT SUM(balance) AS total FROM accounts) s")
+
+        self.assertEqual(errors, [])
+
+    def test_boolean_literal_aliases(self):
+        """Test that the alias of a TRUE or FALSE select item isn't read as a column"""
+        self.assertEqual(_errors("SELECT account_type, true AS flag FROM accounts ORDER BY flag"), [])
+        self.assertEqual(_errors("SELECT account_type, false AS f FROM accounts"), [])
+
+    def test_string_literal_alias_without_as(self):
+        """Test that a string literal's bare alias isn't read as a column, but what follows it is checked"""
+        self.assertEqual(_errors("SELECT account_id, 'x' label FROM accounts"), [])
+        self.assertEqual(_errors("SELECT 'x' label, bogus FROM accounts"),
+                         ["Column 'bogus' does not exist in accounts"])
+
+    def test_niladic_function_aliases(self):
+        """Test that CURRENT_DATE and friends aren't columns, and neither are their aliases"""
+        self.assertEqual(_errors("SELECT CURRENT_DATE AS today FROM customers ORDER BY today"), [])
+        self.assertEqual(_errors("SELECT current_timestamp AS ts FROM customers WHERE created_at < current_timestamp"), [])
+        self.assertEqual(_errors(
+            "SELECT current_time, localtime lt, localtimestamp, current_user AS u, session_user, user, "
+            "current_schema AS s, first_name FROM customers"
+        ), [])
+        self.assertEqual(_errors("SELECT current_date d, bogus FROM customers"),
+                         ["Column 'bogus' does not exist in customers"])
+
+
+class TestDatabaseServiceValidation(TestCase):
+    def setUp(self):
+        self.db_service = DatabaseService()
+        self.db_service.schema_validation = True
+        self.db_service.result_cache_enabled = False
+
+    @patch('apps.database.services.get_router')
+    @patch('apps.database.services.get_schema_catalog')
+    def test_invalid_query_never_reaches_database(self, mock_get_catalog, mock_get_router):
+        """Test that a query with unknown columns fails before a connection is checked out"""
+        mock_get_catalog.return_value = CATALOG
+
+        result = self.db_service.execute_safe_query("SELECT c.firstname FROM customers c")
+
+        self.assertFalse(result['success'])
+        self.assertEqual(len(result['validation_errors']), 1)
+        mock_get_router.assert_not_called()
+
+    @patch('apps.database.services.get_schema_catalog')
+    def test_validation_skipped_when_catalog_unavailable(self, mock_get_catalog):
+        """Test that an unreadable catalog doesn't block queries"""
+        mock_get_catalog.return_value.table.side_effect = Exception("connection refused")
+
+        self.assertEqual(self.db_service.validate_query("SELECT id FROM customers"), [])
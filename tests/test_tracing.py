@@ -0,0 +1,87 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory
+from apps.chat.models import ChatSession, ChatMessage
+from apps.chat.views import trace_stats
+from utils.tracing import start_trace, span, annotate, aggregate_spans, percentile
+
+
+class TestTracing(TestCase):
+    def test_spans_are_recorded_with_attributes(self):
+        """Test that spans capture timings and annotations"""
+        with start_trace() as trace:
+            with span('db.execute'):
+                annotate(rows=42, ignored=None)
+
+        compact = trace.to_dict()
+        self.assertEqual(compact['spans'][0]['name'], 'db.execute')
+        self.assertEqual(compact['spans'][0]['rows'], 42)
+        self.assertNotIn('ignored', compact['spans'][0])
+        self.assertIn('ms', compact['spans'][0])
+
+    def test_span_without_trace_is_noop(self):
+        """Test that spans outside a trace cost nothing and record nothing"""
+        with span('llm.generate_sql') as entry:
+            annotate(prompt_tokens=10)
+        self.assertIsNone(entry)
+
+    def test_errors_are_flagged(self):
+        """Test that a failing span is marked as an error"""
+        with start_trace() as trace:
+            with self.assertRaises(ValueError):
+                with span('db.execute'):
+                    raise ValueError("boom")
+
+        self.assertTrue(trace.spans[0]['error'])
+
+    def test_copied_context_records_into_same_trace(self):
+        """Test that work on an executor thread lands in the request trace"""
+        def work():
+            with span('analytics.analyze'):
+                pass
+
+        with start_trace() as trace:
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                executor.submit(contextvars.copy_context().run, work).result()
+
+        self.assertEqual([entry['name'] for entry in trace.spans], ['analytics.analyze'])
+
+    def test_aggregate_percentiles(self):
+        """Test nearest-rank percentiles per span name"""
+        traces = [{'total_ms': float(i), 'spans': [{'name': 'db.execute', 'ms': float(i)}]} for i in range(1, 101)]
+
+        summary = aggregate_spans(traces)
+
+        self.assertEqual(summary['db.execute']['count'], 100)
+        self.assertEqual(summary['db.execute']['p50'], 50.0)
+        self.assertEqual(summary['db.execute']['p95'], 95.0)
+        self.assertEqual(summary['db.execute']['p99'], 99.0)
+        self.assertEqual(summary['total']['max'], 100.0)
+        self.assertEqual(percentile([], 50), 0.0)
+
+
+class TestTraceStatsEndpoint(TestCase):
+    def test_trace_stats_aggregates_stored_traces(self):
+        """Test that stored message traces are aggregated per stage"""
+        session = ChatSession.objects.create(session_id='trace-session')
+        for ms in (10.0, 20.0, 30.0):
+            ChatMessage.objects.create(
+                session=session,
+                message_type='assistant',
+                content='answer',
+                trace={'total_ms': ms, 'spans': [{'name': 'chat.execution', 'start_ms': 0, 'ms': ms}]}
+            )
+        ChatMessage.objects.create(session=session, message_type='user', content='question')
+
+        request = APIRequestFactory().get('/api/chat/traces/stats/', {'window': 600})
+        response = trace_stats(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['message_count'], 3)
+        self.assertEqual(response.data['stages']['chat.execution']['p50'], 20.0)
+
+    def test_trace_stats_rejects_bad_window(self):
+        """Test validation of the window parameter"""
+        request = APIRequestFactory().get('/api/chat/traces/stats/', {'window': 'soon'})
+        self.assertEqual(trace_stats(request).status_code, 400)
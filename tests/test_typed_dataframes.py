@@ -0,0 +1,63 @@
+import pandas as pd
+from django.test import TestCase
+from apps.analytics.frames import typed_dataframe
+from apps.analytics.services import AnalyticsService
+
+COLUMNS = ['id', 'balance', 'segment', 'email', 'opened', 'active']
+TYPES = ['int4', 'numeric', 'varchar', 'varchar', 'date', 'bool']
+ROWS = [
+    [1, 10.5, 'premium', 'a@x.com', '2024-01-01', True],
+    [2, None, 'standard', 'b@x.com', '2024-01-02', False],
+    [3, 30.0, 'premium', 'c@x.com', '2024-01-03', True],
+    [4, 40.0, 'premium', 'd@x.com', '2024-01-04', True],
+]
+
+
+class TestTypedDataFrames(TestCase):
+    def test_dtypes_come_from_column_types(self):
+        """Test that each column gets the dtype of its Postgres type without trial conversion"""
+        df = typed_dataframe(COLUMNS, ROWS, TYPES)
+
+        self.assertEqual(str(df['id'].dtype), 'int64')
+        self.assertEqual(str(df['balance'].dtype), 'float64')
+        self.assertTrue(df['balance'].isna().iloc[1])
+        self.assertEqual(str(df['segment'].dtype), 'category')
+        self.assertFalse(isinstance(df['email'].dtype, pd.CategoricalDtype))
+        self.assertTrue(pd.api.types.is_string_dtype(df['email'].dtype))
+        self.assertTrue(str(df['opened'].dtype).startswith('datetime64'))
+        self.assertEqual(str(df['active'].dtype), 'bool')
+
+    def test_columnar_data_gives_the_same_frame(self):
+        """Test that column arrays and rows build identical frames"""
+        columnar = [list(column) for column in zip(*ROWS)]
+
+        self.assertTrue(typed_dataframe(COLUMNS, columnar, TYPES, columnar=True).equals(
+            typed_dataframe(COLUMNS, ROWS, TYPES)))
+
+    def test_nullable_integers_and_timestamptz(self):
+        """Test that integer NULLs fall back to float64 and timestamptz stays timezone-aware"""
+        df = typed_dataframe(['n', 'at'], [[1, '2024-01-01T10:00:00+02:00'], [None, None]], ['int8', 'timestamptz'])
+
+        self.assertEqual(str(df['n'].dtype), 'float64')
+        self.assertEqual(str(df['at'].dt.tz), 'UTC')
+        self.assertEqual(df['at'].iloc[0].hour, 8)
+
+    def test_result_without_types_is_still_inferred(self):
+        """Test that results cached before column types were recorded still convert"""
+        df = AnalyticsService()._result_to_dataframe({
+            'columns': ['id', 'opened'],
+            'data': [['1', '2024-01-01'], ['2', '2024-01-02']],
+        })
+
+        self.assertEqual(str(df['id'].dtype), 'int64')
+        self.assertTrue(str(df['opened'].dtype).startswith('datetime64'))
+
+    def test_analysis_sees_categorical_columns(self):
+        """Test that categorical text still gets categorical summaries and charts"""
+        service = AnalyticsService()
+        df = service._result_to_dataframe({'columns': COLUMNS, 'column_types': TYPES, 'data': ROWS})
+
+        summary = service._descriptive_analysis(df)
+
+        self.assertEqual(summary['categorical_summary']['segment']['value_counts'], {'premium': 3, 'standard': 1})
+        self.assertIn('opened', summary['datetime_summary'])